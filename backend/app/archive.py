@@ -0,0 +1,96 @@
+# Hot/cold split of the requests table.
+#
+# Resolved requests are moved to requests_archive once they have been
+# resolved for ARCHIVE_AFTER_HOURS, in batches of ARCHIVE_BATCH_SIZE rows, each
+# batch its own short transaction. The live table then holds pending work
+# and recent history only, so the pending-queue scans (priority escalation,
+# the urgent list, per-district listings) and every index on it stay small
+# however long the response runs. Listings include archived rows on request
+# (include_archived=true, see crud.request_source).
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, exists, insert, or_, select
+from sqlalchemy.orm import Session, aliased
+
+from app import crud, metrics, models, stats
+
+ARCHIVE_AFTER_HOURS = float(os.getenv("ARCHIVE_AFTER_HOURS", "168"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "10000"))
+
+REQUESTS_ARCHIVED = metrics.registry.counter(
+    "requests_archived_total", "Resolved requests moved to requests_archive"
+)
+
+
+def archivable(cutoff: datetime, limit: int):
+    """
+    Resolved requests due for archival: resolved before `cutoff` (requests
+    resolved before resolved_at was recorded go by their timestamp), and not
+    the original of a request still linked to it with duplicate_of.
+    """
+    request = models.Request
+    duplicate = aliased(models.Request)
+    return (
+        select(request.id, request.relatedDistrict)
+        .where(
+            request.status == "resolved",
+            or_(
+                request.resolved_at < cutoff,
+                and_(request.resolved_at.is_(None), request.timestamp < cutoff),
+            ),
+            ~exists().where(duplicate.duplicate_of == request.id),
+        )
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def archive_resolved(
+    db: Session,
+    older_than_hours: float = ARCHIVE_AFTER_HOURS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    max_batches: int = None,
+    now: datetime = None,
+) -> dict:
+    """
+    Moves resolved requests older than `older_than_hours` to requests_archive.
+
+    Every batch copies its rows and deletes them from `requests` in one
+    transaction, adds them to the per-district archive counters and bumps
+    the version of the districts involved (their request counts change). Rows locked by a concurrent writer are skipped
+    and picked up by the next run.
+
+    Returns:
+        dict: Rows archived, batches committed and elapsed milliseconds.
+    """
+    start = time.perf_counter()
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=older_than_hours)
+    live = models.Request.__table__
+    archive = models.ArchivedRequest.__table__
+    columns = [column.name for column in live.columns]
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = db.execute(archivable(cutoff, batch_size)).all()
+        if not rows:
+            db.commit()
+            break
+        ids = [row.id for row in rows]
+        db.execute(
+            insert(archive).from_select(columns, select(live).where(live.c.id.in_(ids)))
+        )
+        db.execute(delete(live).where(live.c.id.in_(ids)))
+        crud.touch_districts(db, {row.relatedDistrict for row in rows})
+        stats.requests_archived(db, [row.relatedDistrict for row in rows])
+        db.commit()
+        archived += len(ids)
+        batches += 1
+        REQUESTS_ARCHIVED.inc(len(ids))
+        if len(ids) < batch_size:
+            break
+    return {
+        "archived": archived,
+        "batches": batches,
+        "elapsed_ms": (time.perf_counter() - start) * 1000,
+    }
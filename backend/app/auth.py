@@ -0,0 +1,150 @@
+import hashlib
+import os
+import time
+from typing import Optional
+
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+from jose import jwt, JWTError
+
+from app.cache import TTLCache
+
+SECRET_KEY = "SECRETKEY123"
+ALGORITHM = "HS256"
+
+# Token-based authentication
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+# Same, for endpoints that also serve anonymous callers
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
+
+# "redis" shares revocations across uvicorn workers; "memory" keeps them per process
+REVOCATION_STORE = os.getenv("REVOCATION_STORE", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+
+# Upper bound on how long decoded claims are reused without re-checking the signature
+CLAIMS_CACHE_TTL = float(os.getenv("CLAIMS_CACHE_TTL", "300"))
+
+
+def token_key(token: str) -> str:
+    """Stable, fixed-size key for a token, so raw tokens are never stored."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class MemoryRevocationStore:
+    """
+    Revoked tokens in a process-local LRU+TTL cache; each entry expires when
+    the token itself does, so the store never outgrows the live tokens.
+    """
+
+    def __init__(self, maxsize: int = 100_000):
+        self._entries = TTLCache(maxsize=maxsize)
+
+    def revoke(self, key: str, expires_at: float):
+        ttl = expires_at - time.time()
+        if ttl > 0:
+            self._entries.set(key, True, ttl=ttl)
+
+    def is_revoked(self, key: str) -> bool:
+        return self._entries.get(key, False)
+
+
+class RedisRevocationStore:
+    """
+    Revoked tokens as Redis keys expiring at the token's `exp`, shared by
+    every worker. Revocations are mirrored locally so that this process still
+    honours its own logouts while Redis is unreachable.
+    """
+
+    def __init__(self, client, prefix: str = "revoked-token:"):
+        self.client = client
+        self.prefix = prefix
+        self.local = MemoryRevocationStore()
+
+    def revoke(self, key: str, expires_at: float):
+        self.local.revoke(key, expires_at)
+        ttl = int(expires_at - time.time()) + 1
+        if ttl > 0:
+            try:
+                self.client.set(self.prefix + key, 1, ex=ttl)
+            except Exception as e:
+                print(f"Could not store token revocation in Redis: {e}")
+
+    def is_revoked(self, key: str) -> bool:
+        if self.local.is_revoked(key):
+            return True
+        try:
+            return bool(self.client.exists(self.prefix + key))
+        except Exception as e:
+            print(f"Could not check token revocation in Redis: {e}")
+            return False
+
+
+def make_revocation_store(backend: str = REVOCATION_STORE):
+    if backend == "redis":
+        import redis
+
+        return RedisRevocationStore(
+            redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+        )
+    return MemoryRevocationStore()
+
+
+revocation_store = make_revocation_store()
+
+# token key -> decoded claims, valid at most until the token expires
+claims_cache = TTLCache(maxsize=10_000, ttl=CLAIMS_CACHE_TTL)
+
+
+def decode_token(token: str) -> dict:
+    """
+    Verifies a JWT and returns its claims, reusing the claims of tokens
+    verified before. Raises HTTPException(401) for invalid or expired tokens.
+    """
+    key = token_key(token)
+    claims = claims_cache.get(key)
+    if claims is not None:
+        if claims.get("exp") is not None and claims["exp"] <= time.time():
+            claims_cache.pop(key)
+            raise HTTPException(status_code=401, detail="Token expired")
+        return claims
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    ttl = CLAIMS_CACHE_TTL
+    if claims.get("exp") is not None:
+        ttl = min(ttl, claims["exp"] - time.time())
+    claims_cache.set(key, claims, ttl=ttl)
+    return claims
+
+
+def revoke_token(token: str, claims: Optional[dict] = None):
+    """Revokes `token` until it expires."""
+    claims = claims if claims is not None else decode_token(token)
+    key = token_key(token)
+    revocation_store.revoke(key, claims.get("exp", time.time() + CLAIMS_CACHE_TTL))
+    claims_cache.pop(key)
+
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+    """
+    Dependency returning the claims (`sub`, `role`, `exp`) of the bearer
+    token; rejects invalid, expired and revoked tokens with 401.
+    """
+    if revocation_store.is_revoked(token_key(token)):
+        raise HTTPException(status_code=401, detail="Token invalidated")
+    return decode_token(token)
+
+
+def get_optional_username(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+) -> Optional[str]:
+    """
+    Dependency returning the username of the bearer token, or None without
+    one; a token that is sent must be valid (401 otherwise).
+    """
+    if token is None:
+        return None
+    return get_current_user(token).get("sub")
@@ -1,13 +1,57 @@
-from sqlalchemy.orm import Session
-from app import models, schemas
+import base64
+import csv
+import io
+import json
+import os
+from datetime import datetime, timedelta
+import heapq
+from typing import NamedTuple, Optional
+from sqlalchemy import (
+    DateTime,
+    Integer,
+    and_,
+    delete,
+    event,
+    func,
+    insert,
+    null,
+    or_,
+    select,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, aliased
+from app import ledger, models, passwords, schemas, stats
+from app.cache import TTLCache
 from app.models import User
-from passlib.context import CryptContext
 from fastapi import HTTPException
+from app.tasks import PRIORITY_INCREASE, escalated_priority
+from app.utils import (
+    DEDUP_RADIUS_M,
+    DEDUP_WINDOW_MINUTES,
+    DEFAULT_PRIORITIES,
+    dedup_candidate_keys,
+)
+from geopy.distance import geodesic
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+class UserRecord(NamedTuple):
+    """Plain snapshot of a user row, safe to share across sessions and threads."""
+
+    id: int
+    username: str
+    password: str
+    role: str
+
+# Login lookups by username; entries are dropped on registration and rehash
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "300")),
+)
 
 def create_user(db: Session, user_data):
-    hashed_password = pwd_context.hash(user_data["password"])
+    hashed_password = passwords.hash_password(user_data["password"])
     db_user = User(
         username=user_data["username"],
         password=hashed_password,
@@ -16,21 +60,723 @@ def create_user(db: Session, user_data):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    user_cache.pop(db_user.username)
     return db_user
 
+def get_user_record(db: Session, username: str) -> Optional[UserRecord]:
+    """
+    Returns the user with `username`, served from `user_cache` when possible.
+    Unknown usernames are not cached.
+    """
+    record = user_cache.get(username)
+    if record is None:
+        db_user = db.query(User).filter(User.username == username).first()
+        if db_user is None:
+            return None
+        record = UserRecord(db_user.id, db_user.username, db_user.password, db_user.role)
+        user_cache.set(username, record)
+    return record
+
+def update_password_hash(db: Session, user: UserRecord, new_hash: str):
+    """Stores a rehashed password (new cost factor) for `user`."""
+    db.query(User).filter(User.id == user.id).update(
+        {"password": new_hash}, synchronize_session=False
+    )
+    db.commit()
+    user_cache.pop(user.username)
+
 def authenticate_user(db: Session, user_data):
-    db_user = db.query(User).filter(User.username == user_data.username).first()
-    if not db_user or not pwd_context.verify(user_data.password, db_user.password):
+    db_user = get_user_record(db, user_data.username)
+    if not db_user:
+        return None
+    valid, new_hash = passwords.verify_and_update_sync(user_data.password, db_user.password)
+    if not valid:
         return None
+    if new_hash:
+        update_password_hash(db, db_user, new_hash)
     return db_user
 
 def create_request(db: Session, request: schemas.RequestCreate):
     db_request = models.Request(**request.dict())
     db.add(db_request)
+    stats.request_added(
+        db, db_request.type, db_request.status or "pending", db_request.relatedDistrict
+    )
     db.commit()
     db.refresh(db_request)
     return db_request
 
+# Rows per multi-row INSERT of a batch submission (Postgres takes at most
+# 65535 bind parameters per statement)
+REQUEST_INSERT_CHUNK = 4000
+
+def bulk_create_requests(db: Session, rows):
+    """
+    Inserts many request rows in a single transaction, as one multi-row
+    INSERT per REQUEST_INSERT_CHUNK rows.
+
+    `rows` are column mappings for `models.Request`; their `id` key is filled in
+    with the generated primary key.
+    """
+    table = models.Request.__table__
+    returning = db.get_bind().dialect.name == "postgresql"
+    try:
+        for start in range(0, len(rows), REQUEST_INSERT_CHUNK):
+            chunk = rows[start : start + REQUEST_INSERT_CHUNK]
+            statement = insert(table).values(chunk)
+            if returning:
+                ids = db.execute(statement.returning(table.c.id)).scalars().all()
+            else:
+                # SQLite, the local stand-in, numbers a statement's rows
+                # consecutively and has no RETURNING in SQLAlchemy 1.4
+                last = db.execute(statement).lastrowid
+                ids = range(last - len(chunk) + 1, last + 1)
+            for row, request_id in zip(chunk, ids):
+                row["id"] = request_id
+        stats.requests_added(db, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return rows
+
+def insert_intake_requests(db: Session, rows):
+    """
+    Inserts request rows taken from the intake queue and commits. Rows whose
+    `intake_id` is already stored are skipped, since queue entries can be
+    delivered more than once.
+
+    Returns `{intake_id: (id, relatedDistrict)}` for the rows inserted now.
+    """
+    rows = list({row["intake_id"]: row for row in rows}.values())
+    intake_ids = [row["intake_id"] for row in rows]
+    try:
+        stored = set(
+            db.scalars(
+                select(models.Request.intake_id).where(
+                    models.Request.intake_id.in_(intake_ids)
+                )
+            )
+        )
+        fresh = [row for row in rows if row["intake_id"] not in stored]
+        inserted = {}
+        if fresh:
+            dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+            db.execute(
+                dialect.insert(models.Request).on_conflict_do_nothing(
+                    index_elements=["intake_id"]
+                ),
+                fresh,
+            )
+            inserted = {
+                row.intake_id: (row.id, row.relatedDistrict)
+                for row in db.execute(
+                    select(
+                        models.Request.intake_id,
+                        models.Request.id,
+                        models.Request.relatedDistrict,
+                    ).where(models.Request.intake_id.in_([row["intake_id"] for row in fresh]))
+                )
+            }
+            stats.requests_added(db, [row for row in fresh if row["intake_id"] in inserted])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return inserted
+
+def duplicate_candidates(db: Session, request: schemas.RequestCreate, now: datetime):
+    """
+    Pending requests submitted in the last DEDUP_WINDOW_MINUTES in the nine
+    dedup grid cells around `request`, oldest first: one lookup on the
+    dedup_key index.
+    """
+    keys = dedup_candidate_keys(
+        request.tckn, request.type, request.subtype, request.latitude, request.longitude
+    )
+    if not keys:
+        return []
+    return (
+        db.query(models.Request)
+        .filter(
+            models.Request.dedup_key.in_(keys),
+            models.Request.timestamp >= now - timedelta(minutes=DEDUP_WINDOW_MINUTES),
+            models.Request.status == "pending",
+        )
+        .order_by(models.Request.timestamp, models.Request.id)
+        .limit(20)
+        .all()
+    )
+
+def pick_duplicate(candidates, request: schemas.RequestCreate):
+    """
+    The first candidate with the same TCKN, type and subtype within
+    DEDUP_RADIUS_M meters of `request`, measured exactly, or None.
+    """
+    for candidate in candidates:
+        if (
+            candidate.tckn == request.tckn
+            and candidate.type == request.type
+            and candidate.subtype == request.subtype
+            and geodesic(
+                (candidate.latitude, candidate.longitude),
+                (request.latitude, request.longitude),
+            ).meters
+            <= DEDUP_RADIUS_M
+        ):
+            return candidate
+    return None
+
+def find_duplicate_request(db: Session, request: schemas.RequestCreate, now: datetime):
+    """
+    Returns the oldest pending request with the same TCKN, type and subtype
+    within DEDUP_RADIUS_M meters, submitted in the last DEDUP_WINDOW_MINUTES,
+    or None. One lookup on the dedup_key index over the nine grid cells
+    around the location; only those few candidates are measured exactly.
+    """
+    return pick_duplicate(duplicate_candidates(db, request, now), request)
+
+def intake_status(db: Session, intake_id: str):
+    """The stored request for an intake id, as (id, relatedDistrict), or None."""
+    for table in (models.Request.__table__, models.ArchivedRequest.__table__):
+        row = db.execute(
+            select(table.c.id, table.c.relatedDistrict).where(table.c.intake_id == intake_id)
+        ).first()
+        if row is not None:
+            return row
+    return None
+
+def count_requests_by_district(db: Session, district_id: int = None):
+    """
+    Counts requests per district and status with a single GROUP BY query.
+    Archived requests count as resolved, as in the /stats counters; they
+    are read from the per-district archive counters, not the archive.
+
+    Returns a mapping of district id to `{status: count}`.
+    """
+    query = db.query(
+        models.Request.relatedDistrict, models.Request.status, func.count(models.Request.id)
+    )
+    if district_id is not None:
+        query = query.filter(models.Request.relatedDistrict == district_id)
+    counts = {}
+    for related_district, status, count in query.group_by(
+        models.Request.relatedDistrict, models.Request.status
+    ):
+        counts.setdefault(related_district, {})[status] = count
+    archived = stats.read_counters(
+        db,
+        [stats.ARCHIVED_DISTRICT],
+        keys=None if district_id is None else [str(district_id)],
+    )[stats.ARCHIVED_DISTRICT]
+    for key, count in archived.items():
+        district_counts = counts.setdefault(int(key), {})
+        district_counts["resolved"] = district_counts.get("resolved", 0) + count
+    return counts
+
+# Keyset sort orders for request listings, each backed by a composite index
+REQUEST_SORTS = {
+    "id": (models.Request.id,),
+    "priority": (models.Request.priority, models.Request.timestamp, models.Request.id),
+}
+
+def encode_cursor(values):
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    ).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def _cursor_value(value, column):
+    # Checked against the sort key's column type, so a forged cursor is
+    # rejected here instead of failing in the database
+    if isinstance(column.type, DateTime):
+        if not isinstance(value, str):
+            raise TypeError
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Integer):
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise TypeError
+        return value
+    raise TypeError
+
+def decode_cursor(cursor: str, sort: str):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        columns = REQUEST_SORTS[sort]
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [_cursor_value(value, column) for value, column in zip(values, columns)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def request_source(include_archived: bool = False):
+    """
+    The entity request listings read from: `models.Request`, or with
+    `include_archived` the live and archived requests as one UNION ALL
+    subquery. Postgres pushes filters, ORDER BY and LIMIT into both
+    branches, so each table is still read through its own indexes.
+    """
+    if not include_archived:
+        return models.Request
+    both = union_all(
+        select(models.Request.__table__), select(models.ArchivedRequest.__table__)
+    ).subquery("all_requests")
+    return aliased(models.Request, both)
+
+def filter_requests(query, filters: schemas.RequestFilters, entity=models.Request):
+    """
+    Applies the listing filters to a query over `entity` (see request_source).
+    """
+    if filters.status is not None:
+        query = query.filter(entity.status == filters.status)
+    if filters.type is not None:
+        query = query.filter(entity.type == filters.type)
+    if filters.district_id is not None:
+        query = query.filter(entity.relatedDistrict == filters.district_id)
+    if filters.since is not None:
+        query = query.filter(entity.timestamp >= filters.since)
+    if filters.until is not None:
+        query = query.filter(entity.timestamp < filters.until)
+    if filters.min_priority is not None:
+        query = query.filter(entity.priority >= filters.min_priority)
+    return query
+
+def page_requests(
+    db: Session,
+    filters: schemas.RequestFilters,
+    sort: str = "id",
+    cursor: str = None,
+    limit: int = 500,
+    fields=None,
+):
+    """
+    Fetches one page of requests using keyset pagination.
+
+    `sort="id"` pages in insertion order; `sort="priority"` pages by priority
+    (highest first), then oldest first. When `fields` is given only those
+    columns are loaded and plain dicts are returned instead of ORM objects.
+
+    Returns the rows and the cursor of the next page (None on the last page).
+    """
+    keys = REQUEST_SORTS[sort]
+    entity = request_source(filters.include_archived)
+    if fields is None:
+        query = db.query(entity)
+    else:
+        names = list(dict.fromkeys(list(fields) + [key.key for key in keys]))
+        query = db.query(*[getattr(entity, name) for name in names])
+    query = filter_requests(query, filters, entity)
+
+    if cursor is not None:
+        values = decode_cursor(cursor, sort)
+        if sort == "id":
+            query = query.filter(entity.id > values[0])
+        else:
+            priority, timestamp, request_id = values
+            query = query.filter(
+                or_(
+                    entity.priority < priority,
+                    and_(
+                        entity.priority == priority,
+                        or_(
+                            entity.timestamp > timestamp,
+                            and_(entity.timestamp == timestamp, entity.id > request_id),
+                        ),
+                    ),
+                )
+            )
+
+    if sort == "id":
+        query = query.order_by(entity.id)
+    else:
+        query = query.order_by(entity.priority.desc(), entity.timestamp, entity.id)
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, key.key) for key in keys])
+    if fields is not None:
+        rows = [{name: getattr(row, name) for name in fields} for row in rows]
+    return rows, next_cursor
+
+def export_requests(
+    db: Session,
+    filters: schemas.RequestFilters,
+    fmt: str = "ndjson",
+    fields=None,
+    batch_size: int = 1000,
+):
+    """
+    Yields the matching requests as NDJSON lines or CSV text, in id order.
+
+    Rows are read through a server-side cursor `batch_size` at a time and
+    emitted one chunk per batch, so memory use does not grow with the table.
+    """
+    fields = list(fields or schemas.RequestResponse.__fields__)
+    entity = request_source(filters.include_archived)
+    query = filter_requests(
+        db.query(*[getattr(entity, name) for name in fields]), filters, entity
+    ).order_by(entity.id)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer is not None:
+        writer.writerow(fields)
+    count = 0
+    for row in query.yield_per(batch_size):
+        if writer is not None:
+            writer.writerow(
+                [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            )
+        else:
+            buffer.write(json.dumps(dict(zip(fields, row)), default=str))
+            buffer.write("\n")
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def top_pending_requests(db: Session, limit: int = 20, district_id: int = None, now=None):
+    """
+    Returns the `limit` most urgent pending requests with their effective priority.
+
+    Effective priority is computed at read time from type and age (see
+    `tasks.escalated_priority`). Requests of one type escalate along the same
+    curve, so the oldest ones of each type are the most urgent; each type is
+    therefore read as a short range scan of the pending-queue index and the
+    per-type heads are merged, all in a single round trip.
+
+    Returns a list of `(request, effective_priority)` pairs, most urgent first.
+    """
+    now = now or datetime.utcnow()
+    known_types = sorted(set(DEFAULT_PRIORITIES) | set(PRIORITY_INCREASE))
+    pending = [models.Request.status == "pending"]
+    if district_id is not None:
+        pending.append(models.Request.relatedDistrict == district_id)
+    legs = [models.Request.type == request_type for request_type in known_types]
+    # Unknown types share the default priority, so one leg covers all of them
+    legs.append(models.Request.type.notin_(known_types))
+    heads = union_all(
+        *[
+            select(
+                select(models.Request.id)
+                .where(*pending, leg)
+                .order_by(models.Request.timestamp, models.Request.id)
+                .limit(limit)
+                .subquery()
+            )
+            for leg in legs
+        ]
+    )
+    candidates = db.query(models.Request).filter(models.Request.id.in_(heads)).all()
+    scored = (
+        (
+            request,
+            escalated_priority(
+                request.type, (now - request.timestamp).total_seconds() // 3600
+            ),
+        )
+        for request in candidates
+    )
+    return heapq.nsmallest(
+        limit, scored, key=lambda item: (-item[1], item[0].timestamp, item[0].id)
+    )
+
+class InsufficientInventoryError(Exception):
+    """Raised when an inventory change would take an item below zero."""
+
+    def __init__(self, district_id, item, available):
+        super().__init__(f"Insufficient {item} in district {district_id}: {available}")
+        self.district_id = district_id
+        self.item = item
+        self.available = available
+
+# Rendered /districts responses as (etag, body), see main.get_districts.
+# Opt-in; entries are dropped after any commit that touched a district.
+DISTRICTS_RESPONSE_CACHE = os.getenv("DISTRICTS_RESPONSE_CACHE", "0") == "1"
+district_response_cache = TTLCache(
+    maxsize=8, ttl=float(os.getenv("DISTRICTS_RESPONSE_CACHE_TTL", "30"))
+)
+
+def touch_districts(db: Session, district_ids):
+    """
+    Bumps the version of districts whose stock or request statuses change in
+    the current transaction. New requests do not need this: the district
+    fingerprint includes the highest request id.
+    """
+    ids = sorted(set(district_ids) - {None})
+    if not ids:
+        return
+    db.execute(
+        update(models.District.__table__)
+        .where(models.District.id.in_(ids))
+        .values(version=models.District.version + 1)
+    )
+    db.info["district_versions_changed"] = True
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_district_responses(session):
+    if session.info.pop("district_versions_changed", False):
+        district_response_cache.clear()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_district_changes(session):
+    session.info.pop("district_versions_changed", None)
+
+def districts_fingerprint(db: Session, district_id: int = None):
+    """
+    Cheap summary of everything a district response is built from: district
+    versions plus the highest request id (new requests change the counts).
+    Runs one Core query against indexes, without loading any ORM objects.
+
+    Returns a tuple, or None when `district_id` does not exist.
+    """
+    districts = models.District.__table__
+    requests = models.Request.__table__
+    last_request = select(func.max(requests.c.id))
+    if district_id is None:
+        query = select(
+            func.count(districts.c.id),
+            func.coalesce(func.sum(districts.c.version), 0),
+            last_request.scalar_subquery(),
+        )
+    else:
+        query = select(
+            districts.c.id,
+            districts.c.version,
+            last_request.where(requests.c.relatedDistrict == district_id).scalar_subquery(),
+        ).where(districts.c.id == district_id)
+    row = db.execute(query).first()
+    return None if row is None else tuple(0 if value is None else value for value in row)
+
+def get_inventories(db: Session, district_ids=None):
+    """
+    Loads inventories with one query.
+
+    Returns a mapping of district id to `{item: quantity}`.
+    """
+    query = db.query(
+        models.InventoryItem.district_id, models.InventoryItem.item, models.InventoryItem.quantity
+    )
+    if district_ids is not None:
+        query = query.filter(models.InventoryItem.district_id.in_(district_ids))
+    inventories = {}
+    for district_id, item, quantity in query:
+        inventories.setdefault(district_id, {})[item] = quantity
+    return inventories
+
+def lock_districts(db: Session, district_ids):
+    """
+    Locks district rows (SELECT ... FOR UPDATE) in ascending id order, so
+    concurrent multi-district operations cannot deadlock each other.
+
+    Returns the ids that exist.
+    """
+    rows = (
+        db.query(models.District.id)
+        .filter(models.District.id.in_(set(district_ids)))
+        .order_by(models.District.id)
+        .with_for_update()
+        .all()
+    )
+    return {row.id for row in rows}
+
+def _upsert_statement(db: Session):
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(models.InventoryItem)
+
+def apply_inventory_changes(
+    db: Session,
+    district_id: int,
+    changes,
+    reason: str = "adjustment",
+    username: str = None,
+    request_id: int = None,
+    transfer_id: str = None,
+    movements=None,
+):
+    """
+    Applies `{item: delta}` to a district's stock inside the current transaction.
+
+    Every change is a single atomic statement (`quantity = quantity + delta`),
+    so concurrent writers never lose updates. Decrements only apply while the
+    result stays non-negative; otherwise InsufficientInventoryError is raised and
+    the caller must roll back. Items that reach zero are removed. Items are
+    touched in sorted order to keep row-lock order consistent.
+
+    The changes are appended to the inventory ledger as one movement per item
+    with `reason` and the given references, or as `movements` (see
+    ledger.movement) when the caller itemizes them itself.
+    """
+    table = models.InventoryItem.__table__
+    increments = {item: delta for item, delta in changes.items() if delta >= 0}
+    for item in sorted(changes):
+        delta = changes[item]
+        if delta >= 0:
+            continue
+        result = db.execute(
+            update(table)
+            .where(
+                table.c.district_id == district_id,
+                table.c.item == item,
+                table.c.quantity + delta >= 0,
+            )
+            .values(quantity=table.c.quantity + delta)
+        )
+        if result.rowcount != 1:
+            available = db.execute(
+                select(table.c.quantity).where(
+                    table.c.district_id == district_id, table.c.item == item
+                )
+            ).scalar()
+            raise InsufficientInventoryError(district_id, item, available or 0)
+
+    if increments:
+        statement = _upsert_statement(db).values(
+            [
+                {"district_id": district_id, "item": item, "quantity": increments[item]}
+                for item in sorted(increments)
+            ]
+        )
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[table.c.district_id, table.c.item],
+                set_={"quantity": table.c.quantity + statement.excluded.quantity},
+            )
+        )
+
+    db.execute(
+        delete(table).where(
+            table.c.district_id == district_id,
+            table.c.item.in_(list(changes)),
+            table.c.quantity == 0,
+        )
+    )
+    if movements is None:
+        movements = [
+            ledger.movement(
+                district_id, item, changes[item], reason, request_id, transfer_id, username
+            )
+            for item in sorted(changes)
+        ]
+    ledger.record(db, movements)
+    stats.inventory_changed(db, changes)
+    touch_districts(db, [district_id])
+
+def resolve_pending_requests(
+    db: Session, district_id: int, now=None, chunk_size: int = 5000, username: str = None
+):
+    """
+    Allocates a district's current stock to its pending requests.
+
+    Requests are served in effective priority order (highest first, then
+    oldest), matching on the `"{type} - {subtype}"` inventory key; a request
+    that no longer fits the remaining stock is skipped so smaller ones behind it
+    can still be served. The caller must hold the district lock (see
+    `lock_districts`) and commit.
+
+    Returns a summary dict: resolved request ids, quantities allocated per
+    item, number of matching requests left pending and the remaining stock.
+    """
+    now = now or datetime.utcnow()
+    stock = get_inventories(db, [district_id]).get(district_id, {})
+    if not stock:
+        return {"resolved": [], "allocated": {}, "unfulfilled": 0, "inventory": {}}
+
+    inventory_key = models.Request.type + " - " + models.Request.subtype
+    candidates = (
+        db.query(
+            models.Request.id,
+            models.Request.type,
+            models.Request.quantity,
+            models.Request.timestamp,
+            inventory_key.label("key"),
+        )
+        .filter(
+            models.Request.relatedDistrict == district_id,
+            models.Request.status == "pending",
+            inventory_key.in_(list(stock)),
+        )
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    candidates.sort(
+        key=lambda row: (
+            -escalated_priority(row.type, (now - row.timestamp).total_seconds() // 3600),
+            row.timestamp,
+            row.id,
+        )
+    )
+
+    remaining = dict(stock)
+    allocated = {}
+    resolved = []
+    resolved_types = {}
+    movements = []
+    for row in candidates:
+        if remaining[row.key] >= row.quantity:
+            remaining[row.key] -= row.quantity
+            allocated[row.key] = allocated.get(row.key, 0) + row.quantity
+            resolved.append(row.id)
+            resolved_types[row.type] = resolved_types.get(row.type, 0) + 1
+            movements.append(
+                ledger.movement(
+                    district_id, row.key, -row.quantity, "request", row.id, username=username
+                )
+            )
+
+    for start in range(0, len(resolved), chunk_size):
+        db.execute(
+            update(models.Request.__table__)
+            .where(models.Request.id.in_(resolved[start : start + chunk_size]))
+            .values(status="resolved", resolved_at=now)
+        )
+    for request_type, count in resolved_types.items():
+        stats.request_status_changed(db, request_type, district_id, "pending", "resolved", count)
+    if allocated:
+        # Also bumps the district version for the status changes above
+        apply_inventory_changes(
+            db,
+            district_id,
+            {key: -quantity for key, quantity in allocated.items()},
+            movements=movements,
+        )
+
+    return {
+        "resolved": resolved,
+        "allocated": allocated,
+        "unfulfilled": len(candidates) - len(resolved),
+        "inventory": {key: quantity for key, quantity in remaining.items() if quantity > 0},
+    }
+
+def migrate_legacy_inventory(db: Session):
+    """
+    Moves stock still stored in the legacy `District.inventory` JSON documents
+    into the district_inventory table and clears the documents to NULL, so
+    later startups find nothing to do. Safe to run on every startup.
+    """
+    legacy = models.District.inventory.isnot(None)
+    rows = (
+        db.query(models.District.id, models.District.inventory)
+        .filter(legacy)
+        .order_by(models.District.id)
+        .with_for_update()
+        .all()
+    )
+    for district_id, inventory in rows:
+        if isinstance(inventory, dict) and inventory:
+            apply_inventory_changes(db, district_id, inventory, reason="migration")
+    if rows:
+        db.execute(
+            update(models.District.__table__).where(legacy).values(inventory=null())
+        )
+    db.commit()
+
 def get_all_requests(db: Session):
     return db.query(models.Request).all()
 
@@ -38,6 +784,11 @@ def resolve_request(db: Session, request_id: int):
     db_request = db.query(models.Request).filter(models.Request.id == request_id).first()
     if not db_request:
         raise HTTPException(status_code=404, detail="Request not found")
+    stats.request_status_changed(
+        db, db_request.type, db_request.relatedDistrict, db_request.status, "resolved"
+    )
     db_request.status = "resolved"
+    db_request.resolved_at = datetime.utcnow()
+    touch_districts(db, [db_request.relatedDistrict])
     db.commit()
     return db_request
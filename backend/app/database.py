@@ -1,12 +1,221 @@
-from sqlalchemy import create_engine
+import os
+import time
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy import inspect as inspect_schema
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.schema import CreateColumn
+from app import metrics, telemetry
 
-SQLALCHEMY_DATABASE_URL = "postgresql://admin:password@db/disaster_db"
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "DATABASE_URL", "postgresql://admin:password@db/disaster_db"
+)
+
+# Serve the hot endpoints from the event loop through asyncpg (DB_ASYNC=1)
+# instead of the threadpool with blocking sessions (the default)
+USE_ASYNC_DB = os.getenv("DB_ASYNC", "0") == "1"
+
+
+def async_database_url(url: str) -> str:
+    """Returns the asyncio driver variant of a database URL."""
+    for sync_prefix, async_prefix in (
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix) :]
+    return url
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    return os.getenv(name, "1" if default else "0").lower() in ("1", "true", "yes", "on")
+
+
+# Connection pool settings, shared by the API processes and the Celery worker
+# (each process gets its own pool; size them so the sum stays below the
+# server's max_connections, or below PgBouncer's pool when it sits in front)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))  # seconds, -1 disables
+DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 disables
+
+# Behind PgBouncer in transaction mode: no server-side prepared statements and
+# no session-level settings (the statement timeout is set per transaction)
+DB_PGBOUNCER = env_flag("DB_PGBOUNCER")
+
+POOL_CHECKOUT_SECONDS = metrics.registry.histogram(
+    "db_pool_checkout_seconds",
+    "Time to check a connection out of the pool, including waits and new connects",
+)
+POOL_WAIT_SECONDS = metrics.registry.histogram(
+    "db_pool_wait_seconds",
+    "Checkout time of requests that found the pool exhausted and had to wait",
+)
+POOL_CONNECT_SECONDS = metrics.registry.histogram(
+    "db_pool_connect_seconds", "Time to open a new database connection"
+)
+POOL_TIMEOUTS = metrics.registry.counter(
+    "db_pool_timeouts_total", "Checkouts that gave up after the pool timeout"
+)
+
+
+class InstrumentedPoolMixin:
+    """
+    Records checkout latency, waits on an exhausted pool, connect latency and
+    timeouts for a QueuePool. Pools are labelled by `metrics_label`, a class
+    attribute so that it survives `Pool.recreate()` on `engine.dispose()`.
+    """
+
+    metrics_label = "sync"
+
+    def exhausted(self) -> bool:
+        return self._max_overflow > -1 and self.checkedout() >= (
+            self.size() + self._max_overflow
+        )
+
+    def connect(self):
+        waited = self.exhausted()
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc(pool=self.metrics_label)
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - start, pool=self.metrics_label)
+            raise
+        elapsed = time.perf_counter() - start
+        POOL_CHECKOUT_SECONDS.observe(elapsed, pool=self.metrics_label)
+        if waited:
+            POOL_WAIT_SECONDS.observe(elapsed, pool=self.metrics_label)
+        return connection
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        try:
+            return super()._create_connection()
+        finally:
+            POOL_CONNECT_SECONDS.observe(
+                time.perf_counter() - start, pool=self.metrics_label
+            )
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    metrics_label = "sync"
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
+def engine_options(url: str, asyncio: bool = False) -> dict:
+    """
+    Keyword arguments for create_engine/create_async_engine built from the
+    DB_* environment settings.
+    """
+    parsed = make_url(url)
+    options = {"connect_args": {}}
+    if parsed.get_backend_name() == "sqlite":
+        # SQLite is only a local stand-in, shared across threads
+        options["connect_args"]["check_same_thread"] = False
+        if parsed.database in (None, "", ":memory:"):
+            return options
+
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if asyncio else InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    if parsed.get_backend_name() != "postgresql":
+        return options
+
+    connect_args = options["connect_args"]
+    if asyncio and DB_PGBOUNCER:
+        # asyncpg prepares every statement server-side by default
+        connect_args.update(statement_cache_size=0, prepared_statement_cache_size=0)
+    if DB_STATEMENT_TIMEOUT_MS and not DB_PGBOUNCER:
+        if asyncio:
+            connect_args["server_settings"] = {
+                "statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)
+            }
+        else:
+            connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    return options
+
+
+class TimeoutSession(Session):
+    """Session applying DB_STATEMENT_TIMEOUT_MS per transaction (PgBouncer mode)."""
+
+
+@event.listens_for(TimeoutSession, "after_begin")
+def set_local_statement_timeout(session, transaction, connection):
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(
+            f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}"
+        )
+
+
+# Startup options are dropped by PgBouncer, so use SET LOCAL there instead
+SESSION_CLASS = (
+    TimeoutSession if DB_PGBOUNCER and DB_STATEMENT_TIMEOUT_MS else Session
+)
 
 # Create database engine
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine, class_=SESSION_CLASS
+)
+
+# Async engine, created lazily so the sync configuration does not need asyncpg
+async_engine = None
+AsyncSessionLocal = None
+
+
+def instrumented_pools():
+    pools = [engine.pool]
+    if async_engine is not None:
+        pools.append(async_engine.sync_engine.pool)
+    return [pool for pool in pools if isinstance(pool, InstrumentedPoolMixin)]
+
+
+def pool_gauge(name: str, documentation: str, read):
+    return metrics.registry.gauge(
+        name,
+        documentation,
+        collect=lambda: {
+            (("pool", pool.metrics_label),): read(pool) for pool in instrumented_pools()
+        },
+    )
+
+
+pool_gauge("db_pool_checked_out", "Connections currently checked out", lambda p: p.checkedout())
+pool_gauge("db_pool_idle", "Idle connections held by the pool", lambda p: p.checkedin())
+pool_gauge("db_pool_overflow", "Connections open beyond pool_size", lambda p: max(p.overflow(), 0))
+pool_gauge("db_pool_size", "Configured pool_size", lambda p: p.size())
+
+
+# Per-request SQL accounting for app.telemetry, on every engine (the async
+# engine's sync_engine included); only requests under the telemetry
+# middleware are recorded
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if telemetry.current_request.get() is not None:
+        context._telemetry_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_telemetry_start", None)
+    if start is not None:
+        telemetry.record_query(time.perf_counter() - start)
+
 
 # Base class for models
 Base = declarative_base()
@@ -19,7 +228,75 @@ def get_db():
     finally:
         db.close()
 
+
+def get_async_session_factory():
+    global async_engine, AsyncSessionLocal
+    if AsyncSessionLocal is None:
+        url = os.getenv(
+            "ASYNC_DATABASE_URL", async_database_url(SQLALCHEMY_DATABASE_URL)
+        )
+        async_engine = create_async_engine(url, **engine_options(url, asyncio=True))
+        AsyncSessionLocal = sessionmaker(
+            bind=async_engine,
+            class_=AsyncSession,
+            sync_session_class=SESSION_CLASS,
+            autocommit=False,
+            autoflush=False,
+            expire_on_commit=False,
+        )
+    return AsyncSessionLocal
+
+
+# Dependency to get an async DB session
+async def get_async_db():
+    async with get_async_session_factory()() as db:
+        yield db
+
+
+def hot_path(async_endpoint):
+    """
+    Picks the handler of a hot endpoint: `async_endpoint` when DB_ASYNC=1,
+    the decorated sync handler (run in the threadpool) otherwise.
+
+    `async_endpoint` takes the same parameters, with `db: AsyncSession =
+    Depends(get_async_db)`. It awaits its database work and hands CPU-bound
+    or blocking work to the threadpool, since its body runs on the event
+    loop; `AsyncSession.run_sync` is only for functions that do nothing but
+    database work.
+    """
+
+    def select_handler(endpoint):
+        return async_endpoint if USE_ASYNC_DB else endpoint
+
+    return select_handler
+
+
 # Initialize the database schema
+def add_missing_columns(bind):
+    """
+    Adds columns introduced after a table was created. New columns must be
+    nullable or have a server default so existing rows stay valid.
+    """
+    existing_tables = inspect_schema(bind).get_table_names()
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {
+                column["name"]
+                for column in inspect_schema(connection).get_columns(table.name)
+            }
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                    connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+
+
 def init_db():
     from app.models import User  # Import all models here
     Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    # create_all skips existing tables, so add indexes introduced since then
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Iterable, List, Optional, Set
+
+from app import metrics
+
+# "redis" fans events out across uvicorn workers and the Celery worker through
+# Redis pub/sub; "memory" only reaches subscribers of the publishing process
+EVENT_BUS = os.getenv("EVENT_BUS", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+EVENT_CHANNEL = os.getenv("EVENT_CHANNEL", "disaster-events")
+
+# Events buffered per subscriber before it is considered too slow
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("EVENT_SUBSCRIBER_QUEUE_SIZE", "256"))
+# Events buffered for the Redis publisher thread before new ones are dropped
+PUBLISH_QUEUE_SIZE = int(os.getenv("EVENT_PUBLISH_QUEUE_SIZE", "10000"))
+
+EVENTS_PUBLISHED = metrics.registry.counter(
+    "events_published_total", "Change events published, by type"
+)
+EVENTS_DROPPED = metrics.registry.counter(
+    "events_dropped_total", "Events dropped, by reason (publish queue full, slow subscriber)"
+)
+metrics.registry.gauge(
+    "event_subscribers",
+    "Open change feed connections in this process",
+    collect=lambda: {(): len(broker.subscribers)},
+)
+
+
+def make_event(event_type: str, data: dict, districts: Iterable[int] = ()) -> dict:
+    """
+    Builds an event. `districts` lists the district ids the event concerns,
+    used for per-district subscriptions.
+    """
+    return {
+        "type": event_type,
+        "districts": sorted({district for district in districts if district is not None}),
+        "data": data,
+        "time": datetime.utcnow().isoformat(),
+    }
+
+
+class Subscriber:
+    """
+    One change feed connection: a bounded queue on the connection's event
+    loop, plus optional district and event type filters.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        district_id: Optional[int] = None,
+        types: Optional[Set[str]] = None,
+        maxsize: int = SUBSCRIBER_QUEUE_SIZE,
+    ):
+        self.loop = loop
+        self.district_id = district_id
+        self.types = types
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def wants(self, event: dict) -> bool:
+        if self.types and event["type"] not in self.types:
+            return False
+        return self.district_id is None or self.district_id in event["districts"]
+
+    def offer(self, event: dict):
+        """
+        Enqueues an event; runs on the subscriber's loop. A subscriber that
+        fell `maxsize` events behind loses its backlog and gets a single
+        "resync" event instead, telling the client to reload its state. Memory
+        stays bounded and fast consumers are never held up.
+        """
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            EVENTS_DROPPED.inc(self.queue.qsize(), reason="slow_subscriber")
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(make_event("resync", {"reason": "slow consumer"}))
+
+
+class Broker:
+    """Fans events out to the subscribers of this process."""
+
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, subscriber: Subscriber):
+        with self._lock:
+            self.subscribers.add(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            self.subscribers.discard(subscriber)
+
+    def dispatch(self, event: dict):
+        """Delivers an event to every interested subscriber; callable from any thread."""
+        with self._lock:
+            targets = [subscriber for subscriber in self.subscribers if subscriber.wants(event)]
+        for subscriber in targets:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+            except RuntimeError:
+                # The subscriber's loop is closed; the connection is gone
+                self.unsubscribe(subscriber)
+
+
+broker = Broker()
+
+
+class RedisBus:
+    """
+    Publishes events to a Redis channel from a background thread, so request
+    handlers never block on Redis, and relays the channel to the local broker.
+    """
+
+    def __init__(self, url: str = REDIS_URL, channel: str = EVENT_CHANNEL):
+        self.url = url
+        self.channel = channel
+        self._outbox: "queue.Queue[str]" = queue.Queue(maxsize=PUBLISH_QUEUE_SIZE)
+        self._client = None
+        self._started = set()
+        self._lock = threading.Lock()
+
+    def client(self):
+        if self._client is None:
+            import redis
+
+            self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def _start(self, name: str, target):
+        with self._lock:
+            if name not in self._started:
+                self._started.add(name)
+                threading.Thread(target=target, name=f"events-{name}", daemon=True).start()
+
+    def publish(self, event: dict):
+        self._start("publisher", self._publish_loop)
+        try:
+            self._outbox.put_nowait(json.dumps(event))
+        except queue.Full:
+            EVENTS_DROPPED.inc(reason="publish_queue_full")
+
+    def _publish_loop(self):
+        while True:
+            message = self._outbox.get()
+            try:
+                self.client().publish(self.channel, message)
+            except Exception as e:
+                EVENTS_DROPPED.inc(reason="redis_error")
+                print(f"Could not publish event to Redis: {e}")
+                time.sleep(1)
+            finally:
+                self._outbox.task_done()
+
+    def flush(self, timeout: float = 5.0):
+        """Waits until queued events have been handed to Redis, for at most `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        while self._outbox.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def listen(self):
+        self._start("listener", self._listen_loop)
+
+    def _listen_loop(self):
+        while True:
+            try:
+                pubsub = self.client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    broker.dispatch(json.loads(message["data"]))
+            except Exception as e:
+                print(f"Event listener lost Redis connection: {e}")
+                time.sleep(1)
+
+
+redis_bus = RedisBus() if EVENT_BUS == "redis" else None
+
+
+def publish(event_type: str, data: dict, districts: Iterable[int] = ()):
+    """
+    Publishes a change event to every feed subscriber. Call it after the
+    change has been committed; it never blocks on the network.
+    """
+    event = make_event(event_type, data, districts)
+    EVENTS_PUBLISHED.inc(type=event_type)
+    if redis_bus is not None:
+        redis_bus.publish(event)
+    else:
+        broker.dispatch(event)
+
+
+def flush(timeout: float = 5.0):
+    """Publishes the events still queued for Redis; call it before the process exits."""
+    if redis_bus is not None:
+        redis_bus.flush(timeout)
+
+
+def open_subscription(district_id: Optional[int] = None, types: Optional[List[str]] = None):
+    """Registers a subscriber for the running event loop."""
+    if redis_bus is not None:
+        redis_bus.listen()
+    subscriber = Subscriber(
+        asyncio.get_running_loop(), district_id, set(types) if types else None
+    )
+    broker.subscribe(subscriber)
+    return subscriber
+
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
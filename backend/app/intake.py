@@ -0,0 +1,398 @@
+# Write-behind intake for /submit-request.
+#
+# With REQUEST_INTAKE=redis the API validates a submission, appends it to a
+# Redis stream and answers 202 with an intake id. Writer processes
+# (`python -m app.intake`) read the stream through a consumer group, assign
+# districts and insert micro-batches, acknowledging entries only after the
+# commit. Delivery is at least once; the unique `requests.intake_id` column
+# makes redeliveries harmless. REQUEST_INTAKE=memory does the same with an
+# in-process queue and writer thread (development only: queued submissions
+# are lost with the process). The default, "sync", stores before replying.
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app import crud, events, metrics
+from app.cache import TTLCache
+from app.database import SessionLocal
+from app.utils import dedup_key, default_priority, find_closest_district_ids
+
+REQUEST_INTAKE = os.getenv("REQUEST_INTAKE", "sync")
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+INTAKE_STREAM = os.getenv("INTAKE_STREAM", "request-intake")
+INTAKE_GROUP = os.getenv("INTAKE_GROUP", "intake-writers")
+
+# A batch is written once it has this many entries or its first entry has
+# waited this long, whichever comes first
+INTAKE_BATCH_SIZE = int(os.getenv("INTAKE_BATCH_SIZE", "500"))
+INTAKE_BATCH_MS = float(os.getenv("INTAKE_BATCH_MS", "50"))
+# Entries left unacknowledged this long by a dead writer are taken over
+INTAKE_CLAIM_IDLE_MS = int(os.getenv("INTAKE_CLAIM_IDLE_MS", "60000"))
+# How long "queued"/"failed" states stay queryable (stored rows are in the DB)
+INTAKE_STATUS_TTL = int(os.getenv("INTAKE_STATUS_TTL", "86400"))
+
+INTAKE_ENQUEUED = metrics.registry.counter(
+    "intake_enqueued_total", "Submissions accepted into the intake queue"
+)
+INTAKE_STORED = metrics.registry.counter(
+    "intake_stored_total", "Queued submissions inserted (redeliveries excluded)"
+)
+INTAKE_FAILED = metrics.registry.counter(
+    "intake_failed_total", "Queued submissions that could not be stored"
+)
+INTAKE_BATCH_ROWS = metrics.registry.histogram(
+    "intake_batch_rows", "Entries per intake batch", (1, 10, 50, 100, 250, 500, 1000, 5000)
+)
+INTAKE_LAG_SECONDS = metrics.registry.histogram(
+    "intake_lag_seconds", "Time from acceptance to commit of queued submissions"
+)
+
+Message = Tuple[str, dict]  # (queue message id, entry)
+
+
+def make_entry(payload: dict) -> dict:
+    return {
+        "intake_id": uuid.uuid4().hex,
+        "received": datetime.now().isoformat(),
+        "request": payload,
+    }
+
+
+class MemoryIntakeQueue:
+    """In-process queue with the interface of RedisIntakeQueue."""
+
+    def __init__(self):
+        self._queue: "queue.Queue[dict]" = queue.Queue()
+        self._status = TTLCache(maxsize=1_000_000, ttl=INTAKE_STATUS_TTL)
+
+    def enqueue(self, entry: dict):
+        self._status.set(entry["intake_id"], "queued")
+        self._queue.put(entry)
+
+    def read(self, count: int, block_ms: float) -> List[Message]:
+        try:
+            entries = [self._queue.get(timeout=block_ms / 1000)]
+        except queue.Empty:
+            return []
+        while len(entries) < count:
+            try:
+                entries.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return [(entry["intake_id"], entry) for entry in entries]
+
+    def release(self, messages: List[Message]):
+        for _, entry in messages:
+            self._queue.put(entry)
+
+    def ack(self, messages: List[Message]):
+        for _, entry in messages:
+            self._status.pop(entry["intake_id"])
+
+    def fail(self, messages: List[Message]):
+        for _, entry in messages:
+            self._status.set(entry["intake_id"], "failed")
+
+    def status(self, intake_id: str) -> Optional[str]:
+        return self._status.get(intake_id)
+
+
+class RedisIntakeQueue:
+    """
+    Redis stream read through a consumer group. A writer first re-reads its
+    own unacknowledged entries (it crashed between read and ack), then claims
+    entries other writers left idle for INTAKE_CLAIM_IDLE_MS, then reads new
+    ones. Acknowledged entries are deleted so the stream only holds the backlog.
+    """
+
+    def __init__(
+        self,
+        client,
+        stream: str = INTAKE_STREAM,
+        group: str = INTAKE_GROUP,
+        consumer: Optional[str] = None,
+        status_prefix: str = "intake:",
+    ):
+        self.client = client
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.status_prefix = status_prefix
+        # Pending entries are re-read from this id on; None once they are done
+        self._recover_from = "0"
+        self._last_claim = 0.0
+        self._group_ready = False
+
+    def enqueue(self, entry: dict):
+        # Status first: a writer may store the entry and clear it right away
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.set(self.status_prefix + entry["intake_id"], "queued", ex=INTAKE_STATUS_TTL)
+        pipeline.xadd(self.stream, {"entry": json.dumps(entry)})
+        pipeline.execute()
+
+    def ensure_group(self):
+        import redis
+
+        if self._group_ready:
+            return
+        try:
+            self.client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    def read(self, count: int, block_ms: float) -> List[Message]:
+        self.ensure_group()
+        while self._recover_from is not None:
+            # Page through the pending entries, each of them once
+            response = self.client.xreadgroup(
+                self.group, self.consumer, {self.stream: self._recover_from}, count=count
+            )
+            entries = [entry for _, stream_entries in response or [] for entry in stream_entries]
+            if not entries:
+                self._recover_from = None
+                break
+            self._recover_from = entries[-1][0]
+            messages = self._decode_entries(entries)
+            if messages:
+                return messages
+        if time.monotonic() - self._last_claim > INTAKE_CLAIM_IDLE_MS / 1000:
+            self._last_claim = time.monotonic()
+            claimed = self.client.xautoclaim(
+                self.stream, self.group, self.consumer, INTAKE_CLAIM_IDLE_MS, count=count
+            )
+            messages = self._decode_entries(claimed[1])
+            if messages:
+                return messages
+        return self._decode(
+            self.client.xreadgroup(
+                self.group,
+                self.consumer,
+                {self.stream: ">"},
+                count=count,
+                block=max(1, int(block_ms)),
+            )
+        )
+
+    def _decode(self, response) -> List[Message]:
+        return [
+            message
+            for _, entries in response or []
+            for message in self._decode_entries(entries)
+        ]
+
+    @staticmethod
+    def _decode_entries(entries) -> List[Message]:
+        messages = []
+        for message_id, fields in entries:
+            if fields:  # entries deleted while pending come back empty
+                messages.append((message_id, json.loads(fields[b"entry"])))
+        return messages
+
+    def release(self, messages: List[Message]):
+        """Entries stay pending for this writer; re-read them first next time."""
+        self._recover_from = "0"
+
+    def ack(self, messages: List[Message]):
+        if not messages:
+            return
+        ids = [message_id for message_id, _ in messages]
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.xack(self.stream, self.group, *ids)
+        pipeline.xdel(self.stream, *ids)
+        pipeline.delete(*[self.status_prefix + entry["intake_id"] for _, entry in messages])
+        pipeline.execute()
+
+    def fail(self, messages: List[Message]):
+        """Parks entries that cannot be stored in "<stream>:failed" and acks them."""
+        pipeline = self.client.pipeline(transaction=False)
+        for message_id, entry in messages:
+            pipeline.xadd(f"{self.stream}:failed", {"entry": json.dumps(entry)})
+            pipeline.set(self.status_prefix + entry["intake_id"], "failed", ex=INTAKE_STATUS_TTL)
+            pipeline.xack(self.stream, self.group, message_id)
+            pipeline.xdel(self.stream, message_id)
+        pipeline.execute()
+
+    def status(self, intake_id: str) -> Optional[str]:
+        value = self.client.get(self.status_prefix + intake_id)
+        return value.decode() if value is not None else None
+
+
+class IntakeWriter:
+    """Drains an intake queue into the requests table in micro-batches."""
+
+    def __init__(
+        self,
+        intake_queue,
+        session_factory=SessionLocal,
+        batch_size: int = INTAKE_BATCH_SIZE,
+        batch_ms: float = INTAKE_BATCH_MS,
+    ):
+        self.queue = intake_queue
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.batch_ms = batch_ms
+
+    def collect(self, idle_ms: float = 1000) -> List[Message]:
+        """Waits up to `idle_ms` for an entry, then up to batch_ms for more."""
+        batch = self.queue.read(self.batch_size, idle_ms)
+        deadline = time.monotonic() + self.batch_ms / 1000
+        while batch and len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            more = self.queue.read(self.batch_size - len(batch), remaining * 1000)
+            if not more:
+                break
+            batch.extend(more)
+        return batch
+
+    def store(self, messages: List[Message]) -> Dict[str, Tuple[int, int]]:
+        """Inserts a batch in one transaction; returns the rows inserted now."""
+        db = self.session_factory()
+        try:
+            entries = [entry for _, entry in messages]
+            requests = [entry["request"] for entry in entries]
+            district_ids = find_closest_district_ids(
+                [request["latitude"] for request in requests],
+                [request["longitude"] for request in requests],
+                db,
+            )
+            rows = [
+                {
+                    "type": request["type"],
+                    "subtype": request["subtype"],
+                    "priority": default_priority(request["type"]),
+                    "latitude": request["latitude"],
+                    "longitude": request["longitude"],
+                    "quantity": request["quantity"] if request["quantity"] is not None else 1,
+                    "tckn": request.get("tckn"),
+                    "notes": request.get("notes"),
+                    "timestamp": datetime.fromisoformat(entry["received"]),
+                    "status": "pending",
+                    "relatedDistrict": district_id,
+                    "intake_id": entry["intake_id"],
+                    "dedup_key": dedup_key(
+                        request.get("tckn"),
+                        request["type"],
+                        request["subtype"],
+                        request["latitude"],
+                        request["longitude"],
+                    ),
+                }
+                for entry, request, district_id in zip(entries, requests, district_ids)
+            ]
+            return crud.insert_intake_requests(db, rows)
+        finally:
+            db.close()
+
+    def process(self, messages: List[Message]):
+        """
+        Stores and acknowledges a batch. When the batch fails, entries are
+        retried one by one: the ones that fail alone are parked as failed.
+        If every entry fails the database is likely down, so nothing is
+        acknowledged and the batch is redelivered later.
+        """
+        try:
+            self.finish(messages, self.store(messages))
+            return
+        except Exception as e:
+            print(f"Intake batch of {len(messages)} failed, retrying one by one: {e}")
+        failed = []
+        for message in messages:
+            try:
+                self.finish([message], self.store([message]))
+            except Exception:
+                failed.append(message)
+        if failed and len(failed) == len(messages):
+            self.queue.release(messages)
+            raise RuntimeError(f"Could not store any of {len(messages)} intake entries")
+        if failed:
+            INTAKE_FAILED.inc(len(failed))
+            self.queue.fail(failed)
+
+    def finish(self, messages: List[Message], inserted: Dict[str, Tuple[int, int]]):
+        self.queue.ack(messages)
+        INTAKE_BATCH_ROWS.observe(len(messages))
+        if not inserted:
+            return
+        INTAKE_STORED.inc(len(inserted))
+        now = datetime.now()
+        created = {}
+        for _, entry in messages:
+            if entry["intake_id"] in inserted:
+                received = datetime.fromisoformat(entry["received"])
+                INTAKE_LAG_SECONDS.observe(max((now - received).total_seconds(), 0))
+        for _, district_id in inserted.values():
+            created[district_id] = created.get(district_id, 0) + 1
+        events.publish(
+            "requests.created",
+            {"count": len(inserted), "by_district": {str(k): v for k, v in created.items()}},
+            created,
+        )
+
+    def run_once(self, idle_ms: float = 1000) -> int:
+        messages = self.collect(idle_ms)
+        if messages:
+            self.process(messages)
+        return len(messages)
+
+    def run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Intake writer error: {e}")
+                time.sleep(1)
+
+
+def make_queue(backend: str = REQUEST_INTAKE):
+    if backend == "redis":
+        import redis
+
+        return RedisIntakeQueue(redis.Redis.from_url(REDIS_URL))
+    if backend == "memory":
+        return MemoryIntakeQueue()
+    return None
+
+
+intake_queue = make_queue()
+_writer_lock = threading.Lock()
+_writer_started = False
+
+
+def submit(payload: dict) -> str:
+    """Queues a validated RequestCreate payload; returns its intake id."""
+    global _writer_started
+    if isinstance(intake_queue, MemoryIntakeQueue) and not _writer_started:
+        with _writer_lock:
+            if not _writer_started:
+                _writer_started = True
+                threading.Thread(
+                    target=IntakeWriter(intake_queue).run, name="intake-writer", daemon=True
+                ).start()
+    entry = make_entry(payload)
+    intake_queue.enqueue(entry)
+    INTAKE_ENQUEUED.inc()
+    return entry["intake_id"]
+
+
+def main():
+    if not isinstance(intake_queue, RedisIntakeQueue):
+        raise SystemExit("Set REQUEST_INTAKE=redis to run a standalone intake writer")
+    print(f"Intake writer {intake_queue.consumer} reading {INTAKE_STREAM}")
+    try:
+        IntakeWriter(intake_queue).run()
+    finally:
+        events.flush()
+
+
+if __name__ == "__main__":
+    main()
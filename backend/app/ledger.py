@@ -0,0 +1,340 @@
+# Inventory ledger.
+#
+# Every stock change applied through crud.apply_inventory_changes also
+# appends its movements (delta, reason, the request or transfer behind it
+# and the user) to inventory_movements, in the same transaction. The ledger
+# is never updated. district_inventory stays the live stock the write paths
+# check and lock; the ledger answers "what did district X have at time T".
+#
+# Periodic snapshots (`snapshot`, the Celery task
+# app.tasks.snapshot_inventory) store the stock of every item that moved
+# since the previous one, plus once a day the whole stock. A snapshot
+# covers an unbroken range of movement ids, so a point-in-time query reads
+# the snapshot rows since the last full snapshot and replays only the
+# district's movements with a later id. Ids and timestamps of concurrent
+# transactions may be out of order, so the replay goes by id; the snapshot
+# also records how old a later movement can be, which bounds the replay by
+# time, however long the ledger gets.
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Movements younger than this are left for the next snapshot. Correctness
+# does not depend on it: on Postgres the snapshot waits for the transactions
+# writing movements, so none can commit below its boundary or be dated
+# before it afterwards. SQLite, the tests' stand-in, takes no such lock.
+INVENTORY_SNAPSHOT_LAG = float(os.getenv("INVENTORY_SNAPSHOT_LAG", "60"))
+
+# Hours between full snapshots; point-in-time queries read the snapshot rows
+# written since the last full one
+INVENTORY_FULL_SNAPSHOT_HOURS = float(os.getenv("INVENTORY_FULL_SNAPSHOT_HOURS", "24"))
+
+# Key of the Postgres advisory lock serializing the opening balance
+LEDGER_OPENING_LOCK = 0x6C656467
+
+# Rows per executemany batch
+LEDGER_CHUNK = 5000
+
+
+def movement(
+    district_id: int,
+    item: str,
+    delta: int,
+    reason: str,
+    request_id: Optional[int] = None,
+    transfer_id: Optional[str] = None,
+    username: Optional[str] = None,
+) -> dict:
+    """A ledger row, as a column mapping for `record`."""
+    return {
+        "district_id": district_id,
+        "item": item,
+        "delta": delta,
+        "reason": reason,
+        "request_id": request_id,
+        "transfer_id": transfer_id,
+        "username": username,
+    }
+
+
+def record(db: Session, rows: Iterable[dict], created_at: datetime = None):
+    """
+    Appends movements in the current transaction, as one executemany per
+    LEDGER_CHUNK rows. Rows without `created_at` are stamped with
+    `created_at` if given, otherwise by the database clock. Explicit
+    timestamps are for loading history: snapshots assume no movement is
+    dated before the time the last one was taken at.
+    """
+    stamped, unstamped = [], []
+    for row in rows:
+        if not row["delta"]:
+            continue
+        row = {**row, "created_at": row.get("created_at") or created_at}
+        if row["created_at"] is None:
+            del row["created_at"]
+            unstamped.append(row)
+        else:
+            stamped.append(row)
+    table = models.InventoryMovement
+    for rows, statement in (
+        (stamped, insert(table)),
+        (unstamped, insert(table).values(created_at=models.utcnow())),
+    ):
+        for start in range(0, len(rows), LEDGER_CHUNK):
+            db.execute(statement, rows[start : start + LEDGER_CHUNK])
+
+
+def record_opening_balances(db: Session) -> int:
+    """
+    Writes the stock already in district_inventory as "opening" movements
+    when the ledger is empty (first startup with the ledger), so history
+    adds up to the live stock. Safe to run from every worker; commits.
+
+    Returns the number of movements written.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(select(func.pg_advisory_xact_lock(LEDGER_OPENING_LOCK)))
+    if db.execute(select(models.InventoryMovement.id).limit(1)).first() is not None:
+        db.commit()
+        return 0
+    stock = db.execute(
+        select(
+            models.InventoryItem.district_id,
+            models.InventoryItem.item,
+            models.InventoryItem.quantity,
+        )
+    ).all()
+    record(db, [movement(d, item, quantity, "opening") for d, item, quantity in stock])
+    db.commit()
+    return len(stock)
+
+
+def _latest_items(full_id: int, movement_id: int, district_ids=None):
+    """
+    Query for the stock per (district, item), optionally of `district_ids`
+    only, as of snapshot `movement_id`: the most recent row of each among
+    the snapshots since the full snapshot `full_id`.
+    """
+    items = models.InventorySnapshotItem.__table__.c
+    latest = select(
+        items.district_id, items.item, func.max(items.movement_id).label("movement_id")
+    ).where(items.movement_id >= full_id, items.movement_id <= movement_id)
+    if district_ids is not None:
+        latest = latest.where(items.district_id.in_(list(district_ids)))
+    latest = latest.group_by(items.district_id, items.item).subquery()
+    return select(items.district_id, items.item, items.quantity).join(
+        latest,
+        and_(
+            items.district_id == latest.c.district_id,
+            items.item == latest.c.item,
+            items.movement_id == latest.c.movement_id,
+        ),
+    )
+
+
+def snapshot(
+    db: Session,
+    now: datetime = None,
+    lag_seconds: float = INVENTORY_SNAPSHOT_LAG,
+    full_every_hours: float = INVENTORY_FULL_SNAPSHOT_HOURS,
+) -> dict:
+    """
+    Snapshots the stock covering the movements made until `lag_seconds`
+    before `now` (the database clock by default): every movement after the
+    previous snapshot up to the first more recent one, by id. Writes the
+    stock of every item in stock when the last full snapshot is
+    `full_every_hours` old (or there is none), otherwise only of the items
+    moved since the previous snapshot; commits.
+
+    Returns:
+        dict: Last movement id covered, whether the snapshot is full, rows
+        written and elapsed milliseconds.
+    """
+    start = time.perf_counter()
+    ledger = models.InventoryMovement
+    runs = models.InventorySnapshot
+    if db.get_bind().dialect.name == "postgresql":
+        # Waits for the transactions holding movement ids, and holds back new
+        # ones, until the boundary is read: every id up to it is then
+        # committed (SQLite has a single writer, so ids commit in order)
+        db.execute(text(f"LOCK TABLE {ledger.__tablename__} IN SHARE MODE"))
+    now = now or db.execute(select(models.utcnow())).scalar()
+    cutoff = now - timedelta(seconds=lag_seconds)
+    previous = db.execute(
+        select(runs.movement_id, runs.as_of).order_by(runs.movement_id.desc()).limit(1)
+    ).first()
+    previous_id = previous.movement_id if previous is not None else 0
+    first_recent = db.execute(
+        select(ledger.id)
+        .where(ledger.id > previous_id, ledger.created_at >= cutoff)
+        .order_by(ledger.id)
+        .limit(1)
+    ).scalar()
+    covered = select(func.max(ledger.id), func.max(ledger.created_at)).where(
+        ledger.id > previous_id
+    )
+    if first_recent is not None:
+        covered = covered.where(ledger.id < first_recent)
+    boundary_id, as_of = db.execute(covered).first()
+    if boundary_id is None:
+        db.commit()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return {"movement_id": previous_id, "full": False, "items": 0, "elapsed_ms": elapsed_ms}
+    # The movements after the boundary are those already written and those
+    # written from now on
+    oldest_after = db.execute(
+        select(func.min(ledger.created_at)).where(ledger.id > boundary_id)
+    ).scalar()
+    replay_from = min(now, oldest_after) if oldest_after is not None else now
+    db.commit()
+    # Snapshots stay ordered by time as well as by id
+    if previous is not None:
+        as_of = max(as_of, previous.as_of)
+
+    last_full = db.execute(
+        select(runs.movement_id, runs.as_of)
+        .where(runs.full)
+        .order_by(runs.movement_id.desc())
+        .limit(1)
+    ).first()
+    full = last_full is None or as_of - last_full.as_of >= timedelta(
+        hours=full_every_hours
+    )
+    quantities = {}
+    if last_full is not None:
+        for district_id, item, quantity in db.execute(
+            _latest_items(last_full.movement_id, previous_id)
+        ):
+            quantities[district_id, item] = quantity
+    moved = set()
+    for district_id, item, delta in db.execute(
+        select(ledger.district_id, ledger.item, func.sum(ledger.delta))
+        .where(ledger.id > previous_id, ledger.id <= boundary_id)
+        .group_by(ledger.district_id, ledger.item)
+    ):
+        if delta:
+            key = (district_id, item)
+            quantities[key] = quantities.get(key, 0) + int(delta)
+            moved.add(key)
+
+    # A full snapshot leaves out what is out of stock; the others must record
+    # an item running out
+    keys = [key for key, quantity in quantities.items() if quantity] if full else moved
+    rows = [
+        {
+            "district_id": district_id,
+            "item": item,
+            "movement_id": boundary_id,
+            "quantity": quantities[district_id, item],
+        }
+        for district_id, item in sorted(keys)
+    ]
+    db.execute(
+        insert(runs),
+        [{"movement_id": boundary_id, "as_of": as_of, "full": full, "replay_from": replay_from}],
+    )
+    for offset in range(0, len(rows), LEDGER_CHUNK):
+        db.execute(insert(models.InventorySnapshotItem), rows[offset : offset + LEDGER_CHUNK])
+    db.commit()
+    return {
+        "movement_id": boundary_id,
+        "full": full,
+        "items": len(rows),
+        "elapsed_ms": (time.perf_counter() - start) * 1000,
+    }
+
+
+def stock_at(db: Session, district_id: int, at: datetime = None) -> Dict[str, int]:
+    """
+    A district's stock at time `at` (by default now, as far as the ledger
+    goes, whatever the clocks say), as `{item: quantity}`:
+    its stock as of the last snapshot whose movements were all made by `at`,
+    plus the district's movements after that snapshot made by `at`.
+    """
+    # Core columns: this is a hot path, and building ORM expressions costs
+    # more than running the queries
+    ledger = models.InventoryMovement.__table__.c
+    runs = models.InventorySnapshot.__table__.c
+    full_runs = models.InventorySnapshot.__table__.alias().c
+    # The last snapshot covering only movements made by `at`, and the full
+    # one it builds on (the first snapshot is always full)
+    full_id = (
+        select(func.max(full_runs.movement_id))
+        .where(full_runs.full, full_runs.movement_id <= runs.movement_id)
+        .scalar_subquery()
+    )
+    boundary = select(runs.movement_id, runs.replay_from, full_id.label("full_id"))
+    replay = select(ledger.item, func.sum(ledger.delta)).where(ledger.district_id == district_id)
+    if at is not None:
+        boundary = boundary.where(runs.as_of <= at)
+        replay = replay.where(ledger.created_at <= at)
+    boundary = db.execute(boundary.order_by(runs.movement_id.desc()).limit(1)).first()
+    stock: Dict[str, int] = {}
+    if boundary is not None:
+        for _, item, quantity in db.execute(
+            _latest_items(boundary.full_id, boundary.movement_id, [district_id])
+        ):
+            stock[item] = quantity
+        # Not bounded by `as_of`: a movement may have a later id yet an
+        # earlier timestamp than the ones the snapshot covers
+        replay = replay.where(
+            ledger.id > boundary.movement_id, ledger.created_at >= boundary.replay_from
+        )
+    for item, delta in db.execute(replay.group_by(ledger.item)):
+        stock[item] = stock.get(item, 0) + int(delta)
+    return {item: quantity for item, quantity in sorted(stock.items()) if quantity}
+
+
+def movements(
+    db: Session,
+    district_id: int,
+    item: str = None,
+    since: datetime = None,
+    until: datetime = None,
+    before_id: int = None,
+    limit: int = 100,
+) -> List[models.InventoryMovement]:
+    """A district's movements, newest first; page with `before_id`."""
+    ledger = models.InventoryMovement
+    query = db.query(ledger).filter(ledger.district_id == district_id)
+    if item is not None:
+        query = query.filter(ledger.item == item)
+    if since is not None:
+        query = query.filter(ledger.created_at >= since)
+    if until is not None:
+        query = query.filter(ledger.created_at < until)
+    if before_id is not None:
+        query = query.filter(ledger.id < before_id)
+    return query.order_by(ledger.id.desc()).limit(limit).all()
+
+
+def consumption(db: Session, district_id: int, since: datetime, until: datetime = None) -> dict:
+    """
+    Stock flows of a district between `since` and `until` (now by default):
+    per item the net change per reason, the quantity handed out to requests
+    and that quantity per day.
+    """
+    until = until or datetime.utcnow()
+    ledger = models.InventoryMovement
+    days = max((until - since).total_seconds() / 86400, 1e-9)
+    items: Dict[str, dict] = {}
+    for item, reason, delta in db.execute(
+        select(ledger.item, ledger.reason, func.sum(ledger.delta))
+        .where(
+            ledger.district_id == district_id,
+            ledger.created_at >= since,
+            ledger.created_at < until,
+        )
+        .group_by(ledger.item, ledger.reason)
+    ):
+        items.setdefault(item, {"net": {}})["net"][reason] = int(delta)
+    for flows in items.values():
+        flows["consumed"] = -flows["net"].get("request", 0)
+        flows["consumed_per_day"] = flows["consumed"] / days
+    return {"district_id": district_id, "since": since, "until": until, "items": items}
@@ -1,18 +1,73 @@
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+import json
+import os
+import uuid
+from fastapi import FastAPI, Depends, HTTPException, Body, Header, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app import models, schemas, crud, database
+from app import (
+    auth,
+    crud,
+    database,
+    events,
+    intake,
+    ledger,
+    metrics,
+    models,
+    passwords,
+    planner,
+    schemas,
+    stats,
+    telemetry,
+)
+from app.auth import (
+    ALGORITHM,
+    SECRET_KEY,
+    get_current_user,
+    get_optional_username,
+    oauth2_scheme,
+)
 from app.database import init_db, get_db
 from datetime import datetime, timedelta
 from app.tasks import celery_app
-from app.utils import find_closest_district, load_districts_from_json
-from jose import jwt, JWTError
+from app.utils import (
+    DEDUP_MODE,
+    DistanceTableNotReady,
+    dedup_key,
+    default_priority,
+    district_neighbors,
+    find_closest_district_id,
+    find_closest_district_id_async,
+    find_closest_district_ids,
+    load_districts_from_file,
+    refresh_district_distances,
+)
+from jose import jwt
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.security import OAuth2PasswordBearer
 from typing import List, Dict, Optional, Any
 
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles with a Cache-Control header. Starlette already sends ETag and
+    Last-Modified and answers conditional requests with 304.
+    """
+
+    max_age = int(os.getenv("STATIC_MAX_AGE", "3600"))
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = f"public, max-age={self.max_age}"
+        return response
+
+
 app = FastAPI()
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app.mount("/static", CachedStaticFiles(directory="app/static"), name="static")
 
 
 @app.on_event("startup")
@@ -28,18 +83,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["X-Next-Cursor", "ETag"],  # Pagination cursor, cache validators
 )
 
+# Per-request SQL count, DB and serialization time (Server-Timing, /metrics)
+# and slow request profiles; opt-in as it patches FastAPI's request handling
+if telemetry.REQUEST_METRICS:
+    telemetry.install(app)
+
+
+@app.on_event("shutdown")
+def flush_events():
+    events.flush()
+
 
 @app.on_event("startup")
 def startup():
     init_db()  # Ensure the database is initialized
     db = next(get_db())  # Get a database session
     try:
-        # Call the function to load districts from the JSON file
-        load_districts_from_json(
-            db, "app/static/districts.json"
-        )  # Update with the correct path
+        # Load districts from the district file (JSON, GeoJSON or CSV)
+        report = load_districts_from_file(
+            db, os.getenv("DISTRICTS_FILE", "app/static/districts.json")
+        )
+        if report["skipped"]:
+            print("District file unchanged, skipping load")
+        # Before migrating legacy stock, which updates the counters itself
+        if stats.seed_counters(db):
+            print("Dashboard counters initialized")
+        if ledger.record_opening_balances(db):
+            print("Inventory ledger opened with the current stock")
+        crud.migrate_legacy_inventory(db)
+        # Build the district distance table without holding up startup
+        refresh_district_distances(db.get_bind())
         print("Districts successfully initialized!")
     except Exception as e:
         print(f"Error initializing districts: {e}")
@@ -47,22 +123,24 @@ def startup():
         db.close()  # Close the database session to avoid leaks
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Prometheus text exposition of the process metrics (connection pool usage,
+    checkout/wait/connect latency histograms and pool timeouts, and per-route
+    request telemetry when REQUEST_METRICS is on).
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # Serve static files
 
-SECRET_KEY = "SECRETKEY123"
-ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 # Hardcoded keys for registration
 ADMIN_KEY = "ADMIN12345"
 FIELD_VOLUNTEER_KEY = "FIELDVOLUNTEER67890"
 
-# Token-based authentication
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
-
-# Token blacklist for logout functionality
-token_blacklist = set()
-
 
 @app.post("/register")
 def register_user(user: schemas.UserCreate, key: str, db: Session = Depends(get_db)):
@@ -90,11 +168,30 @@ def register_user(user: schemas.UserCreate, key: str, db: Session = Depends(get_
 
 
 @app.post("/login")
-def login_user(user: schemas.UserLogin, db: Session = Depends(get_db)):
-    db_user = crud.authenticate_user(db, user)
+async def login_user(user: schemas.UserLogin, db: Session = Depends(get_db)):
+    # Cache hits skip the database; misses look the user up in the threadpool
+    db_user = crud.user_cache.get(user.username)
+    if db_user is None:
+        db_user = await run_in_threadpool(crud.get_user_record, db, user.username)
     if not db_user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    # bcrypt runs on its own bounded executor, not the event loop or threadpool
+    try:
+        valid, new_hash = await passwords.verify_and_update(
+            user.password, db_user.password
+        )
+    except passwords.PasswordHasherBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many concurrent logins, please retry",
+            headers={"Retry-After": "1"},
+        )
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        await run_in_threadpool(crud.update_password_hash, db, db_user, new_hash)
+
     # Create a token
     try:
         access_token = jwt.encode(
@@ -118,327 +215,1074 @@ def login_user(user: schemas.UserLogin, db: Session = Depends(get_db)):
 @app.post("/logout")
 def logout_user(token: str = Depends(oauth2_scheme)):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = auth.decode_token(token)
         username = payload.get("sub", "unknown")
-        if token not in token_blacklist:
-            token_blacklist.add(token)
+        # Revoked until the token expires, across all workers with the Redis store
+        auth.revoke_token(token, payload)
         return {"message": f"User {username} logged out successfully"}
-    except (jwt.ExpiredSignatureError, jwt.JWTError):
+    except HTTPException:
         # Handle invalid or expired token gracefully
         return {"message": "Token invalid or expired. Logout successful."}
     except Exception as e:
         return {"message": f"Unexpected error: {str(e)}. Logout successful."}
 
 
-# @app.get("/user-info")
-# def get_user_info(token: str = Depends(oauth2_scheme)):
-#     if token in token_blacklist:
-#         raise HTTPException(status_code=401, detail="Token invalidated")
-#     try:
-#         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-#         username = payload.get("sub")
-#         role = payload.get("role")
-#         return {"username": username, "role": role}
-#     except jwt.ExpiredSignatureError:
-#         raise HTTPException(status_code=401, detail="Token expired")
-#     except jwt.JWTError:
-#         raise HTTPException(status_code=401, detail="Invalid token")
+@app.get("/user-info")
+def get_user_info(claims: dict = Depends(get_current_user)):
+    return {"username": claims.get("sub"), "role": claims.get("role")}
+
+
+def request_event_data(request: models.Request) -> dict:
+    return {
+        "id": request.id,
+        "type": request.type,
+        "subtype": request.subtype,
+        "priority": request.priority,
+        "quantity": request.quantity,
+        "status": request.status,
+        "relatedDistrict": request.relatedDistrict,
+        "timestamp": request.timestamp.isoformat() if request.timestamp else None,
+    }
+
+
+def publish_inventory(district_id: int, inventory: Dict[str, int]):
+    events.publish(
+        "inventory.changed",
+        {"district_id": district_id, "inventory": inventory},
+        [district_id],
+    )
+
+
+# Seconds between keep-alive comments on an idle change feed
+EVENT_HEARTBEAT_SECONDS = 15
+
+
+@app.get("/events")
+async def event_stream(
+    district_id: Optional[int] = None, types: Optional[List[str]] = Query(None)
+):
+    """
+    Server-sent change feed: request.created, requests.created,
+    request.resolved, requests.resolved, inventory.changed and
+    priority.escalated events, optionally limited to one district and/or some
+    event types. A "resync" event means events were dropped because the client
+    fell behind; it should reload its data.
+    """
+    subscriber = events.open_subscription(district_id, types)
+
+    async def stream():
+        try:
+            yield events.format_sse(events.make_event("ready", {}))
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=EVENT_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield events.format_sse(event)
+        finally:
+            events.broker.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Largest page a client may ask for in request listings
+MAX_PAGE_SIZE = 5000
+
+
+def request_filters(
+    status: Optional[str] = None,
+    type: Optional[str] = None,
+    district_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    min_priority: Optional[int] = None,
+    include_archived: bool = False,
+) -> schemas.RequestFilters:
+    """
+    Query parameters shared by the request listing endpoints. Resolved
+    requests moved to the archive are only listed with include_archived=true.
+    """
+    return schemas.RequestFilters(
+        status=status,
+        type=type,
+        district_id=district_id,
+        since=since,
+        until=until,
+        min_priority=min_priority,
+        include_archived=include_archived,
+    )
+
+
+def parse_fields(fields: Optional[str] = None) -> Optional[List[str]]:
+    """
+    Parses the comma separated `fields=` projection of request listings.
+    """
+    if fields is None:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in schemas.RequestResponse.__fields__]
+    if not names or unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {unknown}")
+    return names
+
+
+def list_requests_page(db, filters, sort, cursor, limit, fields, response):
+    rows, next_cursor = crud.page_requests(db, filters, sort, cursor, limit, fields)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if fields is not None:
+        # Projected rows do not match RequestResponse, so skip response_model
+        return JSONResponse(jsonable_encoder(rows), headers=headers)
+    response.headers.update(headers)
+    return rows
+
+
+def render_requests_page(rows, next_cursor, fields) -> JSONResponse:
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if fields is None:
+        rows = [schemas.RequestResponse.from_orm(row) for row in rows]
+    return JSONResponse(jsonable_encoder(rows), headers=headers)
+
+
+async def list_requests_page_async(db: AsyncSession, filters, sort, cursor, limit, fields):
+    rows, next_cursor = await db.run_sync(
+        crud.page_requests, filters, sort, cursor, limit, fields
+    )
+    # Encoding up to MAX_PAGE_SIZE rows would hold up the event loop
+    return await run_in_threadpool(render_requests_page, rows, next_cursor, fields)
+
+
+async def get_all_requests_async(
+    filters: schemas.RequestFilters = Depends(request_filters),
+    sort: str = Query("id", regex="^(id|priority)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[List[str]] = Depends(parse_fields),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    """
+    Fetch requests one page at a time.
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    try:
+        return await list_requests_page_async(db, filters, sort, cursor, limit, fields)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Error fetching requests")
 
 
 @app.get("/requests", response_model=List[schemas.RequestResponse])
-def get_all_requests(db: Session = Depends(database.get_db)):
+@database.hot_path(get_all_requests_async)
+def get_all_requests(
+    response: Response,
+    filters: schemas.RequestFilters = Depends(request_filters),
+    sort: str = Query("id", regex="^(id|priority)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[List[str]] = Depends(parse_fields),
+    db: Session = Depends(database.get_db),
+):
     """
-    Fetch all requests from the database.
+    Fetch requests one page at a time.
+    The cursor for the next page is returned in the X-Next-Cursor header.
     """
     try:
-        requests = db.query(models.Request).all()
-        return requests
+        return list_requests_page(db, filters, sort, cursor, limit, fields, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Error fetching requests")
 
 
-@app.post("/submit-request", response_model=schemas.RequestResponse)
-def submit_request(
-    request: schemas.RequestCreate, db: Session = Depends(database.get_db)
+@app.get("/requests/export")
+def export_requests(
+    filters: schemas.RequestFilters = Depends(request_filters),
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    fields: Optional[List[str]] = Depends(parse_fields),
+    db: Session = Depends(database.get_db),
 ):
     """
-    Endpoint to submit a new request with default priority based on type.
+    Stream every matching request as NDJSON (default) or CSV.
+    Supports the same filters as GET /requests, without paging.
+    """
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        crud.export_requests(db, filters, format, fields),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="requests.{format}"'
+        },
+    )
+
+
+@app.get("/requests/urgent", response_model=List[schemas.RequestResponse])
+def get_urgent_requests(
+    limit: int = Query(20, ge=1, le=1000),
+    district_id: Optional[int] = None,
+    db: Session = Depends(database.get_db),
+):
     """
-    # Default priorities based on type
-    default_priorities = {"water": 3, "shelter": 2, "food": 1, "medical": 2}
+    Fetch the most urgent pending requests, globally or for one district.
+    Priorities are computed from type and age at query time, so they are
+    current even when the periodic priority job is disabled (PRIORITY_MODE=lazy).
+    """
+    return [
+        schemas.RequestResponse.from_orm(request).copy(update={"priority": priority})
+        for request, priority in crud.top_pending_requests(db, limit, district_id)
+    ]
+
 
+def queue_submission(request: schemas.RequestCreate) -> JSONResponse:
     try:
+        intake_id = intake.submit(request.dict())
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Intake queue unavailable: {str(e)}")
+    return JSONResponse(status_code=202, content={"intake_id": intake_id, "status": "queued"})
+
+
+def merge_into_duplicate(duplicate: models.Request, request: schemas.RequestCreate, quantity):
+    """
+    Folds a repeated submission into its pending original, keeping the larger
+    quantity. Returns whether the original changed.
+    """
+    changed = quantity > duplicate.quantity or (request.notes and not duplicate.notes)
+    duplicate.quantity = max(duplicate.quantity, quantity)
+    duplicate.notes = duplicate.notes or request.notes
+    return changed
+
+
+def new_request_row(request: schemas.RequestCreate, quantity, now, district_id, duplicate):
+    new_request = models.Request(
+        type=request.type,
+        subtype=request.subtype,
         # Assign default priority based on type
-        priority = default_priorities.get(
-            request.type, 1
-        )  # Default to 1 if type is unknown
+        priority=default_priority(request.type),
+        latitude=request.latitude,
+        longitude=request.longitude,
+        quantity=quantity,
+        tckn=request.tckn,
+        notes=request.notes,
+        timestamp=now,
+        status="pending",  # Default status
+        relatedDistrict=district_id,
+        dedup_key=dedup_key(
+            request.tckn, request.type, request.subtype, request.latitude, request.longitude
+        ),
+    )
+    if duplicate is not None:
+        new_request.status = "duplicate"
+        new_request.duplicate_of = duplicate.id
+    return new_request
+
 
-        closest_district = find_closest_district(
+async def submit_request_async(
+    request: schemas.RequestCreate, db: AsyncSession = Depends(database.get_async_db)
+):
+    """
+    Endpoint to submit a new request with default priority based on type.
+
+    With a write-behind intake queue configured (REQUEST_INTAKE), the request
+    is queued and answered with 202 and an intake id instead; poll
+    /intake/{intake_id} to see when it is stored.
+    """
+    if intake.intake_queue is not None:
+        # The Redis queue client blocks
+        return await run_in_threadpool(queue_submission, request)
+    try:
+        quantity = request.quantity if request.quantity is not None else 1
+        now = datetime.now()
+
+        duplicate = None
+        if DEDUP_MODE != "off":
+            candidates = await db.run_sync(crud.duplicate_candidates, request, now)
+            # Geodesic distances are CPU work
+            duplicate = await run_in_threadpool(crud.pick_duplicate, candidates, request)
+        if duplicate is not None and DEDUP_MODE == "merge":
+            changed = merge_into_duplicate(duplicate, request, quantity)
+            await db.commit()
+            if changed:
+                events.publish(
+                    "request.updated",
+                    request_event_data(duplicate),
+                    [duplicate.relatedDistrict],
+                )
+            return duplicate
+
+        closest_district_id = await find_closest_district_id_async(
             request.latitude, request.longitude, db
         )
+        new_request = new_request_row(request, quantity, now, closest_district_id, duplicate)
+        db.add(new_request)
+        stats.request_added(
+            db.sync_session, new_request.type, new_request.status, closest_district_id
+        )
+        await db.commit()
+        await db.refresh(new_request)
 
-        # Create a new request object
-        new_request = models.Request(
-            type=request.type,
-            subtype=request.subtype,
-            priority=priority,
-            latitude=request.latitude,
-            longitude=request.longitude,
-            quantity=request.quantity if request.quantity is not None else 1,
-            tckn=request.tckn,
-            notes=request.notes,
-            timestamp=datetime.now(),
-            status="pending",  # Default status
-            relatedDistrict=closest_district.id if closest_district else None,
+        events.publish(
+            "request.created",
+            request_event_data(new_request),
+            [new_request.relatedDistrict],
         )
+        return new_request
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating request: {str(e)}")
+
+
+@app.post(
+    "/submit-request",
+    response_model=schemas.RequestResponse,
+    responses={202: {"model": schemas.IntakeStatus}},
+)
+@database.hot_path(submit_request_async)
+def submit_request(
+    request: schemas.RequestCreate, db: Session = Depends(database.get_db)
+):
+    """
+    Endpoint to submit a new request with default priority based on type.
+
+    With a write-behind intake queue configured (REQUEST_INTAKE), the request
+    is queued and answered with 202 and an intake id instead; poll
+    /intake/{intake_id} to see when it is stored.
+    """
+    if intake.intake_queue is not None:
+        return queue_submission(request)
+    try:
+        quantity = request.quantity if request.quantity is not None else 1
+        now = datetime.now()
+
+        # The same person repeating the same need nearby: fold it into the
+        # pending original (keeping the larger quantity) or link it to it
+        duplicate = None
+        if DEDUP_MODE != "off":
+            duplicate = crud.find_duplicate_request(db, request, now)
+        if duplicate is not None and DEDUP_MODE == "merge":
+            changed = merge_into_duplicate(duplicate, request, quantity)
+            db.commit()
+            if changed:
+                events.publish(
+                    "request.updated",
+                    request_event_data(duplicate),
+                    [duplicate.relatedDistrict],
+                )
+            return duplicate
+
+        closest_district_id = find_closest_district_id(
+            request.latitude, request.longitude, db
+        )
+        new_request = new_request_row(request, quantity, now, closest_district_id, duplicate)
         db.add(new_request)
+        stats.request_added(db, new_request.type, new_request.status, closest_district_id)
         db.commit()
         db.refresh(new_request)
 
+        events.publish(
+            "request.created",
+            request_event_data(new_request),
+            [new_request.relatedDistrict],
+        )
         return new_request
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating request: {str(e)}")
 
 
-@app.get("/districts", response_model=List[schemas.DistrictResponse])
-def get_districts(db: Session = Depends(get_db)):
+@app.post("/submit-requests/batch", response_model=schemas.BatchSubmitResponse)
+def submit_requests_batch(
+    requests: List[Dict[str, Any]] = Body(...), db: Session = Depends(database.get_db)
+):
     """
-    Fetch all districts and include the number of requests for each.
+    Submit many requests at once (e.g. collected offline by a field team).
+    Each item has the shape of a single /submit-request payload; invalid items
+    are reported individually and do not prevent the others from being stored.
     """
-    districts = db.query(models.District).all()
-    result = []
-    for district in districts:
-        request_count = (
-            db.query(models.Request).filter_by(relatedDistrict=district.id).count()
+    results: List[schemas.BatchItemResult] = []
+    valid: List[schemas.RequestCreate] = []
+    positions: List[int] = []
+    for index, item in enumerate(requests):
+        try:
+            valid.append(schemas.RequestCreate.parse_obj(item))
+            positions.append(index)
+        except ValidationError as e:
+            results.append(schemas.BatchItemResult(index=index, error=str(e)))
+
+    if valid:
+        try:
+            district_ids = find_closest_district_ids(
+                [request.latitude for request in valid],
+                [request.longitude for request in valid],
+                db,
+            )
+            timestamp = datetime.now()
+            rows = crud.bulk_create_requests(
+                db,
+                [
+                    {
+                        "type": request.type,
+                        "subtype": request.subtype,
+                        "priority": default_priority(request.type),
+                        "latitude": request.latitude,
+                        "longitude": request.longitude,
+                        "quantity": request.quantity if request.quantity is not None else 1,
+                        "tckn": request.tckn,
+                        "notes": request.notes,
+                        "timestamp": timestamp,
+                        "status": "pending",
+                        "relatedDistrict": district_id,
+                        "dedup_key": dedup_key(
+                            request.tckn,
+                            request.type,
+                            request.subtype,
+                            request.latitude,
+                            request.longitude,
+                        ),
+                    }
+                    for request, district_id in zip(valid, district_ids)
+                ],
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error creating requests: {str(e)}"
+            )
+        results.extend(
+            schemas.BatchItemResult(
+                index=index, id=row["id"], relatedDistrict=row["relatedDistrict"]
+            )
+            for index, row in zip(positions, rows)
         )
-        result.append(
-            {
-                "id": district.id,
-                "name": district.name,
-                "latitude": district.latitude,
-                "longitude": district.longitude,
-                "inventory": district.inventory,
-                "request_count": request_count,  # Include request count
-            }
+        # One event per batch: subscribers get per-district counts, not every row
+        created = {}
+        for row in rows:
+            created[row["relatedDistrict"]] = created.get(row["relatedDistrict"], 0) + 1
+        events.publish(
+            "requests.created",
+            {"count": len(rows), "by_district": {str(k): v for k, v in created.items()}},
+            created,
         )
-    return result
+
+    results.sort(key=lambda result: result.index)
+    return {
+        "created": len(valid),
+        "failed": len(results) - len(valid),
+        "results": results,
+    }
+
+
+@app.get("/intake/{intake_id}", response_model=schemas.IntakeStatus)
+def get_intake_status(intake_id: str, db: Session = Depends(get_db)):
+    """
+    Whether a queued submission has been stored yet, and its request id once
+    it has.
+    """
+    stored = crud.intake_status(db, intake_id)
+    if stored is not None:
+        return {
+            "intake_id": intake_id,
+            "status": "stored",
+            "id": stored.id,
+            "relatedDistrict": stored.relatedDistrict,
+        }
+    status = intake.intake_queue.status(intake_id) if intake.intake_queue else None
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown intake id")
+    return {"intake_id": intake_id, "status": status}
+
+
+def district_response(district, inventory, status_counts, include_status):
+    return {
+        "id": district.id,
+        "name": district.name,
+        "latitude": district.latitude,
+        "longitude": district.longitude,
+        "inventory": inventory,
+        "request_count": sum(status_counts.values()),
+        "status_counts": status_counts if include_status else None,
+    }
+
+
+def district_etag(fingerprint, include_status: bool) -> str:
+    return '"' + "-".join(str(part) for part in (*fingerprint, int(include_status))) + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def district_cache_headers(etag: str) -> Dict[str, str]:
+    # Clients may keep the response but must revalidate it (cheap 304) before use
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def cached_districts_response(etag: str, include_status: bool, if_none_match):
+    """A 304 or the cached /districts body for `etag`, or None."""
+    headers = district_cache_headers(etag)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if crud.DISTRICTS_RESPONSE_CACHE:
+        cached = crud.district_response_cache.get(include_status)
+        if cached is not None and cached[0] == etag:
+            return Response(cached[1], media_type="application/json", headers=headers)
+    return None
+
+
+def load_districts(db: Session):
+    """Districts, their inventories and their request counts per status."""
+    districts = db.query(models.District).all()
+    return districts, crud.get_inventories(db), crud.count_requests_by_district(db)
+
+
+def render_districts(etag: str, include_status: bool, districts, inventories, counts):
+    body = json.dumps(
+        [
+            district_response(
+                district,
+                inventories.get(district.id, {}),
+                counts.get(district.id, {}),
+                include_status,
+            )
+            for district in districts
+        ]
+    ).encode()
+    if crud.DISTRICTS_RESPONSE_CACHE:
+        crud.district_response_cache.set(include_status, (etag, body))
+    return Response(body, media_type="application/json", headers=district_cache_headers(etag))
+
+
+async def get_districts_async(
+    include_status: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    """
+    Fetch all districts and include the number of requests for each.
+    Pass include_status=true to also get the counts per request status.
+    Archived requests are counted, as resolved, like in /stats.
+    Responses carry an ETag; If-None-Match is answered with 304 from one
+    fingerprint query.
+    """
+    etag = district_etag(await db.run_sync(crud.districts_fingerprint), include_status)
+    cached = cached_districts_response(etag, include_status, if_none_match)
+    if cached is not None:
+        return cached
+    rows = await db.run_sync(load_districts)
+    # Serializing every district would hold up the event loop
+    return await run_in_threadpool(render_districts, etag, include_status, *rows)
+
+
+@app.get("/districts", response_model=List[schemas.DistrictResponse])
+@database.hot_path(get_districts_async)
+def get_districts(
+    include_status: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Fetch all districts and include the number of requests for each.
+    Pass include_status=true to also get the counts per request status.
+    Archived requests are counted, as resolved, like in /stats.
+    Responses carry an ETag; If-None-Match is answered with 304 from one
+    fingerprint query.
+    """
+    etag = district_etag(crud.districts_fingerprint(db), include_status)
+    cached = cached_districts_response(etag, include_status, if_none_match)
+    if cached is not None:
+        return cached
+    return render_districts(etag, include_status, *load_districts(db))
+
+
+async def get_requests_by_district_async(
+    district_id: int,
+    filters: schemas.RequestFilters = Depends(request_filters),
+    sort: str = Query("id", regex="^(id|priority)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[List[str]] = Depends(parse_fields),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    """
+    Fetch requests for a specific district, one page at a time.
+    """
+    filters.district_id = district_id
+    return await list_requests_page_async(db, filters, sort, cursor, limit, fields)
 
 
 @app.get(
     "/districts/{district_id}/requests", response_model=List[schemas.RequestResponse]
 )
-def get_requests_by_district(district_id: int, db: Session = Depends(get_db)):
+@database.hot_path(get_requests_by_district_async)
+def get_requests_by_district(
+    district_id: int,
+    response: Response,
+    filters: schemas.RequestFilters = Depends(request_filters),
+    sort: str = Query("id", regex="^(id|priority)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[List[str]] = Depends(parse_fields),
+    db: Session = Depends(get_db),
+):
     """
-    Fetch all requests for a specific district.
+    Fetch requests for a specific district, one page at a time.
     """
-    return (
-        db.query(models.Request)
-        .filter(models.Request.relatedDistrict == district_id)
-        .all()
-    )
+    filters.district_id = district_id
+    return list_requests_page(db, filters, sort, cursor, limit, fields, response)
 
 
-@app.get("/districts/{district_id}", response_model=schemas.DistrictResponse)
-def get_district_by_id(district_id: int, db: Session = Depends(get_db)):
-    """
-    Fetch details of a specific district by ID.
-    """
-    # Fetch the district by ID
+def load_district(db: Session, district_id: int, include_status: bool):
+    """A district's response body, or None for an unknown district."""
     district = (
         db.query(models.District).filter(models.District.id == district_id).first()
     )
     if not district:
-        raise HTTPException(status_code=404, detail="District not found")
+        return None
 
-    # Count the number of requests related to this district
-    request_count = (
-        db.query(models.Request)
-        .filter(models.Request.relatedDistrict == district.id)
-        .count()
+    # Count the number of requests related to this district, per status
+    counts = crud.count_requests_by_district(db, district.id)
+    inventory = crud.get_inventories(db, [district.id]).get(district.id, {})
+    return district_response(
+        district, inventory, counts.get(district.id, {}), include_status
     )
 
-    # Return the district details along with the request count
+
+async def get_district_by_id_async(
+    district_id: int,
+    response: Response,
+    include_status: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    """
+    Fetch details of a specific district by ID. Its request counts include
+    the archived requests, as resolved.
+    """
+    fingerprint = await db.run_sync(crud.districts_fingerprint, district_id)
+    if fingerprint is None:
+        raise HTTPException(status_code=404, detail="District not found")
+    etag = district_etag(fingerprint, include_status)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=district_cache_headers(etag))
+    response.headers.update(district_cache_headers(etag))
+
+    body = await db.run_sync(load_district, district_id, include_status)
+    if body is None:
+        raise HTTPException(status_code=404, detail="District not found")
+    return body
+
+
+@app.get("/districts/{district_id}", response_model=schemas.DistrictResponse)
+@database.hot_path(get_district_by_id_async)
+def get_district_by_id(
+    district_id: int,
+    response: Response,
+    include_status: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Fetch details of a specific district by ID. Its request counts include
+    the archived requests, as resolved.
+    """
+    fingerprint = crud.districts_fingerprint(db, district_id)
+    if fingerprint is None:
+        raise HTTPException(status_code=404, detail="District not found")
+    etag = district_etag(fingerprint, include_status)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=district_cache_headers(etag))
+    response.headers.update(district_cache_headers(etag))
+
+    body = load_district(db, district_id, include_status)
+    if body is None:
+        raise HTTPException(status_code=404, detail="District not found")
+    return body
+
+
+@app.get(
+    "/districts/{district_id}/neighbors", response_model=List[schemas.DistrictNeighbor]
+)
+def get_district_neighbors(
+    district_id: int,
+    k: int = Query(10, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """
+    Fetch the k nearest districts to a district, closest first, with their
+    great-circle distances from the precomputed distance table.
+    """
+    try:
+        neighbors = district_neighbors(district_id, k, db)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="District not found")
+    except DistanceTableNotReady:
+        raise HTTPException(
+            status_code=503,
+            detail="District distances are being computed",
+            headers={"Retry-After": "1"},
+        )
+    return [{"id": neighbor, "distance_km": round(km, 3)} for neighbor, km in neighbors]
+
+
+def store_inventory_update(
+    db: Session, district_id: int, inventory_update: Dict[str, int], username: Optional[str]
+) -> Dict[str, int]:
+    """Applies and commits an inventory update; returns the new inventory."""
+    if not crud.lock_districts(db, [district_id]):
+        raise HTTPException(status_code=404, detail="District not found")
+
+    # Every item is changed atomically in the database; a failing item undoes all
+    try:
+        crud.apply_inventory_changes(
+            db, district_id, inventory_update, reason="adjustment", username=username
+        )
+    except crud.InsufficientInventoryError as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot reduce {e.item} below 0. Current: {e.available}, Attempted: {inventory_update[e.item]}",
+        )
+    db.commit()
+    return crud.get_inventories(db, [district_id]).get(district_id, {})
+
+
+async def update_district_inventory_async(
+    district_id: int,
+    inventory_update: Dict[str, int],
+    username: Optional[str] = Depends(get_optional_username),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    """
+    Update the inventory of a specific district.
+    Allows adding and removing inventory items incrementally.
+    Changes are recorded in the inventory ledger, with the user when a
+    bearer token is sent.
+    """
+    inventory = await db.run_sync(
+        store_inventory_update, district_id, inventory_update, username
+    )
+    publish_inventory(district_id, inventory)
     return {
-        "id": district.id,
-        "name": district.name,
-        "latitude": district.latitude,
-        "longitude": district.longitude,
-        "inventory": district.inventory,
-        "request_count": request_count,
+        "message": "Inventory updated successfully",
+        "inventory": inventory,
     }
 
 
 @app.post("/districts/{district_id}/inventory")
+@database.hot_path(update_district_inventory_async)
 def update_district_inventory(
     district_id: int,
     inventory_update: Dict[str, int],
+    username: Optional[str] = Depends(get_optional_username),
     db: Session = Depends(get_db),
 ):
     """
     Update the inventory of a specific district.
     Allows adding and removing inventory items incrementally.
+    Changes are recorded in the inventory ledger, with the user when a
+    bearer token is sent.
     """
-    district = db.query(models.District).filter_by(id=district_id).first()
-    if not district:
-        raise HTTPException(status_code=404, detail="District not found")
+    inventory = store_inventory_update(db, district_id, inventory_update, username)
+    publish_inventory(district_id, inventory)
+    return {
+        "message": "Inventory updated successfully",
+        "inventory": inventory,
+    }
 
-    # Ensure current inventory is fetched from the database every time
-    db.refresh(district)  # Ensure the district data is up-to-date
-    current_inventory: Dict[str, int] = district.inventory or {}
 
-    if not isinstance(current_inventory, dict):
-        current_inventory = {}
+@app.get(
+    "/districts/{district_id}/inventory/history", response_model=schemas.InventoryHistory
+)
+def get_inventory_history(
+    district_id: int, at: Optional[datetime] = None, db: Session = Depends(get_db)
+):
+    """
+    A district's stock at a point in time (now by default), rebuilt from the
+    latest inventory snapshot before it plus the ledger movements since.
+    """
+    if crud.districts_fingerprint(db, district_id) is None:
+        raise HTTPException(status_code=404, detail="District not found")
+    inventory = ledger.stock_at(db, district_id, at)
+    return {"district_id": district_id, "at": at or datetime.utcnow(), "inventory": inventory}
 
-    normalized_inventory_update = {
-        item: quantity for item, quantity in inventory_update.items()
-    }
-    normalized_current_inventory = {
-        item: quantity for item, quantity in current_inventory.items()
-    }
 
-    # Update inventory incrementally
-    for item, quantity in normalized_inventory_update.items():
-        current_quantity = normalized_current_inventory.get(item, 0)
-        updated_quantity = current_quantity + quantity
-        if updated_quantity < 0:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Cannot reduce {item} below 0. Current: {current_quantity}, Attempted: {quantity}",
-            )
-        normalized_current_inventory[item] = updated_quantity
+@app.get(
+    "/districts/{district_id}/inventory/movements",
+    response_model=List[schemas.InventoryMovementResponse],
+)
+def get_inventory_movements(
+    district_id: int,
+    item: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    """
+    A district's inventory ledger, newest first. For the next page pass the
+    id of the last movement received as before_id.
+    """
+    return ledger.movements(db, district_id, item, since, until, before_id, limit)
 
-    # Remove items with zero quantity
-    normalized_current_inventory = {
-        item: qty for item, qty in normalized_current_inventory.items() if qty > 0
-    }
 
-    # Assign updated inventory back to the district
-    district.inventory = normalized_current_inventory
-    db.commit()
-    db.refresh(district)
+@app.get(
+    "/districts/{district_id}/inventory/consumption",
+    response_model=schemas.InventoryConsumption,
+)
+def get_inventory_consumption(
+    district_id: int,
+    since: datetime,
+    until: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Stock flows of a district over a period: per item the net change per
+    reason (adjustment, request, transfer...), the quantity handed out to
+    requests and its rate per day.
+    """
+    if until is not None and until <= since:
+        raise HTTPException(status_code=400, detail="until must be after since")
+    return ledger.consumption(db, district_id, since, until)
 
-    return {
-        "message": "Inventory updated successfully",
-        "inventory": normalized_current_inventory,
-    }
 
+def store_resolution(db: Session, request_id: int, username: Optional[str]):
+    """
+    Resolves a request from its district's stock and commits.
 
-@app.post("/requests/{request_id}/resolve")
-def resolve_request(request_id: int, db: Session = Depends(get_db)):
-    request = db.query(models.Request).filter(models.Request.id == request_id).first()
+    Returns:
+        tuple: The request's event data, its district id and the district's
+        new inventory.
+    """
+    # Lock the request so it cannot be resolved twice concurrently
+    request = (
+        db.query(models.Request)
+        .filter(models.Request.id == request_id)
+        .with_for_update()
+        .first()
+    )
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
 
     if request.status == "resolved":
         raise HTTPException(status_code=400, detail="Request is already resolved")
 
-    # Fetch the district inventory
-    district = (
-        db.query(models.District)
-        .filter(models.District.id == request.relatedDistrict)
-        .first()
-    )
-    if not district:
+    if request.relatedDistrict is None or not crud.lock_districts(
+        db, [request.relatedDistrict]
+    ):
         raise HTTPException(status_code=404, detail="Related district not found")
 
-    inventory = district.inventory or {}
-
     # Construct the inventory key
     inventory_key = f"{request.type} - {request.subtype}"
 
-    # Check if inventory is sufficient
-    if inventory.get(inventory_key, 0) < request.quantity:
+    # Deduct items from inventory, failing if it is insufficient
+    try:
+        crud.apply_inventory_changes(
+            db,
+            request.relatedDistrict,
+            {inventory_key: -request.quantity},
+            reason="request",
+            username=username,
+            request_id=request.id,
+        )
+    except crud.InsufficientInventoryError as e:
+        db.rollback()
         raise HTTPException(
             status_code=400,
-            detail=f"Insufficient inventory for {inventory_key}. Needed: {request.quantity}, Available: {inventory.get(inventory_key, 0)}",
+            detail=f"Insufficient inventory for {inventory_key}. Needed: {request.quantity}, Available: {e.available}",
         )
 
-    # Deduct items from inventory
-    inventory[inventory_key] -= request.quantity
-    district.inventory = {
-        k: v for k, v in inventory.items() if v > 0
-    }  # Remove items with zero quantity
-
     # Mark request as resolved
+    stats.request_status_changed(
+        db, request.type, request.relatedDistrict, request.status, "resolved"
+    )
     request.status = "resolved"
-
+    request.resolved_at = datetime.utcnow()
     db.commit()
-    db.refresh(district)
-    db.refresh(request)
 
-    return {"message": "Request resolved successfully", "inventory": district.inventory}
+    inventory = crud.get_inventories(db, [request.relatedDistrict])
+    return (
+        request_event_data(request),
+        request.relatedDistrict,
+        inventory.get(request.relatedDistrict, {}),
+    )
 
 
-@app.post("/districts/{source_district_id}/transfer/{target_district_id}")
-def transfer_inventory(
-    source_district_id: int,
-    target_district_id: int,
-    transfer_data: Dict[str, int],  # Key: item, Value: quantity
+def publish_resolution(event_data: dict, district_id: int, inventory: Dict[str, int]):
+    events.publish("request.resolved", event_data, [district_id])
+    publish_inventory(district_id, inventory)
+    return {
+        "message": "Request resolved successfully",
+        "inventory": inventory,
+    }
+
+
+async def resolve_request_async(
+    request_id: int,
+    username: Optional[str] = Depends(get_optional_username),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    return publish_resolution(*await db.run_sync(store_resolution, request_id, username))
+
+
+@app.post("/requests/{request_id}/resolve")
+@database.hot_path(resolve_request_async)
+def resolve_request(
+    request_id: int,
+    username: Optional[str] = Depends(get_optional_username),
     db: Session = Depends(get_db),
 ):
-    """
-    Transfer inventory items from one district to another.
-    """
-    # Fetch source district
-    source_district = (
-        db.query(models.District)
-        .filter(models.District.id == source_district_id)
-        .first()
-    )
-    if not source_district:
-        raise HTTPException(status_code=404, detail="Source district not found")
+    return publish_resolution(*store_resolution(db, request_id, username))
 
-    # Fetch target district
-    target_district = (
-        db.query(models.District)
-        .filter(models.District.id == target_district_id)
-        .first()
-    )
-    if not target_district:
-        raise HTTPException(status_code=404, detail="Target district not found")
 
-    # Ensure both inventories are valid dictionaries
-    source_inventory = source_district.inventory or {}
-    target_inventory = target_district.inventory or {}
+@app.post(
+    "/districts/{district_id}/resolve-pending",
+    response_model=schemas.ResolvePendingResponse,
+)
+def resolve_pending_requests(
+    district_id: int,
+    username: Optional[str] = Depends(get_optional_username),
+    db: Session = Depends(get_db),
+):
+    """
+    Fulfil as many pending requests of a district as its current stock allows,
+    most urgent first, in a single transaction.
+    """
+    if not crud.lock_districts(db, [district_id]):
+        raise HTTPException(status_code=404, detail="District not found")
 
-    if not isinstance(source_inventory, dict):
-        source_inventory = {}
-    if not isinstance(target_inventory, dict):
-        target_inventory = {}
+    try:
+        summary = crud.resolve_pending_requests(db, district_id, username=username)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-    # Normalize keys and validate the source inventory
-    for item, quantity in transfer_data.items():
-        if source_inventory.get(item, 0) < quantity:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient inventory in source district for {item}. Needed: {quantity}, Available: {source_inventory.get(item, 0)}",
-            )
+    if summary["resolved"]:
+        events.publish(
+            "requests.resolved",
+            {"district_id": district_id, "ids": summary["resolved"]},
+            [district_id],
+        )
+        publish_inventory(district_id, summary["inventory"])
+    return {
+        "message": f"Resolved {len(summary['resolved'])} pending requests",
+        "resolved_count": len(summary["resolved"]),
+        **summary,
+    }
 
-    # Deduct from source inventory
-    for item, quantity in transfer_data.items():
-        source_inventory[item] -= quantity
-        if source_inventory[item] <= 0:
-            del source_inventory[item]  # Remove item if quantity is zero or less
 
-    # Add to target inventory
-    for item, quantity in transfer_data.items():
-        target_inventory[item] = target_inventory.get(item, 0) + quantity
+def store_transfer(
+    db: Session,
+    source_district_id: int,
+    target_district_id: int,
+    transfer_data: Dict[str, int],
+    username: Optional[str],
+):
+    """Moves stock between two districts and commits; returns both inventories."""
+    # Lock both districts (in id order, so opposite transfers cannot deadlock)
+    found = crud.lock_districts(db, [source_district_id, target_district_id])
+    if source_district_id not in found:
+        raise HTTPException(status_code=404, detail="Source district not found")
+    if target_district_id not in found:
+        raise HTTPException(status_code=404, detail="Target district not found")
 
-    # Update the database
+    # Deduct from source inventory, then add to target inventory; both legs
+    # share a transfer id in the ledger
+    reference = dict(reason="transfer", username=username, transfer_id=uuid.uuid4().hex)
     try:
-        source_district.inventory = source_inventory
-        target_district.inventory = target_inventory
+        crud.apply_inventory_changes(
+            db,
+            source_district_id,
+            {item: -quantity for item, quantity in transfer_data.items()},
+            **reference,
+        )
+        crud.apply_inventory_changes(db, target_district_id, transfer_data, **reference)
         db.commit()
+    except crud.InsufficientInventoryError as e:
+        db.rollback()
+        side = "source" if e.district_id == source_district_id else "target"
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient inventory in {side} district for {e.item}. Needed: {abs(transfer_data[e.item])}, Available: {e.available}",
+        )
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-    # Refresh instances to get updated inventories
-    db.refresh(source_district)
-    db.refresh(target_district)
+    return crud.get_inventories(db, [source_district_id, target_district_id])
 
+
+def publish_transfer(source_district_id: int, target_district_id: int, inventories):
+    for district_id in (source_district_id, target_district_id):
+        publish_inventory(district_id, inventories.get(district_id, {}))
     return {
         "message": "Transfer successful",
-        "source_inventory": source_district.inventory,
-        "target_inventory": target_district.inventory,
+        "source_inventory": inventories.get(source_district_id, {}),
+        "target_inventory": inventories.get(target_district_id, {}),
     }
+
+
+async def transfer_inventory_async(
+    source_district_id: int,
+    target_district_id: int,
+    transfer_data: Dict[str, int],  # Key: item, Value: quantity
+    username: Optional[str] = Depends(get_optional_username),
+    db: AsyncSession = Depends(database.get_async_db),
+):
+    """
+    Transfer inventory items from one district to another.
+    """
+    inventories = await db.run_sync(
+        store_transfer, source_district_id, target_district_id, transfer_data, username
+    )
+    return publish_transfer(source_district_id, target_district_id, inventories)
+
+
+@app.post("/districts/{source_district_id}/transfer/{target_district_id}")
+@database.hot_path(transfer_inventory_async)
+def transfer_inventory(
+    source_district_id: int,
+    target_district_id: int,
+    transfer_data: Dict[str, int],  # Key: item, Value: quantity
+    username: Optional[str] = Depends(get_optional_username),
+    db: Session = Depends(get_db),
+):
+    """
+    Transfer inventory items from one district to another.
+    """
+    inventories = store_transfer(
+        db, source_district_id, target_district_id, transfer_data, username
+    )
+    return publish_transfer(source_district_id, target_district_id, inventories)
+
+
+@app.get("/transfers/plan", response_model=schemas.TransferPlan)
+def get_transfer_plan(
+    items: Optional[List[str]] = Query(None),
+    max_km: Optional[float] = Query(None, gt=0),
+    candidates: int = Query(planner.TRANSFER_PLAN_CANDIDATES, ge=1, le=64),
+    db: Session = Depends(get_db),
+):
+    """
+    Proposes transfers that cover pending requests from other districts'
+    surplus stock at the lowest total distance. Nothing is moved; apply a
+    move with POST /districts/{source}/transfer/{target}.
+    """
+    return planner.plan_transfers(db, items=items, max_km=max_km, candidates=candidates)
+
+
+@app.get("/stats", response_model=schemas.Stats)
+def get_stats(by_district: bool = False, db: Session = Depends(get_db)):
+    """
+    Dashboard totals: requests per status, pending requests per type (and per
+    district with by_district=true), stock per item across all districts and
+    the oldest pending request. Served from counters kept up to date by every
+    write, so the cost does not grow with the number of requests.
+    """
+    return stats.summary(db, by_district)
@@ -1,11 +1,52 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Float
+from sqlalchemy import (
+    CheckConstraint,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    BigInteger,
+    Boolean,
+    Integer,
+    JSON,
+    String,
+    Table,
+    Text,
+)
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql.functions import FunctionElement
 from datetime import datetime
 from .database import Base
 from typing import Optional
 from sqlalchemy.dialects.postgresql import JSONB
 
 
+class utcnow(FunctionElement):
+    """The database clock in UTC, as a timestamp without time zone."""
+
+    type = DateTime()
+    name = "utcnow"
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    # The time of the write rather than of the transaction start
+    return "timezone('utc', clock_timestamp())"
+
+
+@compiles(utcnow, "sqlite")
+def _utcnow_sqlite(element, compiler, **kw):
+    # Microseconds, as SQLAlchemy stores and parses them
+    return "(strftime('%Y-%m-%d %H:%M:%f', 'now') || '000')"
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -28,7 +69,100 @@ class Request(Base):
     notes = Column(Text)
     timestamp = Column(DateTime, default=datetime.utcnow)
     status = Column(String, default="pending")
+    # When the request was resolved; resolved requests are moved to
+    # requests_archive some time after that (app.archive)
+    resolved_at = Column(DateTime, nullable=True)
     relatedDistrict = Column(Integer, ForeignKey("districts.id"))
+    # Set for submissions that went through the intake queue (app.intake);
+    # unique so redelivered queue entries are stored once
+    intake_id = Column(String(64), nullable=True)
+    # Near-duplicate detection (app.utils.dedup_key); duplicate_of links rows
+    # stored with DEDUP_MODE=link to the request they repeat
+    dedup_key = Column(String(64), nullable=True)
+    duplicate_of = Column(Integer, ForeignKey("requests.id"), nullable=True)
+
+    __table_args__ = (
+        Index("ix_requests_intake_id", "intake_id", unique=True),
+        Index("ix_requests_dedup_key", "dedup_key", "timestamp"),
+        # Serves per-district lookups and the per-district/status counts
+        Index("ix_requests_district_status", "relatedDistrict", "status"),
+        # Keyset pagination: one index per supported filter and sort order
+        Index("ix_requests_status_id", "status", "id"),
+        Index("ix_requests_type_id", "type", "id"),
+        Index("ix_requests_district_id", "relatedDistrict", "id"),
+        Index("ix_requests_timestamp", "timestamp"),
+        # Resolved requests due for archival, and requests linked to them
+        Index(
+            "ix_requests_resolved_at",
+            resolved_at,
+            postgresql_where=status == "resolved",
+            sqlite_where=status == "resolved",
+        ),
+        Index("ix_requests_duplicate_of", duplicate_of),
+        # Oldest pending request (GET /stats)
+        Index(
+            "ix_requests_pending_timestamp",
+            timestamp,
+            postgresql_where=status == "pending",
+            sqlite_where=status == "pending",
+        ),
+        Index("ix_requests_priority_order", priority.desc(), timestamp, id),
+        # Pending queues per type (and per district), oldest first. Within a type
+        # the effective priority only depends on age, so these indexes are the
+        # materialized priority order used by escalation and the urgent list.
+        Index(
+            "ix_requests_pending_type_timestamp",
+            type,
+            timestamp,
+            id,
+            postgresql_where=status == "pending",
+            sqlite_where=status == "pending",
+        ),
+        Index(
+            "ix_requests_pending_district_type_timestamp",
+            relatedDistrict,
+            type,
+            timestamp,
+            id,
+            postgresql_where=status == "pending",
+            sqlite_where=status == "pending",
+        ),
+        Index(
+            "ix_requests_status_priority_order",
+            status,
+            priority.desc(),
+            timestamp,
+            id,
+        ),
+    )
+
+
+class ArchivedRequest(Base):
+    """
+    Resolved requests moved out of `requests` (see app.archive), so the live
+    table and its indexes only hold recent rows. Same columns, in the same
+    order, so the two tables can be read as one with UNION ALL; no foreign
+    keys, archived rows are never written again.
+    """
+
+    __table__ = Table(
+        "requests_archive",
+        Base.metadata,
+        *[
+            Column(
+                column.name,
+                column.type,
+                primary_key=column.primary_key,
+                nullable=column.nullable,
+                autoincrement=False,
+            )
+            for column in Request.__table__.columns
+        ],
+        Index("ix_requests_archive_district_id", "relatedDistrict", "id"),
+        Index("ix_requests_archive_type_id", "type", "id"),
+        Index("ix_requests_archive_timestamp", "timestamp"),
+        Index("ix_requests_archive_intake_id", "intake_id"),
+    )
 
 
 class District(Base):
@@ -38,6 +172,112 @@ class District(Base):
     name = Column(String, unique=True, nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
+    # Legacy inventory document; stock lives in district_inventory and any
+    # items left here are moved over at startup (crud.migrate_legacy_inventory)
     inventory = Column(
-        JSONB, nullable=True, default={}
+        JSONB().with_variant(JSON(), "sqlite"), nullable=True, default={}
     )  # Example: {"tents": 10, "water": 50}
+    # Bumped whenever the district's stock or request statuses change; part of
+    # the ETag of the /districts responses (see crud.touch_districts)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class InventoryItem(Base):
+    """Stock of one item in one district, changed with atomic in-place updates."""
+
+    __tablename__ = "district_inventory"
+
+    district_id = Column(Integer, ForeignKey("districts.id"), primary_key=True)
+    item = Column(String, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        CheckConstraint("quantity >= 0", name="ck_district_inventory_quantity"),
+    )
+
+
+class StatCounter(Base):
+    """
+    One shard of a dashboard counter (see app.stats), e.g. scope
+    "pending_type", key "water". A counter's value is the sum of its shards;
+    writers spread over shards so concurrent transactions rarely wait on the
+    same row.
+    """
+
+    __tablename__ = "stat_counters"
+
+    scope = Column(String(32), primary_key=True)
+    key = Column(String, primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+
+class InventoryMovement(Base):
+    """
+    Append-only ledger of stock changes: one row per item and district for
+    every change applied through crud.apply_inventory_changes.
+    """
+
+    __tablename__ = "inventory_movements"
+
+    # INTEGER PRIMARY KEY is the only auto-incrementing key on SQLite
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    district_id = Column(Integer, ForeignKey("districts.id"), nullable=False)
+    item = Column(String, nullable=False)
+    delta = Column(Integer, nullable=False)
+    # "adjustment", "request", "transfer", "migration" or "opening"
+    reason = Column(String(16), nullable=False)
+    # What caused it; requests may be archived, so no foreign key
+    request_id = Column(Integer, nullable=True)
+    transfer_id = Column(String(32), nullable=True)  # shared by both legs of a transfer
+    username = Column(String, nullable=True)
+    # Stamped by the database clock, the one snapshot cutoffs are taken from
+    created_at = Column(DateTime, nullable=False, server_default=utcnow())
+
+    __table_args__ = (
+        Index("ix_inventory_movements_district_id", "district_id", "id"),
+        Index("ix_inventory_movements_district_created", "district_id", "created_at"),
+        Index("ix_inventory_movements_created", "created_at"),
+    )
+
+
+class InventorySnapshot(Base):
+    """
+    One snapshot of the inventory ledger, covering every movement up to
+    `movement_id`, all made by `as_of`, see app.ledger. A full snapshot has a
+    row for every item in stock; the others only for items that moved since
+    the previous snapshot.
+    """
+
+    __tablename__ = "inventory_snapshots"
+
+    movement_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    as_of = Column(DateTime, nullable=False, index=True)
+    full = Column(Boolean, nullable=False, default=False)
+    # No movement after `movement_id` is older than this
+    replay_from = Column(DateTime, nullable=False)
+
+
+class InventorySnapshotItem(Base):
+    """Stock of one item in one district as of a snapshot."""
+
+    __tablename__ = "inventory_snapshot_items"
+
+    # Key in this order so a district's rows of a range of snapshots are
+    # contiguous
+    district_id = Column(Integer, primary_key=True)
+    movement_id = Column(BigInteger, primary_key=True)  # the snapshot's
+    item = Column(String, primary_key=True)
+    quantity = Column(Integer, nullable=False)
+
+    __table_args__ = (Index("ix_inventory_snapshot_items_movement_id", "movement_id"),)
+
+
+class DataLoad(Base):
+    """Content hash of the last reference data file loaded, per data source."""
+
+    __tablename__ = "data_loads"
+
+    source = Column(String, primary_key=True)  # e.g. "districts"
+    content_hash = Column(String(64), nullable=False)
+    loaded_at = Column(DateTime, nullable=False, default=datetime.utcnow)
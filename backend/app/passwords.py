@@ -0,0 +1,92 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+# bcrypt cost factor for new hashes; stored hashes with a different cost are
+# transparently rehashed on the next successful login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Threads dedicated to bcrypt, and how many verifications may queue behind
+# them before logins are turned away with a 503 instead of piling up
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "256"))
+
+
+def make_context(rounds: int) -> CryptContext:
+    """
+    bcrypt context hashing with `rounds` and flagging any other cost as
+    needing an update, in either direction.
+    """
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+pwd_context = make_context(BCRYPT_ROUNDS)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password executor's queue is full."""
+
+
+class BoundedExecutor:
+    """
+    Thread pool that refuses new work once `workers + max_pending` tasks are
+    in flight, so a login burst degrades into fast 503s instead of an
+    unbounded queue of CPU-bound bcrypt calls.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password"
+        )
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def submit(self, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+
+        def run():
+            try:
+                return fn(*args)
+            finally:
+                self._slots.release()
+
+        try:
+            return self._executor.submit(run)
+        except BaseException:
+            self._slots.release()
+            raise
+
+
+password_executor = BoundedExecutor(PASSWORD_WORKERS, PASSWORD_MAX_PENDING)
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_and_update_sync(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """
+    Returns `(valid, new_hash)`; `new_hash` is set when the stored hash uses
+    an outdated cost factor and should replace it.
+    """
+    return pwd_context.verify_and_update(password, hashed)
+
+
+async def verify_and_update(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """
+    `verify_and_update_sync` run on the password executor, keeping bcrypt off
+    both the event loop and the request threadpool.
+    """
+    return await asyncio.wrap_future(
+        password_executor.submit(verify_and_update_sync, password, hashed)
+    )
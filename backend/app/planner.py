@@ -0,0 +1,234 @@
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import linprog
+from scipy.spatial import cKDTree
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.spatial import EARTH_RADIUS_KM, to_unit_vectors
+
+# Each district in need may receive an item from this many of the nearest
+# districts holding a surplus of it; keeps the problem sparse
+TRANSFER_PLAN_CANDIDATES = int(os.getenv("TRANSFER_PLAN_CANDIDATES", "8"))
+# Small items are solved together (one solver call each costs a few ms) until
+# a linear program reaches this many arcs; HiGHS slows down superlinearly
+# on bigger programs, so large items are solved one at a time
+TRANSFER_PLAN_MAX_ARCS = int(os.getenv("TRANSFER_PLAN_MAX_ARCS", "2000"))
+
+
+def item_key(request_type: str, subtype: str) -> str:
+    """Inventory key of a request, the "{type} - {subtype}" used for district stock."""
+    return f"{request_type} - {subtype}"
+
+
+def load_balances(db: Session, items: Optional[Iterable[str]] = None):
+    """
+    Stock and pending demand per item and district, from district_inventory
+    and the pending requests (quantities summed per "{type} - {subtype}").
+
+    Returns `(supply, demand)`, each `{item: {district_id: quantity}}`.
+    """
+    wanted = set(items) if items else None
+    supply: Dict[str, Dict[int, int]] = {}
+    stock = select(
+        models.InventoryItem.district_id, models.InventoryItem.item, models.InventoryItem.quantity
+    )
+    for district_id, item, quantity in db.execute(stock):
+        if quantity > 0 and (wanted is None or item in wanted):
+            supply.setdefault(item, {})[district_id] = quantity
+
+    demand: Dict[str, Dict[int, int]] = {}
+    pending = (
+        select(
+            models.Request.relatedDistrict,
+            models.Request.type,
+            models.Request.subtype,
+            func.sum(models.Request.quantity),
+        )
+        .where(models.Request.status == "pending", models.Request.relatedDistrict.isnot(None))
+        .group_by(models.Request.relatedDistrict, models.Request.type, models.Request.subtype)
+    )
+    for district_id, request_type, subtype, quantity in db.execute(pending):
+        item = item_key(request_type, subtype)
+        if quantity and (wanted is None or item in wanted):
+            demand.setdefault(item, {})[district_id] = int(quantity)
+    return supply, demand
+
+
+class ItemProblem:
+    """Surplus and deficit districts of one item and the candidate arcs between them."""
+
+    def __init__(self, item, sources, surplus, targets, deficit, arc_sources, arc_targets, km):
+        self.item = item
+        self.sources = sources  # district positions
+        self.surplus = surplus
+        self.targets = targets
+        self.deficit = deficit
+        self.arc_sources = arc_sources  # indexes into sources/targets
+        self.arc_targets = arc_targets
+        self.km = km
+
+
+def build_problem(item, stock, need, positions, unit, candidates, max_km):
+    """
+    Nets stock against local demand and connects every district short of
+    the item to its `candidates` nearest districts with a surplus (great
+    circle distances from a KD-tree over unit vectors).
+    """
+    districts = sorted(set(stock) | set(need))
+    net = np.array([stock.get(d, 0) - need.get(d, 0) for d in districts], dtype=np.int64)
+    index = np.array([positions[d] for d in districts], dtype=np.int64)
+    sources, targets = index[net > 0], index[net < 0]
+    if not len(sources) or not len(targets):
+        return None
+    k = min(candidates, len(sources))
+    chord, nearest = cKDTree(unit[sources]).query(unit[targets], k=k)
+    chord, nearest = chord.reshape(len(targets), k), nearest.reshape(len(targets), k)
+    km = 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0))
+    arc_targets = np.repeat(np.arange(len(targets)), k)
+    arc_sources, km = nearest.ravel(), km.ravel()
+    if max_km is not None:
+        keep = km <= max_km
+        arc_sources, arc_targets, km = arc_sources[keep], arc_targets[keep], km[keep]
+    if not len(km):
+        return None
+    return ItemProblem(
+        item, sources, net[net > 0], targets, -net[net < 0], arc_sources, arc_targets, km
+    )
+
+
+def solve(problems: List[ItemProblem]) -> List[np.ndarray]:
+    """
+    Solves the transportation problems of several items as one sparse
+    linear program (HiGHS): ship as much of the missing quantity as the
+    surpluses allow, and among those plans the one with the fewest
+    unit-kilometers. Shipping more always wins because every unit shipped
+    earns a reward larger than any rerouting can cost.
+
+    Returns the shipped quantity per arc, per problem.
+    """
+    costs, rows, columns, bounds = [], [], [], []
+    row_offset = column_offset = 0
+    for problem in problems:
+        arcs = len(problem.km)
+        reward = (min(len(problem.sources), len(problem.targets)) + 1) * (problem.km.max() + 1)
+        costs.append(problem.km - reward)
+        arc_ids = np.arange(column_offset, column_offset + arcs)
+        # One row per source (at most its surplus), one per target (at most its deficit)
+        rows.extend([row_offset + problem.arc_sources,
+                     row_offset + len(problem.sources) + problem.arc_targets])
+        columns.extend([arc_ids, arc_ids])
+        bounds.extend([problem.surplus, problem.deficit])
+        row_offset += len(problem.sources) + len(problem.targets)
+        column_offset += arcs
+
+    matrix = sparse.csr_matrix(
+        (np.ones(2 * column_offset), (np.concatenate(rows), np.concatenate(columns))),
+        shape=(row_offset, column_offset),
+    )
+    result = linprog(
+        np.concatenate(costs),
+        A_ub=matrix,
+        b_ub=np.concatenate(bounds).astype(np.float64),
+        bounds=(0, None),
+        method="highs",
+    )
+    if result.status != 0:
+        raise RuntimeError(f"Transfer planning failed: {result.message}")
+    # Transportation problems have integral optimal vertices; round off solver noise
+    shipped = np.rint(result.x).astype(np.int64)
+    splits = np.cumsum([len(problem.km) for problem in problems])[:-1]
+    return np.split(shipped, splits)
+
+
+def plan_transfers(
+    db: Session,
+    items: Optional[Iterable[str]] = None,
+    max_km: Optional[float] = None,
+    candidates: int = TRANSFER_PLAN_CANDIDATES,
+    max_arcs: int = TRANSFER_PLAN_MAX_ARCS,
+) -> dict:
+    """
+    Proposes inter-district transfers covering pending demand from other
+    districts' surplus stock (stock beyond their own pending demand), at the
+    lowest total distance. Nothing is moved; each proposed move can be
+    carried out with POST /districts/{source}/transfer/{target}.
+
+    Args:
+        db (Session): Database session.
+        items: Restrict the plan to these inventory items.
+        max_km: Never propose moves over a longer distance.
+        candidates: Nearest surplus districts considered per district in need.
+        max_arcs: Arcs per linear program; items are solved in groups.
+
+    Returns:
+        dict: `transfers` (source, target, distance_km, items) and a `summary`
+        with shipped and still unmet quantities.
+    """
+    start = time.perf_counter()
+    supply, demand = load_balances(db, items)
+    districts = db.query(
+        models.District.id, models.District.latitude, models.District.longitude
+    ).all()
+    ids = np.array([row[0] for row in districts], dtype=np.int64)
+    positions = {district_id: i for i, district_id in enumerate(ids.tolist())}
+    unit = to_unit_vectors([row[1] for row in districts], [row[2] for row in districts])
+
+    problems = []
+    unmet: Dict[str, int] = {}
+    for item in sorted(demand):
+        need = {d: q for d, q in demand[item].items() if d in positions}
+        stock = {d: q for d, q in supply.get(item, {}).items() if d in positions}
+        shortfall = sum(max(q - stock.get(d, 0), 0) for d, q in need.items())
+        if shortfall:
+            unmet[item] = shortfall
+        problem = build_problem(item, stock, need, positions, unit, candidates, max_km)
+        if problem is not None:
+            problems.append(problem)
+
+    groups: List[List[ItemProblem]] = []
+    arcs = 0
+    for problem in problems:
+        if not groups or arcs + len(problem.km) > max_arcs:
+            groups.append([])
+            arcs = 0
+        groups[-1].append(problem)
+        arcs += len(problem.km)
+
+    moves: Dict[tuple, Dict[str, int]] = {}
+    distances: Dict[tuple, float] = {}
+    for group in groups:
+        for solved, shipped in zip(group, solve(group)):
+            for arc in np.flatnonzero(shipped > 0):
+                source = int(ids[solved.sources[solved.arc_sources[arc]]])
+                target = int(ids[solved.targets[solved.arc_targets[arc]]])
+                moves.setdefault((source, target), {})[solved.item] = int(shipped[arc])
+                distances[source, target] = float(solved.km[arc])
+                unmet[solved.item] -= int(shipped[arc])
+
+    transfers = [
+        {
+            "source": source,
+            "target": target,
+            "distance_km": round(distances[source, target], 3),
+            "items": shipment,
+        }
+        for (source, target), shipment in sorted(moves.items())
+    ]
+    shipped = sum(sum(move["items"].values()) for move in transfers)
+    return {
+        "transfers": transfers,
+        "summary": {
+            "items": len(demand),
+            "transfers": len(transfers),
+            "shipped": shipped,
+            "unit_km": sum(m["distance_km"] * sum(m["items"].values()) for m in transfers),
+            "unmet": {item: count for item, count in sorted(unmet.items()) if count > 0},
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+        },
+    }
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 
 class UserCreate(BaseModel):
@@ -24,6 +24,16 @@ class RequestCreate(BaseModel):
     notes: Optional[str]
 
 
+class RequestFilters(BaseModel):
+    status: Optional[str] = None
+    type: Optional[str] = None
+    district_id: Optional[int] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    min_priority: Optional[int] = None
+    include_archived: bool = False
+
+
 class RequestResponse(BaseModel):
     id: int
     type: str
@@ -36,12 +46,113 @@ class RequestResponse(BaseModel):
     notes: Optional[str]
     timestamp: datetime
     status: str
+    resolved_at: Optional[datetime] = None
+    relatedDistrict: Optional[int] = None
+    duplicate_of: Optional[int] = None
+
+    class Config:
+        orm_mode = True
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
     relatedDistrict: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BatchSubmitResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BatchItemResult]
+
+
+class IntakeStatus(BaseModel):
+    intake_id: str
+    status: str  # "queued", "stored" or "failed"
+    id: Optional[int] = None
+    relatedDistrict: Optional[int] = None
+
+
+class InventoryHistory(BaseModel):
+    district_id: int
+    at: datetime
+    inventory: Dict[str, int]
+
+
+class InventoryMovementResponse(BaseModel):
+    id: int
+    district_id: int
+    item: str
+    delta: int
+    reason: str
+    request_id: Optional[int] = None
+    transfer_id: Optional[str] = None
+    username: Optional[str] = None
+    created_at: datetime
 
     class Config:
         orm_mode = True
 
 
+class ItemConsumption(BaseModel):
+    net: Dict[str, int]  # net change per reason
+    consumed: int  # handed out to requests
+    consumed_per_day: float
+
+
+class InventoryConsumption(BaseModel):
+    district_id: int
+    since: datetime
+    until: datetime
+    items: Dict[str, ItemConsumption]
+
+
+class DistrictNeighbor(BaseModel):
+    id: int
+    distance_km: float
+
+
+class Stats(BaseModel):
+    requests: Dict[str, int]  # per status
+    pending: int
+    pending_by_type: Dict[str, int]
+    pending_by_district: Optional[Dict[int, int]] = None
+    inventory: Dict[str, int]  # stock per item across districts
+    oldest_pending: Optional[datetime] = None
+    oldest_pending_age_seconds: Optional[float] = None
+
+
+class TransferMove(BaseModel):
+    source: int
+    target: int
+    distance_km: float
+    items: Dict[str, int]
+
+
+class TransferPlanSummary(BaseModel):
+    items: int
+    transfers: int
+    shipped: int
+    unit_km: float
+    unmet: Dict[str, int]  # pending quantity the plan cannot cover, per item
+    elapsed_ms: float
+
+
+class TransferPlan(BaseModel):
+    transfers: List[TransferMove]
+    summary: TransferPlanSummary
+
+
+class ResolvePendingResponse(BaseModel):
+    message: str
+    resolved_count: int
+    resolved: List[int]
+    allocated: Dict[str, int]
+    unfulfilled: int
+    inventory: Dict[str, int]
+
+
 class DistrictCreate(BaseModel):
     name: str
     latitude: float
@@ -56,6 +167,7 @@ class DistrictResponse(BaseModel):
     longitude: float
     inventory: Dict[str, int]
     request_count: int
+    status_counts: Optional[Dict[str, int]] = None
 
     class Config:
         orm_mode = True
@@ -0,0 +1,420 @@
+import contextlib
+import fcntl
+import json
+import math
+import os
+import threading
+import uuid
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from geopy.distance import geodesic
+from scipy.spatial import cKDTree
+
+# Mean earth radius in kilometers, used for the unit-sphere approximation
+EARTH_RADIUS_KM = 6371.0088
+
+# Upper bound on the relative difference between the WGS-84 geodesic distance
+# and the great-circle distance on a sphere of EARTH_RADIUS_KM (about 0.56%),
+# rounded up so the candidate search can never miss the true nearest district.
+ELLIPSOID_TOLERANCE = 0.01
+
+
+def to_unit_vectors(latitudes, longitudes) -> np.ndarray:
+    """
+    Converts latitude/longitude pairs (degrees) to 3D points on the unit sphere.
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def chord_for_distance(kilometers: float) -> float:
+    """
+    Returns the unit-sphere chord length that covers every point whose
+    geodesic distance may be at most `kilometers`.
+    """
+    angle = kilometers / ((1 - ELLIPSOID_TOLERANCE) * EARTH_RADIUS_KM)
+    if angle >= math.pi:
+        return 2.0
+    return 2.0 * math.sin(angle / 2.0)
+
+
+def haversine_matrix(lat_a, lon_a, lat_b, lon_b) -> np.ndarray:
+    """
+    Great-circle distances in kilometers between every point of `a` (rows)
+    and every point of `b` (columns).
+    """
+    lat_a = np.radians(np.asarray(lat_a, dtype=np.float64))[:, None]
+    lon_a = np.radians(np.asarray(lon_a, dtype=np.float64))[:, None]
+    lat_b = np.radians(np.asarray(lat_b, dtype=np.float64))[None, :]
+    lon_b = np.radians(np.asarray(lon_b, dtype=np.float64))[None, :]
+    h = (
+        np.sin((lat_b - lat_a) / 2.0) ** 2
+        + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2.0) ** 2
+    )
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+class DistrictIndex:
+    """
+    KD-tree over district locations projected onto the unit sphere.
+
+    Euclidean (chord) distance on the unit sphere is monotonic in great-circle
+    distance, so the tree yields candidates cheaply; the exact geodesic distance
+    is then computed only for the few districts that can still be the closest.
+    Ties are broken by the lowest district id, which is the order the linear
+    scan in `utils.find_closest_district` used to visit districts in.
+    """
+
+    def __init__(self, candidates: int = 1):
+        self.candidates = candidates
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self.stale = True
+
+    def build(self, districts: Iterable[Tuple[int, float, float]]):
+        """
+        (Re)builds the index from `(id, latitude, longitude)` tuples.
+        """
+        rows = sorted(districts, key=lambda row: row[0])
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        coords = np.array([(row[1], row[2]) for row in rows], dtype=np.float64)
+        tree = cKDTree(to_unit_vectors(coords[:, 0], coords[:, 1])) if rows else None
+        with self._lock:
+            # Swap the whole snapshot at once so concurrent readers never see
+            # a tree that does not match its id/coordinate arrays.
+            self._snapshot = (tree, ids, coords)
+            self.stale = False
+
+    def invalidate(self):
+        """
+        Marks the index as outdated so it is rebuilt before the next lookup.
+        """
+        self.stale = True
+
+    def __len__(self):
+        snapshot = self._snapshot
+        return 0 if snapshot is None else len(snapshot[1])
+
+    def _geodesic(self, coords, lat, lon, positions) -> np.ndarray:
+        return np.array(
+            [
+                geodesic((lat, lon), (coords[i, 0], coords[i, 1])).kilometers
+                for i in positions
+            ],
+            dtype=np.float64,
+        )
+
+    def nearest_k(self, lat: float, lon: float, k: int = 1) -> List[Tuple[int, float]]:
+        """
+        Returns the `k` closest districts to a point.
+
+        Args:
+            lat (float): Latitude of the point.
+            lon (float): Longitude of the point.
+            k (int): Number of districts to return.
+
+        Returns:
+            List[Tuple[int, float]]: `(district_id, kilometers)` pairs ordered by
+            exact geodesic distance, closest first.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or snapshot[0] is None or k < 1:
+            return []
+        tree, ids, coords = snapshot
+        k = min(k, len(ids))
+        point = to_unit_vectors([lat], [lon])[0]
+
+        # Seed with the nearest candidates on the sphere, then widen the search to
+        # every district that could beat the k-th best geodesic distance found.
+        _, positions = tree.query(point, k=min(max(k, self.candidates), len(ids)))
+        positions = np.atleast_1d(positions)
+        distances = self._geodesic(coords, lat, lon, positions)
+        bound = np.sort(distances)[k - 1]
+
+        wider = tree.query_ball_point(point, r=chord_for_distance(bound) + 1e-12)
+        extra = np.setdiff1d(np.asarray(wider, dtype=np.int64), positions)
+        if len(extra):
+            positions = np.concatenate((positions, extra))
+            distances = np.concatenate(
+                (distances, self._geodesic(coords, lat, lon, extra))
+            )
+
+        order = np.lexsort((positions, distances))[:k]
+        return [(int(ids[positions[i]]), float(distances[i])) for i in order]
+
+    def nearest_many(
+        self, latitudes, longitudes, max_cells: int = 4_000_000
+    ) -> List[Optional[int]]:
+        """
+        Returns the closest district id for every point of a batch.
+
+        Distances from the whole batch to the district coordinate matrix are
+        computed with one vectorized haversine pass (chunked to `max_cells`
+        matrix cells); exact geodesic distances are only computed for the
+        districts within the ellipsoid tolerance of each row's minimum, so the
+        result is identical to calling `nearest` for each point.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        snapshot = self._snapshot
+        if snapshot is None or snapshot[0] is None:
+            return [None] * len(latitudes)
+        _, ids, coords = snapshot
+
+        slack = (1 + ELLIPSOID_TOLERANCE) / (1 - ELLIPSOID_TOLERANCE)
+        chunk = max(1, max_cells // len(ids))
+        result: List[Optional[int]] = []
+        for start in range(0, len(latitudes), chunk):
+            lat, lon = latitudes[start : start + chunk], longitudes[start : start + chunk]
+            distances = haversine_matrix(lat, lon, coords[:, 0], coords[:, 1])
+            limits = distances.min(axis=1) * slack + 1e-9
+            for row in range(len(lat)):
+                positions = np.flatnonzero(distances[row] <= limits[row])
+                if len(positions) == 1:
+                    result.append(int(ids[positions[0]]))
+                    continue
+                exact = self._geodesic(coords, lat[row], lon[row], positions)
+                best = np.lexsort((positions, exact))[0]
+                result.append(int(ids[positions[best]]))
+        return result
+
+    def nearest(self, lat: float, lon: float) -> Optional[int]:
+        """
+        Returns the id of the closest district, or None when the index is empty.
+        """
+        result = self.nearest_k(lat, lon, 1)
+        return result[0][0] if result else None
+
+
+# Process-wide index shared by the API handlers
+district_index = DistrictIndex()
+
+
+def chord_to_km(chord) -> np.ndarray:
+    """Great-circle kilometers for unit-sphere chord lengths."""
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2.0, 0.0, 1.0))
+
+
+class DistanceTable:
+    """
+    Precomputed district-to-district distances: the `neighbors` nearest
+    districts of every district with their great-circle distances, plus the
+    unit vectors any other pair is computed from in O(1). A full matrix is
+    not kept; it would take 10 GB at 50k districts.
+
+    The arrays are saved as .npy files under `directory` and memory-mapped
+    on load, so worker processes share one copy through the page cache.
+    Districts added since the last build are merged in incrementally;
+    removed or moved districts trigger a full rebuild.
+    """
+
+    FILES = ("ids", "coords", "unit", "nearest", "km")
+
+    def __init__(self, directory: Optional[str] = None, neighbors: int = 64):
+        self.directory = directory
+        self.neighbors = neighbors
+        self._lock = threading.Lock()
+        # (ids, coords, unit vectors, neighbour positions, neighbour km, {id: position})
+        self._snapshot = None
+        self.stale = True
+        # Bumped by every invalidation, so a sync can tell it raced one
+        self.generation = 0
+
+    @property
+    def ready(self) -> bool:
+        """Whether a table is loaded; it may be stale."""
+        return self._snapshot is not None
+
+    def invalidate(self):
+        """Marks the table as outdated so it is synced again."""
+        self.generation += 1
+        self.stale = True
+
+    def clear(self):
+        """Drops the loaded table."""
+        with self._lock:
+            self._snapshot = None
+        self.invalidate()
+
+    def sync(self, districts: Iterable[Tuple[int, float, float]], generation: int = None):
+        """
+        Brings the table in line with `(id, latitude, longitude)` rows: reuses
+        the loaded or saved table, extends it with new districts, or rebuilds it.
+        Pass the `generation` read before the rows were to keep the table stale
+        if it was invalidated meanwhile.
+        """
+        rows = sorted(districts, key=lambda row: row[0])
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        coords = np.array([(row[1], row[2]) for row in rows], dtype=np.float64).reshape(-1, 2)
+        with self._lock:
+            current = self._snapshot[:5] if self._snapshot else self._load()
+            if current is not None and self._matches(current, ids, coords, len(ids)):
+                arrays = current
+            elif (
+                current is not None
+                and 0 < len(current[0]) < len(ids)
+                and self._matches(current, ids, coords, len(current[0]))
+                # Beyond 10% new districts a rebuild is cheaper than merging
+                and (len(ids) - len(current[0])) * 10 <= len(current[0])
+            ):
+                arrays = self._extend(current, coords)
+                arrays = (ids, coords) + arrays[2:]
+                self._save(arrays)
+            else:
+                arrays = self._build(ids, coords)
+                self._save(arrays)
+            self._snapshot = (*arrays, {int(d): i for i, d in enumerate(arrays[0])})
+            self.stale = generation is not None and generation != self.generation
+
+    @staticmethod
+    def _matches(current, ids, coords, count) -> bool:
+        # New districts get higher ids, so an extended table starts with the old one
+        return (
+            len(current[0]) == count
+            and np.array_equal(current[0], ids[:count])
+            and np.array_equal(current[1], coords[:count])
+        )
+
+    def _k(self, count: int) -> int:
+        return min(self.neighbors, max(count - 1, 0))
+
+    def _build(self, ids, coords):
+        unit = to_unit_vectors(coords[:, 0], coords[:, 1])
+        k = self._k(len(ids))
+        if k == 0:
+            return (ids, coords, unit, np.zeros((len(ids), 0), np.int32),
+                    np.zeros((len(ids), 0), np.float32))
+        chord, nearest = cKDTree(unit).query(unit, k=k + 1)
+        chord, nearest = chord.reshape(len(ids), k + 1), nearest.reshape(len(ids), k + 1)
+        # Drop each district itself: normally the first hit, but districts at
+        # the same location may come first
+        own = nearest == np.arange(len(ids))[:, None]
+        own[~own.any(axis=1), -1] = True
+        nearest = nearest[~own].reshape(len(ids), k).astype(np.int32)
+        km = chord_to_km(chord[~own].reshape(len(ids), k)).astype(np.float32)
+        return ids, coords, unit, nearest, km
+
+    def _extend(self, current, coords):
+        """Appends the districts after the current ones, updating existing rows."""
+        count = len(current[0])
+        total = len(coords)
+        k = self._k(total)
+        unit = np.vstack(
+            [current[2], to_unit_vectors(coords[count:, 0], coords[count:, 1])]
+        )
+        nearest = np.full((total, k), -1, dtype=np.int32)
+        km = np.full((total, k), np.inf, dtype=np.float32)
+        nearest[:count, : current[3].shape[1]] = current[3]
+        km[:count, : current[4].shape[1]] = current[4]
+
+        # Existing rows take in the new districts closer than their last neighbour
+        for position in range(count, total):
+            distances = chord_to_km(np.linalg.norm(unit[:count] - unit[position], axis=1))
+            for row in np.flatnonzero(distances < km[:count, -1]):
+                slot = np.searchsorted(km[row], distances[row], side="right")
+                km[row, slot + 1 :] = km[row, slot:-1]
+                nearest[row, slot + 1 :] = nearest[row, slot:-1]
+                km[row, slot] = distances[row]
+                nearest[row, slot] = position
+
+        # New rows: a KD-tree query over every district
+        chord, hits = cKDTree(unit).query(unit[count:], k=k + 1)
+        chord, hits = chord.reshape(total - count, k + 1), hits.reshape(total - count, k + 1)
+        for offset, position in enumerate(range(count, total)):
+            keep = hits[offset] != position
+            nearest[position] = hits[offset][keep][:k]
+            km[position] = chord_to_km(chord[offset][keep][:k])
+        return current[0], coords, unit, nearest, km
+
+    @contextlib.contextmanager
+    def _locked(self, mode):
+        # Saves are exclusive, so concurrent processes never delete each
+        # other's arrays; loads are shared, so a save cannot delete the
+        # arrays a load is opening
+        with open(os.path.join(self.directory, ".lock"), "a") as lock:
+            fcntl.flock(lock, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _manifest(self):
+        with open(os.path.join(self.directory, "manifest.json"), encoding="utf-8") as file:
+            return json.load(file)
+
+    def _save(self, arrays):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with self._locked(fcntl.LOCK_EX):
+            try:
+                previous = self._manifest()["token"]
+            except (OSError, ValueError, KeyError):
+                previous = None
+            token = uuid.uuid4().hex
+            for name, array in zip(self.FILES, arrays):
+                np.save(os.path.join(self.directory, f"{name}-{token}.npy"), np.asarray(array))
+            # The manifest is replaced last, so readers never see a partial table
+            manifest = os.path.join(self.directory, "manifest.json")
+            with open(f"{manifest}.{token}", "w", encoding="utf-8") as file:
+                json.dump({"token": token, "neighbors": self.neighbors}, file)
+            os.replace(f"{manifest}.{token}", manifest)
+            if previous is not None and previous != token:
+                for name in self.FILES:
+                    try:
+                        os.remove(os.path.join(self.directory, f"{name}-{previous}.npy"))
+                    except FileNotFoundError:
+                        pass
+
+    def _load(self):
+        if not self.directory or not os.path.isdir(self.directory):
+            return None
+        try:
+            with self._locked(fcntl.LOCK_SH):
+                manifest = self._manifest()
+                if manifest["neighbors"] != self.neighbors:
+                    return None
+                # Memory-mapped: the arrays stay readable once their files are
+                # replaced by a later save
+                return tuple(
+                    np.load(
+                        os.path.join(self.directory, f"{name}-{manifest['token']}.npy"),
+                        mmap_mode="r",
+                    )
+                    for name in self.FILES
+                )
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def neighbors_of(self, district_id: int, k: int) -> List[Tuple[int, float]]:
+        """
+        Returns the `k` closest districts to a district as
+        `(district_id, kilometers)`, closest first. Raises KeyError for an
+        unknown district. Beyond the stored neighbours a KD-tree is queried.
+        """
+        ids, _, unit, nearest, km, positions = self._snapshot
+        position = positions[district_id]
+        if k <= nearest.shape[1]:
+            return [
+                (int(ids[i]), float(d)) for i, d in zip(nearest[position, :k], km[position, :k])
+            ]
+        k = min(k, len(ids) - 1)
+        if k <= 0:
+            return []
+        chord, hits = cKDTree(unit).query(unit[position], k=k + 1)
+        found = [(int(ids[i]), float(d)) for i, d in zip(hits, chord_to_km(chord)) if i != position]
+        return found[:k]
+
+    def distance(self, a: int, b: int) -> float:
+        """Great-circle kilometers between two districts; KeyError if unknown."""
+        _, _, unit, _, _, positions = self._snapshot
+        u, v = unit[positions[a]], unit[positions[b]]
+        chord = math.sqrt((u[0] - v[0]) ** 2 + (u[1] - v[1]) ** 2 + (u[2] - v[2]) ** 2)
+        return 2.0 * EARTH_RADIUS_KM * math.asin(min(chord / 2.0, 1.0))
+
+
+# Optional directory for the saved distance table (shared by all workers)
+district_distances = DistanceTable(os.getenv("DISTANCE_CACHE_DIR") or None)
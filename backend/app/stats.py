@@ -0,0 +1,261 @@
+# Dashboard counters maintained in the same transaction as the writes.
+#
+# Code that creates requests, changes their status or changes stock records
+# deltas on its session (`request_added`, `request_status_changed`,
+# `inventory_changed`); they are written to stat_counters right before the
+# session commits, with one upsert, so a counter changes exactly when the
+# rows it counts do. Each commit adds to one randomly chosen shard of a
+# counter, so concurrent writers rarely wait on each other's row locks; a
+# counter is the sum of its shards.
+#
+# `reconcile` recounts the source tables and folds any difference into a
+# correction shard that regular writers never touch (see the Celery task
+# app.tasks.reconcile_stats).
+import os
+import random
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import metrics, models
+
+STAT_COUNTER_SHARDS = int(os.getenv("STAT_COUNTER_SHARDS", "8"))
+# Written by reconcile only
+CORRECTION_SHARD = -1
+
+REQUESTS = "requests"  # requests per status
+PENDING_TYPE = "pending_type"  # pending requests per type
+PENDING_DISTRICT = "pending_district"  # pending requests per district id
+INVENTORY = "inventory"  # stock per item, summed over districts
+ARCHIVED_DISTRICT = "archived_district"  # archived (resolved) requests per district id
+SCOPES = (REQUESTS, PENDING_TYPE, PENDING_DISTRICT, INVENTORY, ARCHIVED_DISTRICT)
+
+STATS_CORRECTIONS = metrics.registry.counter(
+    "stats_corrections_total", "Counters found off and corrected by reconciliation"
+)
+
+
+def _deltas(db: Session) -> Counter:
+    return db.info.setdefault("stat_deltas", Counter())
+
+
+def _request_deltas(deltas, request_type, status, district_id, sign):
+    deltas[REQUESTS, status] += sign
+    if status == "pending":
+        deltas[PENDING_TYPE, request_type] += sign
+        if district_id is not None:
+            deltas[PENDING_DISTRICT, str(district_id)] += sign
+
+
+def request_added(db: Session, request_type: str, status: str, district_id: Optional[int]):
+    """Counts a request inserted in the current transaction."""
+    _request_deltas(_deltas(db), request_type, status, district_id, 1)
+
+
+def requests_added(db: Session, rows: Iterable[dict]):
+    """Counts request rows (column mappings) inserted in the current transaction."""
+    deltas = _deltas(db)
+    for row in rows:
+        _request_deltas(deltas, row["type"], row["status"], row["relatedDistrict"], 1)
+
+
+def request_status_changed(
+    db: Session, request_type: str, district_id: Optional[int], old: str, new: str, count: int = 1
+):
+    """Counts `count` requests of one type and district moving from `old` to `new`."""
+    deltas = _deltas(db)
+    _request_deltas(deltas, request_type, old, district_id, -count)
+    _request_deltas(deltas, request_type, new, district_id, count)
+
+
+def requests_archived(db: Session, district_ids: Iterable[Optional[int]]):
+    """Counts requests of these districts (one id per request) moved to the archive."""
+    deltas = _deltas(db)
+    for district_id in district_ids:
+        if district_id is not None:
+            deltas[ARCHIVED_DISTRICT, str(district_id)] += 1
+
+
+def inventory_changed(db: Session, changes: Dict[str, int]):
+    """Counts `{item: delta}` applied to a district's stock in the current transaction."""
+    deltas = _deltas(db)
+    for item, delta in changes.items():
+        deltas[INVENTORY, item] += delta
+
+
+def _add_to_counters(db: Session, deltas: Dict[tuple, int], shard: int):
+    table = models.StatCounter.__table__
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(table).values(
+        [
+            {"scope": scope, "key": key, "shard": shard, "value": delta}
+            for (scope, key), delta in sorted(deltas.items())
+        ]
+    )
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[table.c.scope, table.c.key, table.c.shard],
+            set_={"value": table.c.value + statement.excluded.value},
+        )
+    )
+
+
+@event.listens_for(Session, "before_commit")
+def _write_counters(session):
+    deltas = session.info.pop("stat_deltas", None)
+    deltas = {key: delta for key, delta in (deltas or {}).items() if delta}
+    if deltas:
+        _add_to_counters(session, deltas, random.randrange(STAT_COUNTER_SHARDS))
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_counters(session):
+    session.info.pop("stat_deltas", None)
+
+
+def read_counters(
+    db: Session, scopes: Iterable[str] = SCOPES, keys: Iterable[str] = None
+) -> Dict[str, Dict[str, int]]:
+    """
+    Current value of every counter in `scopes` (only of `keys` if given), as
+    `{scope: {key: value}}`. Counters at zero are left out.
+    """
+    table = models.StatCounter.__table__
+    counters: Dict[str, Dict[str, int]] = {scope: {} for scope in scopes}
+    query = select(table.c.scope, table.c.key, func.sum(table.c.value)).where(
+        table.c.scope.in_(list(scopes))
+    )
+    if keys is not None:
+        query = query.where(table.c.key.in_(list(keys)))
+    query = query.group_by(table.c.scope, table.c.key)
+    for scope, key, value in db.execute(query):
+        if value:
+            counters[scope][key] = int(value)
+    return counters
+
+
+def oldest_pending(db: Session) -> Optional[datetime]:
+    """Timestamp of the oldest pending request (ix_requests_pending_timestamp)."""
+    return db.execute(
+        select(func.min(models.Request.timestamp)).where(models.Request.status == "pending")
+    ).scalar()
+
+
+def summary(db: Session, by_district: bool = False, now: datetime = None) -> dict:
+    """
+    Dashboard totals read from the counters: requests per status, pending
+    requests per type (and per district with `by_district`), stock per item
+    and the age of the oldest pending request.
+    """
+    now = now or datetime.utcnow()
+    scopes = (REQUESTS, PENDING_TYPE, INVENTORY) + ((PENDING_DISTRICT,) if by_district else ())
+    counters = read_counters(db, scopes)
+    oldest = oldest_pending(db)
+    return {
+        "requests": counters[REQUESTS],
+        "pending": counters[REQUESTS].get("pending", 0),
+        "pending_by_type": counters[PENDING_TYPE],
+        "pending_by_district": (
+            {int(key): value for key, value in counters[PENDING_DISTRICT].items()}
+            if by_district
+            else None
+        ),
+        "inventory": counters[INVENTORY],
+        "oldest_pending": oldest,
+        "oldest_pending_age_seconds": (
+            max((now - oldest).total_seconds(), 0.0) if oldest else None
+        ),
+    }
+
+
+def count_sources(db: Session) -> Dict[str, Dict[str, int]]:
+    """
+    The counters recomputed from the requests (live and archived),
+    requests_archive and district_inventory tables.
+    """
+    request = models.Request
+    pending = request.status == "pending"
+    counts: Dict[str, Dict[str, int]] = {scope: {} for scope in SCOPES}
+    for table in (request.__table__, models.ArchivedRequest.__table__):
+        # Archived requests keep counting as resolved
+        for status, count in db.execute(
+            select(table.c.status, func.count()).group_by(table.c.status)
+        ):
+            counts[REQUESTS][status] = counts[REQUESTS].get(status, 0) + count
+    for request_type, count in db.execute(
+        select(request.type, func.count()).where(pending).group_by(request.type)
+    ):
+        counts[PENDING_TYPE][request_type] = count
+    for district_id, count in db.execute(
+        select(request.relatedDistrict, func.count())
+        .where(pending, request.relatedDistrict.isnot(None))
+        .group_by(request.relatedDistrict)
+    ):
+        counts[PENDING_DISTRICT][str(district_id)] = count
+    archive = models.ArchivedRequest
+    for district_id, count in db.execute(
+        select(archive.relatedDistrict, func.count())
+        .where(archive.relatedDistrict.isnot(None))
+        .group_by(archive.relatedDistrict)
+    ):
+        counts[ARCHIVED_DISTRICT][str(district_id)] = count
+    stock = models.InventoryItem
+    for item, quantity in db.execute(
+        select(stock.item, func.sum(stock.quantity)).group_by(stock.item)
+    ):
+        counts[INVENTORY][item] = int(quantity or 0)
+    return {scope: {k: v for k, v in values.items() if v} for scope, values in counts.items()}
+
+
+def reconcile(db: Session) -> dict:
+    """
+    Checks every counter against the source tables and corrects the ones
+    that are off. Needs a session with no transaction begun yet.
+
+    Counters and source tables are read from one snapshot (REPEATABLE READ
+    on Postgres), where they agree unless something bypassed the counters;
+    the difference is added to the correction shard, so writes committed
+    meanwhile, which maintain the counters themselves, are not disturbed.
+    Two concurrent runs conflict on that shard and one of them fails.
+
+    Returns:
+        dict: `corrections` as `{scope: {key: delta}}` and elapsed milliseconds.
+    """
+    start = time.perf_counter()
+    if db.get_bind().dialect.name == "postgresql":
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    counted = read_counters(db)
+    actual = count_sources(db)
+    corrections = {}
+    for scope in SCOPES:
+        for key in counted[scope].keys() | actual[scope].keys():
+            delta = actual[scope].get(key, 0) - counted[scope].get(key, 0)
+            if delta:
+                corrections[scope, key] = delta
+    if corrections:
+        _add_to_counters(db, corrections, CORRECTION_SHARD)
+    db.commit()
+    STATS_CORRECTIONS.inc(len(corrections))
+
+    report: Dict[str, Dict[str, int]] = {}
+    for (scope, key), delta in sorted(corrections.items()):
+        report.setdefault(scope, {})[key] = delta
+    return {"corrections": report, "elapsed_ms": (time.perf_counter() - start) * 1000}
+
+
+def seed_counters(db: Session) -> bool:
+    """
+    Fills the counters from the source tables when none exist yet (first
+    startup with this table). Returns whether it did.
+    """
+    if db.execute(select(models.StatCounter.scope).limit(1)).first() is not None:
+        db.commit()
+        return False
+    db.commit()
+    reconcile(db)
+    return True
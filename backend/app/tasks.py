@@ -1,8 +1,16 @@
+import os
+import time
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
+from sqlalchemy import Integer, case, literal, update
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import FunctionElement
 from datetime import datetime
-from app.database import SessionLocal
+from app import archive, events, ledger, planner, stats
+from app.database import SessionLocal, engine
 from app.models import Request
+from app.utils import default_priority
 
 celery_app = Celery("tasks", broker="redis://redis:6379/0")
 
@@ -11,6 +19,22 @@ celery_app.conf.update(
     include=["app.tasks"]  # Replace "app.tasks" with the actual module path if needed
 )
 
+
+@worker_process_init.connect
+def reset_connection_pool(**kwargs):
+    """
+    Forked worker processes must not reuse connections opened by the parent;
+    give each child its own pool (sized by the DB_POOL_* settings).
+    """
+    engine.dispose()
+
+
+@worker_process_shutdown.connect
+def flush_events(**kwargs):
+    """Publishes the events queued by tasks before the worker process exits."""
+    events.flush()
+
+
 # Priority adjustment constants
 PRIORITY_INCREASE = {
     "water": lambda hours: 2**hours,  # Exponential
@@ -20,6 +44,26 @@ PRIORITY_INCREASE = {
     "hygiene": lambda hours: 0.5 * hours,  # Slower linear
 }
 
+# Escalated priorities saturate here so 2**hours fits in the Integer column
+MAX_PRIORITY = 2**31 - 1
+
+# The same curves as SQL expressions over whole hours (an Integer expression).
+# Integer division truncates like int() does for the fractional rates above.
+PRIORITY_INCREASE_SQL = {
+    "water": lambda hours: case(
+        (hours >= 31, MAX_PRIORITY - default_priority("water")),
+        else_=literal(1, Integer).op("<<")(hours),
+    ),
+    "food": lambda hours: (3 * hours) / 2,
+    "shelter": lambda hours: hours,
+    "clothes": lambda hours: hours / 2,
+    "hygiene": lambda hours: hours / 2,
+}
+
+# "eager" rewrites stored priorities periodically; "lazy" leaves them at their
+# base value and computes effective priorities at read time (GET /requests/urgent)
+PRIORITY_MODE = os.getenv("PRIORITY_MODE", "eager")
+
 # Celery beat schedule for periodic task execution
 celery_app.conf.beat_schedule = {
     "adjust-priorities-every-30-seconds": {
@@ -27,6 +71,109 @@ celery_app.conf.beat_schedule = {
         "schedule": 120.0,  # Run every 30 seconds
     }
 }
+if PRIORITY_MODE == "lazy":
+    # Nothing needs rewriting; the task can still be triggered by hand
+    del celery_app.conf.beat_schedule["adjust-priorities-every-30-seconds"]
+
+# Seconds between transfer plans pushed to the change feed (0: on demand only)
+TRANSFER_PLAN_INTERVAL = float(os.getenv("TRANSFER_PLAN_INTERVAL", "0"))
+if TRANSFER_PLAN_INTERVAL > 0:
+    celery_app.conf.beat_schedule["propose-transfers"] = {
+        "task": "app.tasks.propose_transfers",
+        "schedule": TRANSFER_PLAN_INTERVAL,
+    }
+
+# Seconds between checks of the dashboard counters against the source tables
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", "3600"))
+if STATS_RECONCILE_INTERVAL > 0:
+    celery_app.conf.beat_schedule["reconcile-stats"] = {
+        "task": "app.tasks.reconcile_stats",
+        "schedule": STATS_RECONCILE_INTERVAL,
+    }
+
+# Seconds between moves of old resolved requests to requests_archive (0: off)
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))
+if ARCHIVE_INTERVAL > 0:
+    celery_app.conf.beat_schedule["archive-resolved-requests"] = {
+        "task": "app.tasks.archive_resolved_requests",
+        "schedule": ARCHIVE_INTERVAL,
+    }
+
+# Seconds between inventory snapshots; point-in-time stock queries replay
+# at most this much of the ledger
+INVENTORY_SNAPSHOT_INTERVAL = float(os.getenv("INVENTORY_SNAPSHOT_INTERVAL", "900"))
+if INVENTORY_SNAPSHOT_INTERVAL > 0:
+    celery_app.conf.beat_schedule["snapshot-inventory"] = {
+        "task": "app.tasks.snapshot_inventory",
+        "schedule": INVENTORY_SNAPSHOT_INTERVAL,
+    }
+
+
+class hours_since(FunctionElement):
+    """Whole hours elapsed from a timestamp column until `now` (never negative)."""
+
+    type = Integer()
+    name = "hours_since"
+    inherit_cache = True
+
+
+@compiles(hours_since, "postgresql")
+def _hours_since_postgresql(element, compiler, **kw):
+    column, now = [compiler.process(clause, **kw) for clause in element.clauses]
+    return f"GREATEST(CAST(floor(extract(epoch from ({now} - {column})) / 3600) AS INTEGER), 0)"
+
+
+@compiles(hours_since, "sqlite")
+def _hours_since_sqlite(element, compiler, **kw):
+    column, now = [compiler.process(clause, **kw) for clause in element.clauses]
+    seconds = (
+        f"(CAST(strftime('%s', {now}) AS INTEGER) - CAST(strftime('%s', {column}) AS INTEGER))"
+    )
+    return f"MAX({seconds} / 3600, 0)"
+
+
+def escalated_priority(request_type: str, hours) -> int:
+    """
+    Priority of a pending request of `request_type` that has waited `hours` hours.
+
+    Priorities are derived from the type's base priority and the request's age
+    alone, so recomputing them is idempotent.
+    """
+    base = default_priority(request_type)
+    if request_type not in PRIORITY_INCREASE:
+        return base
+    hours = max(int(hours), 0)
+    return min(base + int(PRIORITY_INCREASE[request_type](hours)), MAX_PRIORITY)
+
+
+def escalate_priorities(db: Session, now: datetime = None):
+    """
+    Recomputes the priority of every pending request with one UPDATE per type.
+
+    Only rows whose priority actually changes are written.
+
+    Returns:
+        dict: Number of rows updated and elapsed milliseconds.
+    """
+    now = now or datetime.utcnow()
+    start = time.perf_counter()
+    hours = hours_since(Request.timestamp, literal(now))
+    updated = 0
+    for request_type, increase in PRIORITY_INCREASE_SQL.items():
+        priority = default_priority(request_type) + increase(hours)
+        result = db.execute(
+            update(Request)
+            .where(
+                Request.status == "pending",
+                Request.type == request_type,
+                Request.priority != priority,
+            )
+            .values(priority=priority)
+            .execution_options(synchronize_session=False)
+        )
+        updated += result.rowcount
+    db.commit()
+    return {"updated": updated, "elapsed_ms": (time.perf_counter() - start) * 1000}
 
 
 @celery_app.task
@@ -34,20 +181,89 @@ def adjust_priorities():
     """Adjust the priority of pending requests based on time passed."""
     db: Session = SessionLocal()
     try:
-        # Fetch all pending requests
-        requests = db.query(Request).filter(Request.status == "pending").all()
-
-        for request in requests:
-            time_passed = (
-                datetime.utcnow() - request.timestamp
-            ).total_seconds() // 3600  # Time in hours
-            if request.type in PRIORITY_INCREASE:
-                increase = PRIORITY_INCREASE[request.type](time_passed)
-                request.priority += int(increase)
-                db.add(request)
-
-        db.commit()
+        report = escalate_priorities(db)
+        if report["updated"]:
+            events.publish("priority.escalated", {"updated": report["updated"]})
+        print(
+            f"Adjusted priorities: {report['updated']} rows in {report['elapsed_ms']:.1f} ms"
+        )
+        return report
     except Exception as e:
+        db.rollback()
         print("Error adjusting priorities:", e)
     finally:
         db.close()
+
+
+@celery_app.task
+def propose_transfers(items=None, max_km=None):
+    """
+    Computes a transfer plan and publishes it as a "transfers.planned" event,
+    so coordinators see fresh proposals without waiting on the solver.
+    """
+    db: Session = SessionLocal()
+    try:
+        plan = planner.plan_transfers(db, items=items, max_km=max_km)
+        events.publish("transfers.planned", plan)
+        summary = plan["summary"]
+        print(
+            f"Proposed {summary['transfers']} transfers ({summary['shipped']} units) "
+            f"in {summary['elapsed_ms']:.0f} ms"
+        )
+        return summary
+    except Exception as e:
+        print("Error proposing transfers:", e)
+    finally:
+        db.close()
+
+
+@celery_app.task
+def reconcile_stats():
+    """Checks the dashboard counters against the source tables and corrects drift."""
+    db: Session = SessionLocal()
+    try:
+        report = stats.reconcile(db)
+        corrected = sum(len(keys) for keys in report["corrections"].values())
+        if corrected:
+            print(f"Corrected {corrected} dashboard counters: {report['corrections']}")
+        return report
+    except Exception as e:
+        db.rollback()
+        print("Error reconciling stats:", e)
+    finally:
+        db.close()
+
+
+@celery_app.task
+def archive_resolved_requests():
+    """Moves requests resolved more than ARCHIVE_AFTER_HOURS ago to requests_archive."""
+    db: Session = SessionLocal()
+    try:
+        report = archive.archive_resolved(db)
+        if report["archived"]:
+            print(
+                f"Archived {report['archived']} resolved requests "
+                f"in {report['elapsed_ms']:.0f} ms"
+            )
+        return report
+    except Exception as e:
+        db.rollback()
+        print("Error archiving requests:", e)
+    finally:
+        db.close()
+
+
+@celery_app.task
+def snapshot_inventory():
+    """Snapshots the stock of the items moved since the previous inventory snapshot."""
+    db: Session = SessionLocal()
+    try:
+        report = ledger.snapshot(db)
+        if report["items"]:
+            print(f"Snapshot {report['items']} stock items in {report['elapsed_ms']:.0f} ms")
+        return report
+    except Exception as e:
+        db.rollback()
+        print("Error snapshotting inventory:", e)
+    finally:
+        db.close()
@@ -0,0 +1,293 @@
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+import fastapi.routing
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+from app import metrics
+
+# Opt-in request telemetry: per-request SQL count, database time and
+# serialization time as Server-Timing headers plus per-route metrics
+REQUEST_METRICS = os.getenv("REQUEST_METRICS", "0").lower() in ("1", "true", "yes", "on")
+
+# Profile requests and keep the profiles of those slower than this (0 disables)
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+# Fraction of requests profiled when PROFILE_SLOW_MS is set
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "1.0"))
+# Honour "X-Profile: 1" request headers (always dumps the profile)
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "0").lower() in ("1", "true", "yes", "on")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# "pyinstrument" (sampling, low overhead) when installed, otherwise "cprofile"
+PROFILER = os.getenv("PROFILER", "")
+
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+REQUESTS = metrics.registry.counter(
+    "http_requests_total", "Requests served, by method, route and status"
+)
+REQUEST_SECONDS = metrics.registry.histogram(
+    "http_request_duration_seconds", "Time to the end of the response, by route"
+)
+REQUEST_QUERIES = metrics.registry.histogram(
+    "http_request_db_queries", "SQL statements issued per request, by route", QUERY_BUCKETS
+)
+REQUEST_DB_SECONDS = metrics.registry.histogram(
+    "http_request_db_seconds", "Time spent executing SQL per request, by route"
+)
+REQUEST_SERIALIZE_SECONDS = metrics.registry.histogram(
+    "http_request_serialize_seconds",
+    "Time spent validating, encoding and rendering response bodies, by route",
+)
+PROFILES_WRITTEN = metrics.registry.counter(
+    "http_request_profiles_total", "Request profiles written to PROFILE_DIR, by route"
+)
+
+
+class RequestStats:
+    """Accumulates what one request spent; shared with its threadpool work."""
+
+    __slots__ = ("queries", "db_seconds", "serialize_seconds", "profile", "profiled")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.profile: Optional["ProfileSession"] = None
+        self.profiled = False
+
+
+# Set by the middleware for the duration of a request. Threadpool handlers
+# run in a copy of the request's context, so they update the same object.
+current_request: ContextVar[Optional[RequestStats]] = ContextVar(
+    "current_request", default=None
+)
+
+
+def record_query(seconds: float):
+    """Called by the engine hooks in app.database for every statement."""
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += seconds
+
+
+class ProfileSession:
+    """cProfile around the endpoint call; dumps a .prof file for pstats/snakeviz."""
+
+    suffix = ".prof"
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def dump(self, path: str):
+        self.profiler.dump_stats(path)
+
+
+class PyinstrumentSession(ProfileSession):
+    """pyinstrument's statistical profiler; dumps an HTML call tree."""
+
+    suffix = ".html"
+
+    def __init__(self):
+        from pyinstrument import Profiler
+
+        self.profiler = Profiler(async_mode="disabled")
+
+    def start(self):
+        self.profiler.start()
+
+    def stop(self):
+        self.profiler.stop()
+
+    def dump(self, path: str):
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.profiler.output_html())
+
+
+def profile_session_class():
+    if PROFILER == "cprofile":
+        return ProfileSession
+    try:
+        import pyinstrument  # noqa: F401
+    except ImportError:
+        return ProfileSession
+    return PyinstrumentSession
+
+
+# One profiled request at a time: profilers hook the interpreter per thread
+# and async endpoints of concurrent requests share the event loop thread
+_profile_lock = threading.Lock()
+
+
+async def run_endpoint_function(*, dependant, values, is_coroutine):
+    """
+    fastapi.routing.run_endpoint_function, profiling the endpoint body when
+    the middleware asked for it. Sync endpoints are profiled inside their
+    worker thread.
+    """
+    stats = current_request.get()
+    profile = stats.profile if stats is not None else None
+    if profile is None or not _profile_lock.acquire(blocking=False):
+        return await _run_endpoint_function(
+            dependant=dependant, values=values, is_coroutine=is_coroutine
+        )
+    try:
+        if is_coroutine:
+            profile.start()
+            try:
+                return await dependant.call(**values)
+            finally:
+                profile.stop()
+
+        def profiled(**kwargs):
+            profile.start()
+            try:
+                return dependant.call(**kwargs)
+            finally:
+                profile.stop()
+
+        return await run_in_threadpool(profiled, **values)
+    finally:
+        stats.profiled = True
+        _profile_lock.release()
+
+
+async def serialize_response(**kwargs):
+    """fastapi.routing.serialize_response, timed into the request stats."""
+    start = time.perf_counter()
+    try:
+        return await _serialize_response(**kwargs)
+    finally:
+        stats = current_request.get()
+        if stats is not None:
+            stats.serialize_seconds += time.perf_counter() - start
+
+
+def render_json(self, content):
+    start = time.perf_counter()
+    try:
+        return _render_json(self, content)
+    finally:
+        stats = current_request.get()
+        if stats is not None:
+            stats.serialize_seconds += time.perf_counter() - start
+
+
+_run_endpoint_function = fastapi.routing.run_endpoint_function
+_serialize_response = fastapi.routing.serialize_response
+_render_json = JSONResponse.render
+
+
+def install_hooks():
+    """Times FastAPI's response serialization and lets endpoints be profiled."""
+    fastapi.routing.run_endpoint_function = run_endpoint_function
+    fastapi.routing.serialize_response = serialize_response
+    JSONResponse.render = render_json
+
+
+def route_label(scope) -> str:
+    # The matched route's template keeps label cardinality bounded
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def server_timing(stats: RequestStats, total_seconds: float) -> str:
+    return ", ".join(
+        [
+            f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"',
+            f"serialize;dur={stats.serialize_seconds * 1000:.1f}",
+            f"app;dur={total_seconds * 1000:.1f}",
+        ]
+    )
+
+
+class RequestTelemetryMiddleware:
+    """
+    ASGI middleware recording SQL statements, database time and
+    serialization time per request. Sends them as a Server-Timing header
+    (covering the work done before the response started) and aggregates them
+    per route in the metrics registry. Optionally profiles requests and dumps
+    the profiles of slow ones to PROFILE_DIR.
+    """
+
+    def __init__(
+        self,
+        app,
+        slow_ms: float = PROFILE_SLOW_MS,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        profile_header: bool = PROFILE_HEADER,
+        profile_dir: str = PROFILE_DIR,
+    ):
+        self.app = app
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.profile_header = profile_header
+        self.profile_dir = profile_dir
+        self.session_class = profile_session_class()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        forced = self.profile_header and (b"x-profile", b"1") in scope.get("headers", [])
+        if forced or (self.slow_ms > 0 and random.random() < self.sample_rate):
+            stats.profile = self.session_class()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = server_timing(stats, time.perf_counter() - start)
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timing.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            elapsed = time.perf_counter() - start
+            route = route_label(scope)
+            method = scope["method"]
+            REQUESTS.inc(method=method, route=route, status=status)
+            REQUEST_SECONDS.observe(elapsed, method=method, route=route)
+            REQUEST_QUERIES.observe(stats.queries, method=method, route=route)
+            REQUEST_DB_SECONDS.observe(stats.db_seconds, method=method, route=route)
+            REQUEST_SERIALIZE_SECONDS.observe(
+                stats.serialize_seconds, method=method, route=route
+            )
+            if stats.profiled and (forced or elapsed * 1000 >= self.slow_ms):
+                self.dump_profile(stats.profile, method, route, elapsed)
+
+    def dump_profile(self, profile: ProfileSession, method: str, route: str, elapsed: float):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        name = f"{int(time.time() * 1000)}-{method}-{slug}-{elapsed * 1000:.0f}ms{profile.suffix}"
+        profile.dump(os.path.join(self.profile_dir, name))
+        PROFILES_WRITTEN.inc(route=route)
+
+
+def install(app):
+    """Adds the telemetry middleware to `app` (outermost, so it sees the whole request)."""
+    install_hooks()
+    app.add_middleware(RequestTelemetryMiddleware)
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+from app import crud, models, stats
+from app.archive import archive_resolved
+from app.tests.requests_test import seed_districts
+
+
+def seed_requests(session_factory):
+    now = datetime.utcnow()
+    old = now - timedelta(days=10)
+    db = session_factory()
+    for status, resolved_at, timestamp in [
+        ("resolved", old, old),  # 1: archived
+        ("resolved", now, old),  # 2: resolved too recently
+        ("pending", None, old),  # 3
+        ("resolved", None, old),  # 4: resolved before resolved_at existed, archived
+        ("resolved", old, old),  # 5: kept, request 6 repeats it
+    ]:
+        db.add(
+            models.Request(
+                type="water", subtype="bottled", priority=3, latitude=37, longitude=36,
+                quantity=1, status=status, resolved_at=resolved_at, timestamp=timestamp,
+                relatedDistrict=1,
+            )
+        )
+    db.add(
+        models.Request(
+            type="water", subtype="bottled", priority=3, latitude=37, longitude=36,
+            quantity=1, status="duplicate", duplicate_of=5, timestamp=now, relatedDistrict=1,
+        )
+    )
+    db.commit()
+    db.close()
+
+
+def test_archive_moves_old_resolved_requests(api_client, sqlite_session_factory):
+    seed_districts(sqlite_session_factory)
+    seed_requests(sqlite_session_factory)
+    db = sqlite_session_factory()
+    stats.reconcile(db)
+    version = crud.districts_fingerprint(db, 1)
+
+    report = archive_resolved(db, older_than_hours=24, batch_size=1)
+    assert (report["archived"], report["batches"]) == (2, 2)
+    assert archive_resolved(db, older_than_hours=24)["archived"] == 0
+    assert crud.districts_fingerprint(db, 1) != version
+    # Archived requests still count as resolved
+    assert stats.reconcile(db)["corrections"] == {}
+    db.close()
+
+    ids = [r["id"] for r in api_client.get("/requests").json()]
+    assert ids == [2, 3, 5, 6]
+    response = api_client.get("/requests", params={"include_archived": True, "limit": 3})
+    assert [r["id"] for r in response.json()] == [1, 2, 3]
+    response = api_client.get(
+        "/requests",
+        params={"include_archived": True, "cursor": response.headers["X-Next-Cursor"]},
+    )
+    assert [r["id"] for r in response.json()] == [4, 5, 6]
+    resolved = api_client.get(
+        "/districts/1/requests",
+        params={"include_archived": True, "status": "resolved", "sort": "priority"},
+    ).json()
+    assert sorted(r["id"] for r in resolved) == [1, 2, 4, 5]
+    export = api_client.get("/requests/export", params={"include_archived": True})
+    assert len(export.text.splitlines()) == 6
+
+    # District counts agree with /stats once requests are archived
+    counts = {"resolved": 4, "pending": 1, "duplicate": 1}
+    district = api_client.get("/districts/1", params={"include_status": True}).json()
+    assert district["status_counts"] == counts
+    districts = api_client.get("/districts", params={"include_status": True}).json()
+    assert next(d for d in districts if d["id"] == 1)["status_counts"] == counts
@@ -0,0 +1,82 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import database, main, models
+from app.database import Base
+from app.spatial import district_index
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest.fixture
+def async_client():
+    """The async variants of the hot handlers, over aiosqlite."""
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def get_session():
+        async with session_factory() as session:
+            yield session
+
+    test_app = FastAPI()
+
+    @test_app.on_event("startup")
+    async def create_schema():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as session:
+            session.add(models.District(name="Antakya", latitude=36.2, longitude=36.16))
+            session.add(models.District(name="Iskenderun", latitude=36.58, longitude=36.17))
+            await session.commit()
+
+    for method, path, endpoint in [
+        ("post", "/submit-request", main.submit_request_async),
+        ("get", "/requests", main.get_all_requests_async),
+        ("get", "/districts", main.get_districts_async),
+        ("post", "/districts/{district_id}/inventory", main.update_district_inventory_async),
+        ("post", "/requests/{request_id}/resolve", main.resolve_request_async),
+        (
+            "post",
+            "/districts/{source_district_id}/transfer/{target_district_id}",
+            main.transfer_inventory_async,
+        ),
+    ]:
+        getattr(test_app, method)(path)(endpoint)
+    test_app.dependency_overrides[database.get_async_db] = get_session
+
+    district_index.invalidate()
+    with TestClient(test_app) as client:
+        yield client
+    district_index.invalidate()
+
+
+def test_handlers_run_on_async_session(async_client):
+    response = async_client.post(
+        "/submit-request",
+        json={"type": "water", "subtype": "bottled", "latitude": 36.3, "longitude": 36.2,
+              "quantity": 2, "tckn": None, "notes": None},
+    )
+    assert response.status_code == 200
+    assert response.json()["relatedDistrict"] == 1
+
+    response = async_client.post("/districts/1/inventory", json={"water - bottled": 3})
+    assert response.json()["inventory"] == {"water - bottled": 3}
+    response = async_client.post("/districts/1/inventory", json={"tent": -1})
+    assert response.status_code == 400
+
+    districts = async_client.get("/districts").json()
+    assert districts[0]["request_count"] == 1
+    assert districts[0]["inventory"] == {"water - bottled": 3}
+
+    assert async_client.post("/requests/1/resolve").json()["inventory"] == {
+        "water - bottled": 1
+    }
+    response = async_client.get("/requests", params={"fields": "id,status"})
+    assert response.json() == [{"id": 1, "status": "resolved"}]
+    response = async_client.post("/districts/1/transfer/2", json={"water - bottled": 1})
+    assert response.json()["target_inventory"] == {"water - bottled": 1}
+    assert async_client.post("/districts/1/transfer/3", json={}).status_code == 404
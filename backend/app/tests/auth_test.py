@@ -0,0 +1,144 @@
+import threading
+
+import pytest
+
+from app import auth, crud, models, passwords
+from app.cache import TTLCache
+from app.passwords import BoundedExecutor, PasswordHasherBusy, make_context
+
+
+@pytest.fixture
+def fast_hashing(monkeypatch):
+    monkeypatch.setattr(passwords, "pwd_context", make_context(4))
+    monkeypatch.setattr(auth, "revocation_store", auth.MemoryRevocationStore())
+    crud.user_cache.clear()
+    auth.claims_cache.clear()
+    yield
+    crud.user_cache.clear()
+    auth.claims_cache.clear()
+
+
+def register(api_client, username="volunteer", password="secret"):
+    response = api_client.post(
+        "/register",
+        params={"key": "FIELDVOLUNTEER67890"},
+        json={"username": username, "password": password},
+    )
+    assert response.status_code == 200
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    now[0] = 10.5
+    assert cache.get("a") is None and len(cache) == 1
+
+
+def test_login_caches_user_and_registration_invalidates(api_client, fast_hashing):
+    register(api_client)
+    response = api_client.post("/login", json={"username": "volunteer", "password": "secret"})
+    assert response.status_code == 200
+    assert response.json()["role"] == "field_volunteer"
+    assert crud.user_cache.get("volunteer").role == "field_volunteer"
+
+    response = api_client.post("/login", json={"username": "volunteer", "password": "nope"})
+    assert response.status_code == 401
+
+    crud.user_cache.set("someone", crud.UserRecord(0, "someone", "x", "stale"))
+    register(api_client, username="someone")
+    assert crud.user_cache.get("someone") is None
+
+
+def test_login_rehashes_when_cost_changes(
+    api_client, sqlite_session_factory, fast_hashing, monkeypatch
+):
+    register(api_client)
+    monkeypatch.setattr(passwords, "pwd_context", make_context(5))
+
+    response = api_client.post("/login", json={"username": "volunteer", "password": "secret"})
+    assert response.status_code == 200
+    db = sqlite_session_factory()
+    stored = db.query(models.User).filter_by(username="volunteer").one().password
+    db.close()
+    assert stored.startswith("$2b$05$")
+    assert crud.user_cache.get("volunteer") is None
+
+
+def test_bounded_executor_rejects_when_full():
+    executor = BoundedExecutor(workers=1, max_pending=0)
+    release = threading.Event()
+    future = executor.submit(release.wait)
+    with pytest.raises(PasswordHasherBusy):
+        executor.submit(lambda: None)
+    release.set()
+    future.result()
+    assert executor.submit(lambda: 42).result() == 42
+
+
+def login(api_client, username="volunteer", password="secret"):
+    response = api_client.post("/login", json={"username": username, "password": password})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+def test_logout_revokes_token(api_client, fast_hashing):
+    register(api_client)
+    headers = login(api_client)
+    response = api_client.get("/user-info", headers=headers)
+    assert response.json() == {"username": "volunteer", "role": "field_volunteer"}
+
+    assert api_client.post("/logout", headers=headers).status_code == 200
+    response = api_client.get("/user-info", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token invalidated"
+    assert api_client.get("/user-info", headers={"Authorization": "Bearer x"}).status_code == 401
+
+
+def test_claims_are_cached_per_token(api_client, fast_hashing, monkeypatch):
+    register(api_client)
+    headers = login(api_client)
+    calls = []
+    decode = auth.jwt.decode
+    monkeypatch.setattr(
+        auth.jwt, "decode", lambda *args, **kwargs: calls.append(1) or decode(*args, **kwargs)
+    )
+    for _ in range(3):
+        assert api_client.get("/user-info", headers=headers).status_code == 200
+    assert len(calls) == 1
+
+
+def test_revocations_expire_with_the_token(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(auth.time, "time", lambda: now[0])
+    store = auth.MemoryRevocationStore()
+    store._entries = TTLCache(clock=lambda: now[0])
+    store.revoke("a", expires_at=1060.0)
+    store.revoke("already-expired", expires_at=999.0)
+    assert store.is_revoked("a") and not store.is_revoked("already-expired")
+    now[0] = 1061.0
+    assert not store.is_revoked("a") and len(store._entries) == 0
+
+
+class FakeRedis:
+    def __init__(self):
+        self.keys = {}
+
+    def set(self, key, value, ex):
+        self.keys[key] = ex
+
+    def exists(self, key):
+        return int(key in self.keys)
+
+
+def test_redis_store_shares_revocations_between_workers():
+    client = FakeRedis()
+    worker_a = auth.RedisRevocationStore(client)
+    worker_b = auth.RedisRevocationStore(client)
+    worker_a.revoke("token", expires_at=auth.time.time() + 60)
+    assert worker_b.is_revoked("token")
+    assert 0 < client.keys["revoked-token:token"] <= 61
@@ -5,3 +5,46 @@ import os
 
 # Add the app directory to the PYTHONPATH
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base, get_db
+from app.main import app
+from app.spatial import district_distances, district_index
+from app.utils import wait_for_district_distances
+
+
+@pytest.fixture
+def sqlite_session_factory():
+    """In-memory SQLite stand-in for the Postgres database."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    district_index.invalidate()
+    district_distances.clear()
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    wait_for_district_distances()
+    district_index.invalidate()
+    district_distances.clear()
+    engine.dispose()
+
+
+@pytest.fixture
+def api_client(sqlite_session_factory):
+    """TestClient whose get_db dependency uses the SQLite stand-in."""
+
+    def override_get_db():
+        db = sqlite_session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db, None)
@@ -0,0 +1,69 @@
+import json
+
+from app import crud, models
+from app.spatial import district_index
+from app.utils import load_districts_from_file, parse_district_file
+
+
+def write_json(path, districts):
+    path.write_text(json.dumps(districts), encoding="utf-8")
+    return str(path)
+
+
+def test_loader_inserts_once_and_skips_unchanged_file(sqlite_session_factory, tmp_path):
+    districts = [
+        {"name": "Fatih,Istanbul", "latitude": 41.0165, "longitude": 28.9497},
+        {"name": "Kadikoy,Istanbul", "latitude": 40.981, "longitude": 29.0888},
+        {"name": "Fatih,Istanbul", "latitude": 0.0, "longitude": 0.0},
+    ]
+    path = write_json(tmp_path / "districts.json", districts)
+    db = sqlite_session_factory()
+
+    assert load_districts_from_file(db, path) == {"skipped": False, "inserted": 2, "districts": 2}
+    assert load_districts_from_file(db, path)["skipped"]
+    assert district_index.nearest(41.0, 28.95) == 1
+
+    # A changed file only adds the new names; existing rows are left alone
+    districts.append({"name": "Antakya,Hatay", "latitude": 36.2, "longitude": 36.16})
+    write_json(tmp_path / "districts.json", districts)
+    assert load_districts_from_file(db, path)["inserted"] == 1
+
+    rows = db.query(models.District).order_by(models.District.id).all()
+    assert [(d.name, d.latitude) for d in rows] == [
+        ("Fatih,Istanbul", 41.0165),
+        ("Kadikoy,Istanbul", 40.981),
+        ("Antakya,Hatay", 36.2),
+    ]
+    assert all(d.inventory is None for d in rows)
+    crud.migrate_legacy_inventory(db)
+    assert crud.get_inventories(db) == {}
+    db.close()
+
+
+def test_parse_geojson_and_csv():
+    geojson = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {"name": "Point"},
+                "geometry": {"type": "Point", "coordinates": [29.0, 41.0]},
+            },
+            {
+                "type": "Feature",
+                "properties": {"name": "Square"},
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [[[30, 40], [32, 40], [32, 42], [30, 42], [30, 40]]],
+                },
+            },
+        ],
+    }
+    assert parse_district_file("d.geojson", json.dumps(geojson).encode()) == [
+        {"name": "Point", "latitude": 41.0, "longitude": 29.0},
+        {"name": "Square", "latitude": 41.0, "longitude": 31.0},
+    ]
+    csv_content = b"name,lat,lon\nMalatya,38.35,38.31\n"
+    assert parse_district_file("d.csv", csv_content) == [
+        {"name": "Malatya", "latitude": 38.35, "longitude": 38.31}
+    ]
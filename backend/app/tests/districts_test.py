@@ -0,0 +1,177 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, utils
+from app.database import Base, get_db
+from app.main import app
+from app.spatial import district_distances, district_index
+from app.utils import refresh_district_distances, wait_for_district_distances
+
+
+def seed(session_factory, districts=5):
+    db = session_factory()
+    for i in range(districts):
+        db.add(models.District(name=f"D{i}", latitude=37 + i, longitude=36 + i, inventory={}))
+    db.commit()
+    db.add_all(
+        [
+            models.Request(type="water", subtype="bottled", priority=3, latitude=37,
+                           longitude=36, quantity=1, status="pending", relatedDistrict=1),
+            models.Request(type="food", subtype="rice", priority=1, latitude=37,
+                           longitude=36, quantity=1, status="resolved", relatedDistrict=1),
+            models.Request(type="food", subtype="rice", priority=1, latitude=38,
+                           longitude=37, quantity=1, status="pending", relatedDistrict=2),
+        ]
+    )
+    db.commit()
+    db.close()
+
+
+def count_queries(session_factory):
+    statements = []
+    event.listen(
+        session_factory.kw["bind"],
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    return statements
+
+
+def test_districts_request_counts_use_constant_queries(api_client, sqlite_session_factory):
+    seed(sqlite_session_factory, districts=5)
+    statements = count_queries(sqlite_session_factory)
+
+    response = api_client.get("/districts", params={"include_status": True})
+
+    assert response.status_code == 200
+    by_id = {district["id"]: district for district in response.json()}
+    assert by_id[1]["request_count"] == 2
+    assert by_id[1]["status_counts"] == {"pending": 1, "resolved": 1}
+    assert by_id[2]["request_count"] == 1
+    assert by_id[3]["request_count"] == 0
+    # fingerprint, districts, inventories, grouped counts, archive counters
+    assert len(statements) == 5
+
+
+def test_district_by_id_omits_status_counts_by_default(api_client, sqlite_session_factory):
+    seed(sqlite_session_factory, districts=2)
+    body = api_client.get("/districts/1").json()
+    assert body["request_count"] == 2
+    assert body["status_counts"] is None
+
+
+def test_districts_etag_revalidation(api_client, sqlite_session_factory):
+    seed(sqlite_session_factory, districts=2)
+    first = api_client.get("/districts")
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "no-cache"
+
+    statements = count_queries(sqlite_session_factory)
+    response = api_client.get("/districts", headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.content == b""
+    assert len(statements) == 1  # only the fingerprint
+
+    # A stock change and a new request each produce a new ETag
+    api_client.post("/districts/1/inventory", json={"water - bottled": 5})
+    after_inventory = api_client.get("/districts", headers={"If-None-Match": etag})
+    assert after_inventory.status_code == 200
+    assert after_inventory.headers["etag"] != etag
+
+    single = api_client.get("/districts/2")
+    api_client.post("/submit-request", json={
+        "type": "food", "subtype": "rice", "latitude": 38, "longitude": 37, "quantity": 1,
+    })
+    response = api_client.get("/districts/2", headers={"If-None-Match": single.headers["etag"]})
+    assert response.status_code == 200
+    assert response.json()["request_count"] == 2
+
+
+def test_districts_response_cache_is_invalidated_by_inventory_writes(
+    api_client, sqlite_session_factory, monkeypatch
+):
+    monkeypatch.setattr(crud, "DISTRICTS_RESPONSE_CACHE", True)
+    crud.district_response_cache.clear()
+    seed(sqlite_session_factory, districts=2)
+    api_client.get("/districts")
+    assert crud.district_response_cache.get(False) is not None
+
+    api_client.post("/districts/1/inventory", json={"water - bottled": 5})
+    assert crud.district_response_cache.get(False) is None
+    body = api_client.get("/districts").json()
+    assert body[0]["inventory"] == {"water - bottled": 5}
+    crud.district_response_cache.clear()
+
+
+def test_static_files_are_cacheable(api_client):
+    response = api_client.get("/static/districts.json")
+    assert response.headers["cache-control"].startswith("public, max-age=")
+    revalidated = api_client.get(
+        "/static/districts.json", headers={"If-None-Match": response.headers["etag"]}
+    )
+    assert revalidated.status_code == 304
+
+
+@pytest.fixture
+def file_api_client(tmp_path):
+    """
+    TestClient over a SQLite file: the distance table sync thread then reads
+    over its own connection instead of sharing the in-memory one.
+    """
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'districts.db'}", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    district_distances.clear()
+    app.dependency_overrides[get_db] = override_get_db
+    yield TestClient(app), session_factory
+    app.dependency_overrides.pop(get_db, None)
+    wait_for_district_distances()
+    district_index.invalidate()
+    district_distances.clear()
+    engine.dispose()
+
+
+def test_district_neighbors(file_api_client, monkeypatch):
+    api_client, session_factory = file_api_client
+    seed(session_factory)
+    # The table is built in the background; until then the endpoint asks to retry
+    with monkeypatch.context() as patch:
+        patch.setattr(utils, "refresh_district_distances", lambda bind: None)
+        response = api_client.get("/districts/3/neighbors", params={"k": 2})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    refresh_district_distances(session_factory.kw["bind"]).join()
+    response = api_client.get("/districts/3/neighbors", params={"k": 2})
+    assert response.status_code == 200
+    assert sorted(n["id"] for n in response.json()) == [2, 4]
+    assert 100 < response.json()[0]["distance_km"] < 150
+
+    # A new district shows up once committed and synced in the background
+    db = session_factory()
+    db.add(models.District(name="D3b", latitude=39.01, longitude=38.01, inventory={}))
+    db.commit()
+    db.close()
+    wait_for_district_distances()
+    assert not district_distances.stale
+    assert api_client.get("/districts/3/neighbors", params={"k": 1}).json()[0]["id"] == 6
+    assert api_client.get("/districts/99/neighbors").status_code == 404
+
+
+def test_district_neighbors_of_the_only_district(file_api_client):
+    api_client, session_factory = file_api_client
+    seed(session_factory, districts=1)
+    refresh_district_distances(session_factory.kw["bind"]).join()
+    response = api_client.get("/districts/1/neighbors", params={"k": 5})
+    assert response.status_code == 200
+    assert response.json() == []
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import threading
+
+from app import events, main, models
+from app.events import Broker, RedisBus, Subscriber, make_event
+
+
+def test_broker_filters_and_resyncs_slow_subscribers():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        broker = Broker()
+        district_one = Subscriber(loop, district_id=1)
+        inventory_only = Subscriber(loop, types={"inventory.changed"}, maxsize=2)
+        broker.subscribe(district_one)
+        broker.subscribe(inventory_only)
+
+        broker.dispatch(make_event("request.created", {"id": 1}, [1]))
+        broker.dispatch(make_event("request.created", {"id": 2}, [2]))
+        for quantity in range(3):
+            broker.dispatch(make_event("inventory.changed", {"quantity": quantity}, [2]))
+        await asyncio.sleep(0)
+
+        assert [e["data"]["id"] for e in drain(district_one.queue)] == [1]
+        # Three events into a queue of two: the backlog is replaced by "resync"
+        assert [e["type"] for e in drain(inventory_only.queue)] == ["resync"]
+
+    asyncio.run(scenario())
+
+
+def test_redis_bus_flush_waits_for_publication():
+    published, release = [], threading.Event()
+
+    class SlowRedis:
+        def publish(self, channel, message):
+            release.wait()
+            published.append(json.loads(message)["type"])
+
+    bus = RedisBus()
+    bus._client = SlowRedis()
+    bus.publish(make_event("request.created", {"id": 1}))
+    # Taken off the queue but not published yet
+    bus.flush(timeout=0.05)
+    assert published == []
+    release.set()
+    bus.flush()
+    assert published == ["request.created"]
+
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def test_event_stream_sends_server_sent_events():
+    async def scenario():
+        response = await main.event_stream(district_id=3, types=None)
+        assert response.media_type == "text/event-stream"
+        body = response.body_iterator
+        assert (await body.__anext__()).startswith("event: ready\n")
+
+        events.publish("inventory.changed", {"district_id": 4}, [4])
+        events.publish("inventory.changed", {"district_id": 3}, [3])
+        chunk = await asyncio.wait_for(body.__anext__(), timeout=1)
+        assert chunk.startswith("event: inventory.changed\n")
+        assert json.loads(chunk.split("data: ", 1)[1])["data"] == {"district_id": 3}
+        await body.aclose()
+        assert not events.broker.subscribers
+
+    asyncio.run(scenario())
+
+
+def test_handlers_publish_after_commit(api_client, sqlite_session_factory, monkeypatch):
+    db = sqlite_session_factory()
+    db.add(models.District(name="D", latitude=37, longitude=36, inventory={}))
+    db.commit()
+    db.close()
+    published = []
+    monkeypatch.setattr(
+        events, "publish", lambda kind, data, districts=(): published.append((kind, data))
+    )
+
+    api_client.post("/districts/1/inventory", json={"water - bottled": 5})
+    created = api_client.post("/submit-request", json={
+        "type": "water", "subtype": "bottled", "latitude": 37, "longitude": 36, "quantity": 2,
+    }).json()
+    api_client.post(f"/requests/{created['id']}/resolve")
+
+    assert [kind for kind, _ in published] == [
+        "inventory.changed",
+        "request.created",
+        "request.resolved",
+        "inventory.changed",
+    ]
+    assert published[-1][1] == {"district_id": 1, "inventory": {"water - bottled": 3}}
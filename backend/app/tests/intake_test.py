@@ -0,0 +1,91 @@
+import json
+
+from app import intake, models
+from app.intake import IntakeWriter, MemoryIntakeQueue, RedisIntakeQueue
+from app.tests.requests_test import request_payload, seed_districts
+
+
+def test_queued_submission_is_stored_once(api_client, sqlite_session_factory, monkeypatch):
+    districts = seed_districts(sqlite_session_factory)
+    queue = MemoryIntakeQueue()
+    monkeypatch.setattr(intake, "intake_queue", queue)
+    # Writes are driven by the test instead of the background writer thread
+    monkeypatch.setattr(intake, "_writer_started", True)
+
+    payload = request_payload(latitude=38.3, longitude=38.2)
+    response = api_client.post("/submit-request", json=payload)
+    assert response.status_code == 202
+    intake_id = response.json()["intake_id"]
+    assert api_client.get(f"/intake/{intake_id}").json()["status"] == "queued"
+    assert api_client.post("/submit-request", json={"type": "water"}).status_code == 422
+
+    writer = IntakeWriter(queue, sqlite_session_factory, batch_ms=1)
+    messages = writer.collect(idle_ms=10)
+    writer.process(messages)
+    # A redelivered entry (e.g. the writer died before acknowledging) is skipped
+    writer.process(messages)
+
+    status = api_client.get(f"/intake/{intake_id}").json()
+    assert status["status"] == "stored"
+    assert status["relatedDistrict"] == districts[2].id
+    db = sqlite_session_factory()
+    assert db.query(models.Request).filter_by(intake_id=intake_id).count() == 1
+    db.close()
+    assert api_client.get("/intake/unknown").status_code == 404
+
+
+def test_writer_parks_entries_that_fail_alone(sqlite_session_factory):
+    seed_districts(sqlite_session_factory)
+    queue = MemoryIntakeQueue()
+    good = intake.make_entry(request_payload())
+    bad = intake.make_entry(request_payload(type=None))  # violates NOT NULL
+    queue.enqueue(good)
+    queue.enqueue(bad)
+
+    writer = IntakeWriter(queue, sqlite_session_factory, batch_ms=1)
+    writer.process(writer.collect(idle_ms=10))
+
+    assert queue.status(good["intake_id"]) is None
+    assert queue.status(bad["intake_id"]) == "failed"
+
+
+class FakeStream:
+    """The consumer group commands of a Redis stream, with entries pending for one writer."""
+
+    def __init__(self, entries):
+        self.pending = [
+            (f"{i + 1}-0".encode(), {b"entry": json.dumps(entry).encode()} if entry else None)
+            for i, entry in enumerate(entries)
+        ]
+
+    def xgroup_create(self, *args, **kwargs):
+        pass
+
+    def xreadgroup(self, group, consumer, streams, count, block=None):
+        (stream, start), = streams.items()
+        if start == ">":
+            return []
+        start = start.decode() if isinstance(start, bytes) else start
+        after = tuple(int(part) for part in start.split("-"))
+        entries = [
+            (message_id, fields)
+            for message_id, fields in self.pending
+            if tuple(int(part) for part in message_id.decode().split("-")) > after
+        ]
+        return [(stream, entries[:count])] if entries else []
+
+    def xautoclaim(self, *args, **kwargs):
+        return (b"0-0", [], [])
+
+
+def test_redis_queue_recovers_each_pending_entry_once():
+    entries = [intake.make_entry(request_payload()) for _ in range(5)]
+    # The third was deleted while pending
+    queue = RedisIntakeQueue(FakeStream(entries[:2] + [None] + entries[3:]), consumer="w")
+    writer = IntakeWriter(queue, batch_size=10, batch_ms=50)
+    batch = writer.collect(idle_ms=10)
+    assert [message_id for message_id, _ in batch] == [b"1-0", b"2-0", b"4-0", b"5-0"]
+    assert writer.collect(idle_ms=10) == []
+
+    queue.release(batch)
+    assert len(writer.collect(idle_ms=10)) == 4
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+from app import crud, models
+
+
+def seed(session_factory):
+    db = session_factory()
+    db.add_all(
+        [
+            models.District(name="Antakya", latitude=36.2, longitude=36.16, inventory={}),
+            models.District(name="Malatya", latitude=38.35, longitude=38.31,
+                            inventory={"water - bottled": 4}),
+        ]
+    )
+    db.commit()
+    crud.migrate_legacy_inventory(db)
+    db.close()
+
+
+def test_legacy_inventory_is_migrated(sqlite_session_factory):
+    seed(sqlite_session_factory)
+    db = sqlite_session_factory()
+    assert crud.get_inventories(db) == {2: {"water - bottled": 4}}
+    assert db.query(models.District).get(2).inventory is None
+    crud.migrate_legacy_inventory(db)
+    assert crud.get_inventories(db) == {2: {"water - bottled": 4}}
+    db.close()
+
+
+def test_inventory_update_is_all_or_nothing(api_client, sqlite_session_factory):
+    seed(sqlite_session_factory)
+    url = "/districts/1/inventory"
+    response = api_client.post(url, json={"tent": 5, "water - bottled": 3})
+    assert response.json()["inventory"] == {"tent": 5, "water - bottled": 3}
+
+    response = api_client.post(url, json={"tent": 2, "water - bottled": -4})
+    assert response.status_code == 400
+    assert "Current: 3, Attempted: -4" in response.json()["detail"]
+
+    response = api_client.post(url, json={"tent": -5})
+    assert response.json()["inventory"] == {"water - bottled": 3}
+    assert api_client.post("/districts/99/inventory", json={"tent": 1}).status_code == 404
+
+
+def test_resolve_and_transfer(api_client, sqlite_session_factory):
+    seed(sqlite_session_factory)
+    db = sqlite_session_factory()
+    db.add(models.Request(type="water", subtype="bottled", priority=3, latitude=38.3,
+                          longitude=38.3, quantity=3, status="pending", relatedDistrict=2))
+    db.commit()
+    db.close()
+
+    response = api_client.post("/requests/1/resolve")
+    assert response.status_code == 200
+    assert response.json()["inventory"] == {"water - bottled": 1}
+    assert api_client.post("/requests/1/resolve").status_code == 400
+
+    response = api_client.post("/districts/2/transfer/1", json={"water - bottled": 2})
+    assert response.status_code == 400
+    assert "Available: 1" in response.json()["detail"]
+
+    response = api_client.post("/districts/2/transfer/1", json={"water - bottled": 1})
+    assert response.json()["source_inventory"] == {}
+    assert response.json()["target_inventory"] == {"water - bottled": 1}
+    assert api_client.post("/districts/2/transfer/7", json={}).status_code == 404
+
+
+def test_resolve_pending_allocates_by_priority(api_client, sqlite_session_factory):
+    seed(sqlite_session_factory)
+    db = sqlite_session_factory()
+    now = datetime.utcnow()
+    rows = [
+        # (type, subtype, quantity, age in hours)
+        ("water", "bottled", 3, 0),   # 1: newest water, does not fit what is left
+        ("water", "bottled", 2, 5),   # 2: oldest water, served first
+        ("water", "bottled", 1, 1),   # 3: served second
+        ("food", "rice", 1, 9),       # 4: no stock for this key
+    ]
+    for request_type, subtype, quantity, hours in rows:
+        db.add(models.Request(type=request_type, subtype=subtype, priority=1,
+                              latitude=38.3, longitude=38.3, quantity=quantity,
+                              status="pending", relatedDistrict=2,
+                              timestamp=now - timedelta(hours=hours)))
+    db.add(models.Request(type="water", subtype="bottled", priority=1, latitude=38.3,
+                          longitude=38.3, quantity=1, status="resolved", relatedDistrict=2,
+                          timestamp=now))
+    db.commit()
+    db.close()
+
+    body = api_client.post("/districts/2/resolve-pending").json()
+    assert sorted(body["resolved"]) == [2, 3]
+    assert body["allocated"] == {"water - bottled": 3}
+    assert body["unfulfilled"] == 1
+    assert body["inventory"] == {"water - bottled": 1}
+
+    db = sqlite_session_factory()
+    statuses = dict(db.query(models.Request.id, models.Request.status))
+    assert statuses == {1: "pending", 2: "resolved", 3: "resolved", 4: "pending", 5: "resolved"}
+    assert crud.get_inventories(db) == {2: {"water - bottled": 1}}
+    db.close()
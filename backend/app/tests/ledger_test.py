@@ -0,0 +1,132 @@
+import time
+from datetime import datetime, timedelta
+
+from jose import jwt
+
+from sqlalchemy import select
+
+from app import crud, ledger, models
+from app.auth import ALGORITHM, SECRET_KEY
+from app.tests.requests_test import request_payload, seed_districts
+
+
+def test_inventory_writes_are_recorded(api_client, sqlite_session_factory):
+    seed_districts(sqlite_session_factory)
+    token = jwt.encode(
+        {"sub": "coordinator", "role": "admin", "exp": time.time() + 60}, SECRET_KEY, ALGORITHM
+    )
+    api_client.post("/submit-request", json=request_payload(quantity=2))
+    api_client.post(
+        "/districts/2/inventory",
+        json={"water - bottled": 5, "tent": 2},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    api_client.post("/districts/2/transfer/1", json={"tent": 1})
+    api_client.post("/requests/1/resolve")
+
+    body = api_client.get("/districts/2/inventory/movements").json()
+    assert [(m["item"], m["delta"], m["reason"]) for m in body] == [
+        ("water - bottled", -2, "request"),
+        ("tent", -1, "transfer"),
+        ("water - bottled", 5, "adjustment"),
+        ("tent", 2, "adjustment"),
+    ]
+    assert body[0]["request_id"] == 1
+    assert [m["username"] for m in body[2:]] == ["coordinator", "coordinator"]
+    target = api_client.get("/districts/1/inventory/movements").json()
+    assert target[0]["transfer_id"] == body[1]["transfer_id"]
+    older = api_client.get("/districts/2/inventory/movements", params={"before_id": body[1]["id"]})
+    assert [m["id"] for m in older.json()] == [m["id"] for m in body[2:]]
+
+    history = api_client.get("/districts/2/inventory/history").json()
+    db = sqlite_session_factory()
+    assert history["inventory"] == crud.get_inventories(db, [2])[2]
+    db.close()
+    assert api_client.get("/districts/9/inventory/history").status_code == 404
+
+
+def test_stock_at_combines_snapshots_and_replay(api_client, sqlite_session_factory):
+    seed_districts(sqlite_session_factory)
+    t0 = datetime(2024, 2, 6, 4, 17)
+    t1, t2 = t0 + timedelta(hours=6), t0 + timedelta(hours=30)
+    db = sqlite_session_factory()
+    ledger.record(db, [ledger.movement(1, "water", 10, "adjustment")], created_at=t0)
+    ledger.record(db, [ledger.movement(1, "water", -3, "request", 7)], created_at=t1)
+    db.commit()
+    report = ledger.snapshot(db, now=t1 + timedelta(minutes=1), lag_seconds=30)
+    assert (report["full"], report["items"]) == (True, 1)
+    ledger.record(db, [ledger.movement(1, "water", 5, "transfer")], created_at=t2)
+    ledger.record(db, [ledger.movement(1, "tent", 1, "adjustment")], created_at=t2)
+    db.commit()
+    # Nothing new is old enough yet
+    assert ledger.snapshot(db, now=t2, lag_seconds=30)["items"] == 0
+
+    assert ledger.stock_at(db, 1, t0 - timedelta(seconds=1)) == {}
+    assert ledger.stock_at(db, 1, t0) == {"water": 10}
+    assert ledger.stock_at(db, 1, t1) == {"water": 7}
+    assert ledger.stock_at(db, 1, t2) == {"tent": 1, "water": 12}
+    later = t2 + timedelta(minutes=1)
+    report = ledger.snapshot(db, now=later, lag_seconds=30, full_every_hours=48)
+    assert (report["full"], report["items"]) == (False, 2)
+    assert ledger.stock_at(db, 1, t2) == {"tent": 1, "water": 12}
+    assert ledger.stock_at(db, 1, t1) == {"water": 7}
+    ledger.record(db, [ledger.movement(1, "tent", -1, "request", 8)], created_at=later)
+    db.commit()
+    # The tent ran out: the full snapshot has only the water
+    report = ledger.snapshot(db, now=later + timedelta(minutes=1), lag_seconds=30)
+    assert (report["full"], report["items"]) == (True, 1)
+    assert ledger.stock_at(db, 1, later) == {"water": 12}
+    assert ledger.stock_at(db, 1, t2) == {"tent": 1, "water": 12}
+    db.close()
+
+    response = api_client.get(
+        "/districts/1/inventory/consumption",
+        params={"since": t0.isoformat(), "until": (t0 + timedelta(days=2)).isoformat()},
+    )
+    water = response.json()["items"]["water"]
+    assert water["net"] == {"adjustment": 10, "request": -3, "transfer": 5}
+    assert water["consumed"] == 3 and water["consumed_per_day"] == 1.5
+
+
+def add_water(db, quantity, created_at):
+    ledger.record(db, [ledger.movement(1, "water", quantity, "adjustment")], created_at=created_at)
+
+
+def test_stock_at_with_ids_and_timestamps_out_of_order(sqlite_session_factory):
+    seed_districts(sqlite_session_factory)
+    t = datetime(2024, 2, 6, 4, 17)
+    db = sqlite_session_factory()
+    # Concurrent transactions: later ids with earlier timestamps
+    add_water(db, 5, t + timedelta(seconds=2))
+    add_water(db, 3, t + timedelta(seconds=1))
+    add_water(db, 1, t + timedelta(seconds=30))
+    add_water(db, 2, t + timedelta(seconds=11))
+    db.commit()
+    # The first movement too recent ends the snapshot, though a later id is
+    # old enough
+    assert ledger.snapshot(db, now=t + timedelta(seconds=10), lag_seconds=0)["movement_id"] == 2
+    assert ledger.stock_at(db, 1, t + timedelta(seconds=1)) == {"water": 3}
+    assert ledger.stock_at(db, 1, t + timedelta(seconds=2)) == {"water": 8}
+    assert ledger.stock_at(db, 1, t + timedelta(seconds=20)) == {"water": 10}
+    assert ledger.stock_at(db, 1) == {"water": 11}
+
+    assert ledger.snapshot(db, now=t + timedelta(seconds=40), lag_seconds=0)["movement_id"] == 4
+    assert ledger.stock_at(db, 1, t + timedelta(seconds=20)) == {"water": 10}
+    assert ledger.stock_at(db, 1) == {"water": 11}
+    db.close()
+
+
+def test_movements_are_stamped_by_the_database_clock(sqlite_session_factory):
+    seed_districts(sqlite_session_factory)
+    db = sqlite_session_factory()
+    before = datetime.utcnow() - timedelta(seconds=1)
+    ledger.record(db, [ledger.movement(1, "water", 5, "adjustment")])
+    db.commit()
+    (created_at,) = db.execute(select(models.InventoryMovement.created_at)).one()
+    assert before <= created_at <= datetime.utcnow() + timedelta(seconds=1)
+    assert ledger.snapshot(db, lag_seconds=0)["movement_id"] == 1
+    ledger.record(db, [ledger.movement(1, "water", 1, "adjustment")])
+    db.commit()
+    assert ledger.stock_at(db, 1) == {"water": 6}
+    assert ledger.stock_at(db, 1, datetime.utcnow() + timedelta(seconds=1)) == {"water": 6}
+    db.close()
@@ -0,0 +1,75 @@
+from app import models
+from app.planner import plan_transfers
+
+
+def seed(session_factory):
+    db = session_factory()
+    db.add_all(
+        [
+            models.District(name="A", latitude=37.0, longitude=36.0),
+            models.District(name="B", latitude=38.0, longitude=36.0),
+            models.District(name="C", latitude=37.1, longitude=36.0),
+            models.District(name="D", latitude=37.9, longitude=36.0),
+        ]
+    )
+    db.add_all(
+        [
+            models.InventoryItem(district_id=1, item="water - bottled", quantity=10),
+            models.InventoryItem(district_id=2, item="water - bottled", quantity=7),
+            models.InventoryItem(district_id=3, item="food - canned", quantity=3),
+        ]
+    )
+    for district_id, subtype, quantity in [
+        (2, "bottled", 2),  # B keeps two bottles for itself
+        (3, "bottled", 8),
+        (4, "bottled", 4),
+        (4, "bottled", 2),
+        (4, "canned", 1),  # "food" below
+        (4, "tent", 5),
+    ]:
+        request_type = {"canned": "food", "tent": "shelter"}.get(subtype, "water")
+        db.add(
+            models.Request(
+                type=request_type, subtype=subtype, priority=1, latitude=0, longitude=0,
+                quantity=quantity, status="pending", relatedDistrict=district_id,
+            )
+        )
+    db.add(
+        models.Request(
+            type="water", subtype="bottled", priority=1, latitude=0, longitude=0,
+            quantity=50, status="resolved", relatedDistrict=3,
+        )
+    )
+    db.commit()
+    db.close()
+
+
+def test_plan_covers_demand_from_nearest_surplus(sqlite_session_factory):
+    seed(sqlite_session_factory)
+    db = sqlite_session_factory()
+    plan = plan_transfers(db)
+    db.close()
+
+    moves = {(m["source"], m["target"]): m["items"] for m in plan["transfers"]}
+    # C takes 8 from A next door; D takes B's 5 spare bottles and 1 more from A
+    assert moves == {
+        (1, 3): {"water - bottled": 8},
+        (1, 4): {"water - bottled": 1},
+        (2, 4): {"water - bottled": 5},
+        (3, 4): {"food - canned": 1},
+    }
+    summary = plan["summary"]
+    assert summary["shipped"] == 15
+    assert summary["unmet"] == {"shelter - tent": 5}
+
+
+def test_plan_endpoint_filters_items_and_distance(api_client, sqlite_session_factory):
+    seed(sqlite_session_factory)
+    response = api_client.get(
+        "/transfers/plan", params={"items": "water - bottled", "max_km": 50}
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert [(m["source"], m["target"]) for m in body["transfers"]] == [(1, 3), (2, 4)]
+    assert body["summary"]["unmet"] == {"water - bottled": 1}
+    assert 10 < body["transfers"][0]["distance_km"] < 12
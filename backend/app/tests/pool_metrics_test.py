@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import create_engine, exc
+
+from app import database
+from app.database import (
+    POOL_CHECKOUT_SECONDS,
+    POOL_TIMEOUTS,
+    POOL_WAIT_SECONDS,
+    InstrumentedQueuePool,
+    engine_options,
+)
+from app.metrics import Registry
+
+
+def test_pool_records_checkouts_and_timeouts(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    checkouts = POOL_CHECKOUT_SECONDS.count(pool="sync")
+    timeouts = POOL_TIMEOUTS.value(pool="sync")
+    waits = POOL_WAIT_SECONDS.count(pool="sync")
+
+    held = engine.connect()
+    assert engine.pool.checkedout() == 1
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    held.close()
+    engine.connect().close()
+
+    assert POOL_CHECKOUT_SECONDS.count(pool="sync") == checkouts + 2
+    assert POOL_TIMEOUTS.value(pool="sync") == timeouts + 1
+    assert POOL_WAIT_SECONDS.count(pool="sync") == waits + 1
+    # The label survives the pool being recreated by dispose()
+    engine.dispose()
+    assert isinstance(engine.pool, InstrumentedQueuePool)
+
+
+def test_engine_options_from_environment(monkeypatch):
+    monkeypatch.setattr(database, "DB_POOL_SIZE", 20)
+    monkeypatch.setattr(database, "DB_STATEMENT_TIMEOUT_MS", 5000)
+    url = "postgresql://admin:password@db/disaster_db"
+
+    options = engine_options(url)
+    assert options["pool_size"] == 20
+    assert options["connect_args"] == {"options": "-c statement_timeout=5000"}
+
+    monkeypatch.setattr(database, "DB_PGBOUNCER", True)
+    assert engine_options(url)["connect_args"] == {}
+    assert engine_options("postgresql+asyncpg://db/x", asyncio=True)["connect_args"] == {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+    }
+    assert "poolclass" not in engine_options("sqlite://")
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, route="/x")
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/x",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/x",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/x"} 3' in lines
+
+
+def test_metrics_endpoint(api_client):
+    response = api_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE db_pool_checkout_seconds histogram" in response.text
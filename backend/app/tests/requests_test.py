@@ -0,0 +1,250 @@
+import csv
+import io
+import json
+import random
+from datetime import datetime, timedelta
+
+from geopy.distance import distance
+
+from app import crud, main, models
+from app.utils import dedup_candidate_keys, dedup_key, find_closest_district_linear
+
+
+def seed_districts(session_factory):
+    db = session_factory()
+    db.add_all(
+        [
+            models.District(name="Antakya", latitude=36.2, longitude=36.16, inventory={}),
+            models.District(name="Kahramanmaras", latitude=37.58, longitude=36.93, inventory={}),
+            models.District(name="Malatya", latitude=38.35, longitude=38.31, inventory={}),
+        ]
+    )
+    db.commit()
+    districts = db.query(models.District).order_by(models.District.id).all()
+    db.close()
+    return districts
+
+
+def request_payload(**overrides):
+    payload = {
+        "type": "water",
+        "subtype": "bottled",
+        "latitude": 37.0,
+        "longitude": 36.5,
+        "quantity": 4,
+        "tckn": None,
+        "notes": None,
+    }
+    payload.update(overrides)
+    return payload
+
+
+def test_submit_request_assigns_closest_district(api_client, sqlite_session_factory):
+    districts = seed_districts(sqlite_session_factory)
+    response = api_client.post("/submit-request", json=request_payload())
+    assert response.status_code == 200
+    body = response.json()
+    assert body["priority"] == 3
+    assert body["relatedDistrict"] == find_closest_district_linear(37.0, 36.5, districts).id
+
+
+def test_batch_submit_reports_per_item_errors(api_client, sqlite_session_factory):
+    districts = seed_districts(sqlite_session_factory)
+    payload = [
+        request_payload(latitude=36.3, longitude=36.2),
+        {"type": "food"},
+        request_payload(type="food", latitude=38.2, longitude=38.0),
+    ]
+    response = api_client.post("/submit-requests/batch", json=payload)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["created"] == 2 and body["failed"] == 1
+    first, invalid, last = body["results"]
+    assert invalid["index"] == 1 and invalid["error"] and invalid["id"] is None
+    assert first["relatedDistrict"] == find_closest_district_linear(36.3, 36.2, districts).id
+    assert last["relatedDistrict"] == find_closest_district_linear(38.2, 38.0, districts).id
+
+    db = sqlite_session_factory()
+    stored = db.query(models.Request).order_by(models.Request.id).all()
+    assert [(r.id, r.priority) for r in stored] == [(first["id"], 3), (last["id"], 1)]
+    db.close()
+
+
+def test_bulk_create_requests_fills_in_ids_across_chunks(sqlite_session_factory, monkeypatch):
+    seed_districts(sqlite_session_factory)
+    monkeypatch.setattr(crud, "REQUEST_INSERT_CHUNK", 2)
+    db = sqlite_session_factory()
+    rows = crud.bulk_create_requests(
+        db,
+        [
+            {"type": "water", "subtype": "bottled", "priority": 3, "latitude": 37.0,
+             "longitude": 36.0, "quantity": quantity, "status": "pending",
+             "relatedDistrict": 1}
+            for quantity in range(1, 6)
+        ],
+    )
+    stored = db.query(models.Request.id, models.Request.quantity).order_by(models.Request.id)
+    assert [(row["id"], row["quantity"]) for row in rows] == [tuple(r) for r in stored]
+    db.close()
+
+
+def seed_requests(session_factory, count):
+    db = session_factory()
+    for i in range(count):
+        db.add(
+            models.Request(
+                type="water" if i % 2 else "food",
+                subtype="generic",
+                priority=i % 4,
+                latitude=37.0,
+                longitude=36.0,
+                quantity=1,
+                tckn="12345678901",
+                notes=f"note {i}",
+                status="pending" if i % 3 else "resolved",
+                relatedDistrict=1,
+            )
+        )
+    db.commit()
+    db.close()
+
+
+def collect_pages(api_client, url, **params):
+    pages, cursor = [], None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        response = api_client.get(url, params=query)
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+
+
+def test_requests_keyset_pagination_by_id(api_client, sqlite_session_factory):
+    seed_districts(sqlite_session_factory)
+    seed_requests(sqlite_session_factory, 25)
+    pages = collect_pages(api_client, "/requests", limit=10)
+    assert [len(page) for page in pages] == [10, 10, 5]
+    ids = [row["id"] for page in pages for row in page]
+    assert ids == list(range(1, 26))
+
+
+def test_requests_priority_order_filters_and_projection(api_client, sqlite_session_factory):
+    seed_districts(sqlite_session_factory)
+    seed_requests(sqlite_session_factory, 30)
+    pages = collect_pages(
+        api_client,
+        "/districts/1/requests",
+        sort="priority",
+        status="pending",
+        min_priority=1,
+        fields="id,priority,timestamp",
+        limit=4,
+    )
+    rows = [row for page in pages for row in page]
+    assert all(set(row) == {"id", "priority", "timestamp"} for row in rows)
+    keys = [(-row["priority"], row["timestamp"], row["id"]) for row in rows]
+    assert keys == sorted(keys)
+    expected = [i + 1 for i in range(30) if i % 3 and i % 4 >= 1]
+    assert sorted(row["id"] for row in rows) == expected
+
+
+def test_requests_rejects_unknown_fields_and_bad_cursor(api_client, sqlite_session_factory):
+    assert api_client.get("/requests", params={"fields": "id,password"}).status_code == 400
+    assert api_client.get("/requests", params={"cursor": "not-a-cursor"}).status_code == 400
+    # Right number of values, wrong types
+    for sort, values in [
+        ("id", ["x"]),
+        ("id", [True]),
+        ("priority", ["x", {}, 1]),
+        ("priority", [1, 2, 3]),
+        ("priority", [1, "2024-01-01T00:00:00", "3"]),
+    ]:
+        response = api_client.get(
+            "/requests", params={"sort": sort, "cursor": crud.encode_cursor(values)}
+        )
+        assert response.status_code == 400
+    cursor = crud.encode_cursor([1, datetime(2024, 1, 1), 3])
+    response = api_client.get("/requests", params={"sort": "priority", "cursor": cursor})
+    assert response.status_code == 200
+
+
+def test_export_streams_ndjson_and_csv(api_client, sqlite_session_factory):
+    seed_districts(sqlite_session_factory)
+    seed_requests(sqlite_session_factory, 2500)
+
+    response = api_client.get("/requests/export", params={"status": "resolved"})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in lines] == [i + 1 for i in range(2500) if i % 3 == 0]
+    assert lines[0]["tckn"] == "12345678901"
+
+    response = api_client.get(
+        "/requests/export", params={"format": "csv", "fields": "id,type", "type": "water"}
+    )
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["id", "type"]
+    assert len(rows) == 1251 and rows[1] == ["2", "water"]
+
+
+def test_urgent_requests_report_effective_priority(api_client, sqlite_session_factory):
+    seed_districts(sqlite_session_factory)
+    db = sqlite_session_factory()
+    db.add(
+        models.Request(type="water", subtype="bottled", priority=3, latitude=37.0,
+                       longitude=36.0, quantity=1, status="pending",
+                       timestamp=datetime.utcnow() - timedelta(hours=2, minutes=5))
+    )
+    db.commit()
+    db.close()
+    body = api_client.get("/requests/urgent", params={"limit": 5}).json()
+    assert [row["priority"] for row in body] == [3 + 2**2]
+
+
+def test_repeated_submissions_are_merged_or_linked(
+    api_client, sqlite_session_factory, monkeypatch
+):
+    seed_districts(sqlite_session_factory)
+    payload = request_payload(tckn="111", quantity=4)
+    first = api_client.post("/submit-request", json=payload).json()
+    # ~200 m away, larger quantity: folded into the original
+    again = api_client.post(
+        "/submit-request", json=request_payload(tckn="111", quantity=6, latitude=37.0018)
+    ).json()
+    assert again["id"] == first["id"] and again["quantity"] == 6
+    # Elsewhere, or another subtype: a separate need
+    far = api_client.post("/submit-request", json=request_payload(tckn="111", latitude=37.02))
+    other = api_client.post("/submit-request", json=request_payload(tckn="111", subtype="tank"))
+    assert len({first["id"], far.json()["id"], other.json()["id"]}) == 3
+
+    monkeypatch.setattr(main, "DEDUP_MODE", "link")
+    linked = api_client.post("/submit-request", json=request_payload(tckn="111")).json()
+    assert linked["status"] == "duplicate" and linked["duplicate_of"] == first["id"]
+
+
+def test_dedup_candidate_keys_cover_the_radius():
+    rng = random.Random(3)
+    for _ in range(2000):
+        lat, lon = rng.uniform(-70, 70), rng.uniform(-179, 179)
+        other = distance(meters=rng.uniform(0, 500)).destination(
+            (lat, lon), bearing=rng.uniform(0, 360)
+        )
+        keys = dedup_candidate_keys("1", "water", "bottled", lat, lon, radius_m=500)
+        assert dedup_key("1", "water", "bottled", other.latitude, other.longitude, 500) in keys
+
+
+def test_dedup_candidate_keys_cover_the_radius_north_of_a_row():
+    for lat in (0, 20, 37, 60):
+        # Walk north to the last point of a grid row
+        start = lat
+        row = dedup_key("1", "water", "bottled", lat, 36, radius_m=500).split(":")[1]
+        for meters in range(1, 2000):
+            point = distance(meters=meters).destination((start, 36), bearing=0)
+            if dedup_key("1", "water", "bottled", point.latitude, 36, 500).split(":")[1] != row:
+                break
+            lat = point.latitude
+        keys = dedup_candidate_keys("1", "water", "bottled", lat, 36, radius_m=500)
+        for bearing in (0, 45, 315):
+            other = distance(meters=499.5).destination((lat, 36), bearing=bearing)
+            assert dedup_key("1", "water", "bottled", other.latitude, other.longitude, 500) in keys
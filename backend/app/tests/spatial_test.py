@@ -0,0 +1,149 @@
+import json
+import random
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.spatial import DistanceTable, DistrictIndex
+from app.utils import find_closest_district_linear
+
+
+def make_districts(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        SimpleNamespace(
+            id=i + 1,
+            latitude=rng.uniform(36.0, 42.0),
+            longitude=rng.uniform(26.0, 45.0),
+        )
+        for i in range(count)
+    ]
+
+
+def build_index(districts):
+    index = DistrictIndex()
+    index.build([(d.id, d.latitude, d.longitude) for d in districts])
+    return index
+
+
+def test_index_matches_linear_scan():
+    districts = make_districts(200)
+    index = build_index(districts)
+    rng = random.Random(1)
+    for _ in range(100):
+        lat, lon = rng.uniform(35.0, 43.0), rng.uniform(25.0, 46.0)
+        expected = find_closest_district_linear(lat, lon, districts)
+        assert index.nearest(lat, lon) == expected.id
+
+
+def test_index_matches_linear_scan_on_real_districts():
+    with open("app/static/districts.json", encoding="utf-8") as file:
+        districts = [
+            SimpleNamespace(id=i + 1, **row) for i, row in enumerate(json.load(file))
+        ]
+    index = build_index(districts)
+    for district in districts:
+        expected = find_closest_district_linear(
+            district.latitude + 0.01, district.longitude - 0.01, districts
+        )
+        assert (
+            index.nearest(district.latitude + 0.01, district.longitude - 0.01)
+            == expected.id
+        )
+
+
+def test_index_breaks_ties_by_lowest_id():
+    districts = [
+        SimpleNamespace(id=7, latitude=41.0, longitude=29.0),
+        SimpleNamespace(id=3, latitude=41.0, longitude=29.0),
+    ]
+    assert build_index(districts).nearest(40.0, 29.0) == 3
+
+
+def test_nearest_k_is_sorted_and_empty_index_returns_none():
+    index = build_index(make_districts(50))
+    result = index.nearest_k(39.0, 35.0, k=5)
+    assert len(result) == 5
+    assert [km for _, km in result] == sorted(km for _, km in result)
+    assert DistrictIndex().nearest(39.0, 35.0) is None
+
+
+def test_nearest_many_matches_single_lookups():
+    index = build_index(make_districts(300))
+    rng = random.Random(2)
+    points = [(rng.uniform(35.0, 43.0), rng.uniform(25.0, 46.0)) for _ in range(200)]
+    lats, lons = zip(*points)
+    expected = [index.nearest(lat, lon) for lat, lon in points]
+    assert index.nearest_many(lats, lons, max_cells=3000) == expected
+
+
+def brute_force_neighbors(districts, district_id, k):
+    index = build_index([d for d in districts if d.id != district_id])
+    district = next(d for d in districts if d.id == district_id)
+    return [i for i, _ in index.nearest_k(district.latitude, district.longitude, k=k)]
+
+
+def test_distance_table_neighbors_and_pairs():
+    districts = make_districts(300)
+    table = DistanceTable(neighbors=8)
+    table.sync([(d.id, d.latitude, d.longitude) for d in districts])
+    for district_id in (1, 150, 300):
+        neighbors = table.neighbors_of(district_id, 5)
+        assert [i for i, _ in neighbors] == brute_force_neighbors(districts, district_id, 5)
+        # Beyond the stored neighbours the KD-tree is queried
+        assert [i for i, _ in table.neighbors_of(district_id, 20)][:5] == [i for i, _ in neighbors]
+        assert table.distance(district_id, neighbors[0][0]) == pytest.approx(neighbors[0][1])
+    with pytest.raises(KeyError):
+        table.neighbors_of(999, 5)
+
+
+def test_distance_table_with_a_single_district():
+    table = DistanceTable(neighbors=8)
+    table.sync([(1, 39.0, 35.0)])
+    assert table.neighbors_of(1, 1) == []
+    assert table.neighbors_of(1, 20) == []
+
+
+def test_distance_table_stays_stale_when_invalidated_during_sync():
+    table = DistanceTable(neighbors=8)
+    generation = table.generation
+    table.invalidate()
+    table.sync([(1, 39.0, 35.0), (2, 40.0, 36.0)], generation)
+    assert table.ready and table.stale
+
+
+def test_distance_table_is_saved_and_extended(tmp_path):
+    districts = make_districts(300)
+    rows = [(d.id, d.latitude, d.longitude) for d in districts]
+    DistanceTable(str(tmp_path), neighbors=8).sync(rows[:280])
+
+    # A new process loads the saved table and merges in the new districts
+    table = DistanceTable(str(tmp_path), neighbors=8)
+    table.sync(rows)
+    rebuilt = DistanceTable(neighbors=8)
+    rebuilt.sync(rows)
+    for district_id in range(1, 301, 7):
+        assert table.neighbors_of(district_id, 8) == pytest.approx(
+            rebuilt.neighbors_of(district_id, 8)
+        )
+    assert len(list(tmp_path.glob("*.npy"))) == len(DistanceTable.FILES)
+
+
+def test_distance_table_concurrent_saves_keep_a_loadable_table(tmp_path):
+    districts = make_districts(50)
+    table = DistanceTable(neighbors=8)
+    table.sync([(d.id, d.latitude, d.longitude) for d in districts])
+    arrays = table._snapshot[:5]
+
+    def save():
+        for _ in range(10):
+            DistanceTable(str(tmp_path), neighbors=8)._save(arrays)
+
+    threads = [threading.Thread(target=save) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert DistanceTable(str(tmp_path), neighbors=8)._load() is not None
+    assert len(list(tmp_path.glob("*.npy"))) == len(DistanceTable.FILES)
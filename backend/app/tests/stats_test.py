@@ -0,0 +1,57 @@
+from app import models, stats
+from app.tests.requests_test import request_payload, seed_districts
+
+
+def test_stats_follow_writes(api_client, sqlite_session_factory):
+    seed_districts(sqlite_session_factory)
+    api_client.post("/submit-request", json=request_payload(quantity=2))
+    api_client.post(
+        "/submit-requests/batch",
+        json=[
+            request_payload(latitude=36.3, longitude=36.2),
+            request_payload(type="food", subtype="canned", latitude=38.2, longitude=38.0),
+        ],
+    )
+    api_client.post("/districts/2/inventory", json={"water - bottled": 5, "tent": 1})
+    api_client.post("/districts/2/transfer/1", json={"tent": 1})
+    assert api_client.post("/requests/1/resolve").status_code == 200
+    # A failed resolve changes nothing
+    assert api_client.post("/requests/2/resolve").status_code == 400
+
+    body = api_client.get("/stats", params={"by_district": True}).json()
+    assert body["requests"] == {"pending": 2, "resolved": 1}
+    assert body["pending"] == 2
+    assert body["pending_by_type"] == {"water": 1, "food": 1}
+    assert body["pending_by_district"] == {"1": 1, "3": 1}
+    assert body["inventory"] == {"water - bottled": 3, "tent": 1}
+    assert body["oldest_pending_age_seconds"] >= 0
+    assert api_client.get("/stats").json()["pending_by_district"] is None
+
+    db = sqlite_session_factory()
+    assert stats.reconcile(db)["corrections"] == {}
+    db.close()
+
+
+def test_reconcile_corrects_counters(sqlite_session_factory):
+    seed_districts(sqlite_session_factory)
+    db = sqlite_session_factory()
+    # Written without going through the counters
+    db.add(
+        models.Request(type="water", subtype="bottled", priority=3, latitude=0, longitude=0,
+                       quantity=1, status="pending", relatedDistrict=1)
+    )
+    db.add(models.InventoryItem(district_id=1, item="tent", quantity=4))
+    db.commit()
+    stats.inventory_changed(db, {"tent": 1, "blanket": 2})
+    db.commit()
+
+    report = stats.reconcile(db)
+    assert report["corrections"] == {
+        "inventory": {"blanket": -2, "tent": 3},
+        "pending_district": {"1": 1},
+        "pending_type": {"water": 1},
+        "requests": {"pending": 1},
+    }
+    assert stats.summary(db)["inventory"] == {"tent": 4}
+    assert stats.reconcile(db)["corrections"] == {}
+    db.close()
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+from app import models
+from app.tasks import MAX_PRIORITY, escalate_priorities, escalated_priority
+from app.utils import default_priority
+
+NOW = datetime(2023, 2, 6, 12, 0, 0)
+TYPES = ["water", "food", "shelter", "clothes", "hygiene", "medical"]
+AGES = [
+    timedelta(0),
+    timedelta(minutes=59, seconds=59),
+    timedelta(hours=1),
+    timedelta(hours=3, minutes=30),
+    timedelta(hours=30),
+    timedelta(hours=31),
+    timedelta(days=10),
+    timedelta(hours=-2),  # clock skew: timestamp slightly in the future
+]
+
+
+def seed(session_factory):
+    db = session_factory()
+    for request_type in TYPES:
+        for age in AGES:
+            db.add(
+                models.Request(type=request_type, subtype="x",
+                               priority=default_priority(request_type), latitude=37,
+                               longitude=36, quantity=1, status="pending",
+                               timestamp=NOW - age)
+            )
+    db.add(
+        models.Request(type="water", subtype="x", priority=1, latitude=37, longitude=36,
+                       quantity=1, status="resolved", timestamp=NOW - timedelta(hours=5))
+    )
+    db.commit()
+    db.close()
+
+
+def test_escalation_matches_python_curves_and_is_idempotent(sqlite_session_factory):
+    seed(sqlite_session_factory)
+    db = sqlite_session_factory()
+
+    report = escalate_priorities(db, now=NOW)
+    rows = db.query(models.Request).filter_by(status="pending").all()
+    for row in rows:
+        hours = (NOW - row.timestamp).total_seconds() // 3600
+        assert row.priority == escalated_priority(row.type, hours), (row.type, hours)
+    assert report["updated"] == sum(
+        1 for row in rows if row.priority != default_priority(row.type)
+    )
+
+    # Running again at the same instant derives the same values and touches nothing
+    assert escalate_priorities(db, now=NOW)["updated"] == 0
+    resolved = db.query(models.Request).filter_by(status="resolved").one()
+    assert resolved.priority == 1
+    db.close()
+
+
+def test_escalated_priority_saturates():
+    assert escalated_priority("water", 2) == 3 + 4
+    assert escalated_priority("food", 3) == 1 + 4
+    assert escalated_priority("water", 500) == MAX_PRIORITY
+    assert escalated_priority("medical", 50) == 2
+
+
+def test_top_pending_requests_orders_by_effective_priority(sqlite_session_factory):
+    from app.crud import top_pending_requests
+
+    seed(sqlite_session_factory)
+    db = sqlite_session_factory()
+    db.add(
+        models.Request(type="blankets", subtype="x", priority=1, latitude=37, longitude=36,
+                       quantity=1, status="pending", timestamp=NOW - timedelta(days=30),
+                       relatedDistrict=None)
+    )
+    db.commit()
+    pending = db.query(models.Request).filter_by(status="pending").all()
+    expected = sorted(
+        pending,
+        key=lambda r: (
+            -escalated_priority(r.type, (NOW - r.timestamp).total_seconds() // 3600),
+            r.timestamp,
+            r.id,
+        ),
+    )
+
+    for limit in (1, 5, len(pending)):
+        top = top_pending_requests(db, limit=limit, now=NOW)
+        assert [request.id for request, _ in top] == [r.id for r in expected[:limit]]
+    assert top_pending_requests(db, limit=5, district_id=99, now=NOW) == []
+    db.close()
@@ -0,0 +1,56 @@
+import fastapi.routing
+import pytest
+from fastapi.testclient import TestClient
+from starlette.responses import JSONResponse
+
+from app import main, models, telemetry
+
+
+@pytest.fixture
+def telemetry_client(api_client, monkeypatch, tmp_path):
+    """The app behind the telemetry middleware, keeping profiles of any duration."""
+    for target, name in (
+        (fastapi.routing, "run_endpoint_function"),
+        (fastapi.routing, "serialize_response"),
+        (JSONResponse, "render"),
+    ):
+        monkeypatch.setattr(target, name, getattr(target, name))
+    telemetry.install_hooks()
+    monkeypatch.setattr(telemetry, "PROFILER", "cprofile")
+    wrapped = telemetry.RequestTelemetryMiddleware(
+        main.app, slow_ms=0, profile_header=True, profile_dir=str(tmp_path)
+    )
+    return TestClient(wrapped)
+
+
+def server_timing(response):
+    return dict(
+        entry.split(";", 1) for entry in response.headers["server-timing"].split(", ")
+    )
+
+
+def test_server_timing_and_route_metrics(telemetry_client, sqlite_session_factory):
+    db = sqlite_session_factory()
+    db.add_all([models.District(name=f"D{i}", latitude=37, longitude=36) for i in range(3)])
+    db.commit()
+    db.close()
+    route = "/requests"
+    before = telemetry.REQUEST_QUERIES.count(method="GET", route=route)
+
+    response = telemetry_client.get("/requests")
+    assert response.status_code == 200
+    timing = server_timing(response)
+    assert set(timing) == {"db", "serialize", "app"}
+    assert timing["db"].endswith('desc="1 queries"')
+
+    assert telemetry.REQUEST_QUERIES.count(method="GET", route=route) == before + 1
+    assert telemetry.REQUESTS.value(method="GET", route=route, status=200) >= 1
+    assert telemetry.REQUEST_SERIALIZE_SECONDS.sum(method="GET", route=route) > 0
+
+
+def test_profiles_are_dumped_for_flagged_requests(telemetry_client, tmp_path):
+    telemetry_client.get("/requests", headers={"X-Profile": "1"})
+    telemetry_client.get("/no-such-route")
+    profiles = [path.name for path in tmp_path.iterdir()]
+    assert len(profiles) == 1
+    assert "-GET-requests-" in profiles[0] and profiles[0].endswith("ms.prof")
@@ -1,8 +1,246 @@
+import csv
+import hashlib
+import io
+import math
+import os
+import threading
+from datetime import datetime
+from fastapi.concurrency import run_in_threadpool
 from geopy.distance import geodesic
-from sqlalchemy.orm import Session
-from app.models import District
+from sqlalchemy import event, func, inspect, null, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+from app.models import DataLoad, District
+from app.spatial import district_distances, district_index
 import json
 
+# Default priorities based on request type
+DEFAULT_PRIORITIES = {"water": 3, "shelter": 2, "food": 1, "medical": 2}
+
+
+def default_priority(request_type: str) -> int:
+    """
+    Returns the initial priority for a request type (1 if the type is unknown).
+    """
+    return DEFAULT_PRIORITIES.get(request_type, 1)
+
+
+# Near-duplicate submissions: same TCKN, type and subtype within
+# DEDUP_RADIUS_M meters and DEDUP_WINDOW_MINUTES of a pending request.
+# "merge" folds them into the original, "link" stores them as "duplicate"
+# rows pointing at it, "off" disables the check.
+DEDUP_MODE = os.getenv("DEDUP_MODE", "merge")
+DEDUP_RADIUS_M = float(os.getenv("DEDUP_RADIUS_M", "500"))
+DEDUP_WINDOW_MINUTES = float(os.getenv("DEDUP_WINDOW_MINUTES", "360"))
+
+# The shortest degree anywhere (of latitude at the equator, WGS84): grid
+# steps sized with it are never shorter than the radius on the ground
+MIN_METERS_PER_DEGREE = 110_574
+
+
+def _dedup_column(row: int, lon: float, step: float) -> int:
+    # Cells are at least `radius` wide: longitude steps are stretched by the
+    # cosine of the row's poleward edge
+    edge = min(max(abs(row * step), abs((row + 1) * step)), 89.0)
+    return math.floor(lon / (step / math.cos(math.radians(edge))))
+
+
+def _dedup_prefix(tckn: str, request_type: str, subtype: str) -> str:
+    # Hashed so the index does not hold another copy of the TCKN
+    return hashlib.sha1(f"{tckn}|{request_type}|{subtype}".encode()).hexdigest()[:24]
+
+
+def dedup_key(tckn, request_type, subtype, lat, lon, radius_m=DEDUP_RADIUS_M):
+    """
+    Index key of a request for duplicate detection: a hash of TCKN, type and
+    subtype plus the grid cell (about `radius_m` wide) holding the location.
+    None for anonymous requests.
+    """
+    if not tckn:
+        return None
+    step = radius_m / MIN_METERS_PER_DEGREE
+    row = math.floor(lat / step)
+    column = _dedup_column(row, lon, step)
+    return f"{_dedup_prefix(tckn, request_type, subtype)}:{row}:{column}"
+
+
+def dedup_candidate_keys(tckn, request_type, subtype, lat, lon, radius_m=DEDUP_RADIUS_M):
+    """
+    Keys of the 3x3 cells around a location; any request within `radius_m`
+    has one of them.
+    """
+    if not tckn:
+        return []
+    prefix = _dedup_prefix(tckn, request_type, subtype)
+    step = radius_m / MIN_METERS_PER_DEGREE
+    center = math.floor(lat / step)
+    keys = []
+    for row in (center - 1, center, center + 1):
+        column = _dedup_column(row, lon, step)
+        keys.extend(f"{prefix}:{row}:{c}" for c in (column - 1, column, column + 1))
+    return keys
+
+
+def rebuild_district_index(db: Session):
+    """
+    Rebuilds the in-memory district spatial index from the districts table.
+
+    Args:
+        db (Session): Database session.
+    """
+    rows = db.query(District.id, District.latitude, District.longitude).all()
+    district_index.build(rows)
+    district_distances.invalidate()
+
+
+def find_closest_district_id(lat: float, lon: float, db: Session):
+    """
+    Finds the id of the closest district using the in-memory spatial index.
+
+    Args:
+        lat (float): Latitude of the point.
+        lon (float): Longitude of the point.
+        db (Session): Database session, only used when the index must be rebuilt.
+
+    Returns:
+        int: The closest district id, or None if there are no districts.
+    """
+    if district_index.stale:
+        rebuild_district_index(db)
+    return district_index.nearest(lat, lon)
+
+
+async def find_closest_district_id_async(lat: float, lon: float, session: AsyncSession):
+    """
+    find_closest_district_id over an AsyncSession. A rebuild of the index
+    reads the districts over `session` and builds the tree in the
+    threadpool, so the event loop is never blocked by it.
+    """
+    if district_index.stale:
+        rows = (
+            await session.execute(select(District.id, District.latitude, District.longitude))
+        ).all()
+        await run_in_threadpool(district_index.build, rows)
+        district_distances.invalidate()
+    return district_index.nearest(lat, lon)
+
+
+def find_closest_district_ids(latitudes, longitudes, db: Session):
+    """
+    Finds the closest district id for a batch of points in one vectorized pass.
+
+    Args:
+        latitudes: Latitudes of the points.
+        longitudes: Longitudes of the points.
+        db (Session): Database session, only used when the index must be rebuilt.
+
+    Returns:
+        List[int]: The closest district id for each point (None if there are no districts).
+    """
+    if district_index.stale:
+        rebuild_district_index(db)
+    return district_index.nearest_many(latitudes, longitudes)
+
+
+class DistanceTableNotReady(Exception):
+    """The distance table is being synced in the background; retry shortly."""
+
+
+_distance_sync_lock = threading.Lock()
+_distance_sync_thread = None
+
+
+def _sync_district_distances(bind):
+    # Sync again if the districts changed while the rows were read
+    try:
+        while district_distances.stale:
+            generation = district_distances.generation
+            with Session(bind=bind) as db:
+                rows = db.query(District.id, District.latitude, District.longitude).all()
+            district_distances.sync(rows, generation)
+    except Exception as error:
+        print(f"District distance table sync failed: {error}")
+
+
+def refresh_district_distances(bind) -> threading.Thread:
+    """
+    Syncs the distance table with the districts in a background thread,
+    unless a sync is already running, so no request waits for a rebuild.
+
+    Args:
+        bind: Engine or connection to read the districts from.
+
+    Returns:
+        threading.Thread: The thread running the sync.
+    """
+    global _distance_sync_thread
+    with _distance_sync_lock:
+        if _distance_sync_thread is None or not _distance_sync_thread.is_alive():
+            _distance_sync_thread = threading.Thread(
+                target=_sync_district_distances,
+                args=(bind,),
+                name="district-distances",
+                daemon=True,
+            )
+            _distance_sync_thread.start()
+        return _distance_sync_thread
+
+
+def wait_for_district_distances(timeout: float = None):
+    """Waits for a running distance table sync to finish."""
+    thread = _distance_sync_thread
+    if thread is not None:
+        thread.join(timeout)
+
+
+def _district_distance_lookup(db: Session, lookup, *args):
+    # Serves the loaded table while a stale one is synced in the background;
+    # an unknown district may be one the sync is adding
+    if district_distances.stale:
+        refresh_district_distances(db.get_bind())
+    if not district_distances.ready:
+        raise DistanceTableNotReady()
+    try:
+        return lookup(*args)
+    except KeyError:
+        if district_distances.stale:
+            raise DistanceTableNotReady() from None
+        raise
+
+
+def district_neighbors(district_id: int, k: int, db: Session):
+    """
+    Finds the nearest districts to a district from the precomputed distance table.
+
+    Args:
+        district_id (int): The district to start from.
+        k (int): Number of neighbours to return.
+        db (Session): Database session, only used to start a sync of the table.
+
+    Returns:
+        List[Tuple[int, float]]: `(district_id, kilometers)` pairs, closest first.
+        Raises KeyError for an unknown district and DistanceTableNotReady
+        until the table is loaded.
+    """
+    return _district_distance_lookup(db, district_distances.neighbors_of, district_id, k)
+
+
+def district_distance(a: int, b: int, db: Session) -> float:
+    """
+    Great-circle distance between two districts in kilometers.
+
+    Args:
+        a (int): First district id.
+        b (int): Second district id.
+        db (Session): Database session, only used to start a sync of the table.
+
+    Returns:
+        float: The distance; raises KeyError for an unknown district and
+        DistanceTableNotReady until the table is loaded.
+    """
+    return _district_distance_lookup(db, district_distances.distance, a, b)
+
 
 def find_closest_district(lat: float, lon: float, db: Session):
     """
@@ -16,7 +254,24 @@ def find_closest_district(lat: float, lon: float, db: Session):
     Returns:
         District: The closest district object.
     """
-    districts = db.query(District).all()
+    district_id = find_closest_district_id(lat, lon, db)
+    if district_id is None:
+        return None
+    return db.query(District).get(district_id)
+
+
+def find_closest_district_linear(lat: float, lon: float, districts):
+    """
+    Reference linear scan over `districts`, kept for verification and benchmarks.
+
+    Args:
+        lat (float): Latitude of the point.
+        lon (float): Longitude of the point.
+        districts: Districts in id order, anything with latitude/longitude.
+
+    Returns:
+        The closest district, or None if `districts` is empty.
+    """
     closest_district = None
     min_distance = float("inf")
 
@@ -31,20 +286,161 @@ def find_closest_district(lat: float, lon: float, db: Session):
     return closest_district
 
 
-def load_districts_from_json(db, file_path):
-    with open(file_path, "r", encoding="utf-8") as file:
-        districts = json.load(file)
-        for district in districts:
-            # Check if the district already exists
-            existing_district = (
-                db.query(District).filter_by(name=district["name"]).first()
+def _district_row(name, latitude, longitude):
+    return {"name": str(name).strip(), "latitude": float(latitude), "longitude": float(longitude)}
+
+
+def _geojson_point(geometry):
+    """A representative point of a GeoJSON geometry: the point itself, or the
+    mean of a polygon's outer ring vertices."""
+    coordinates = geometry["coordinates"]
+    if geometry["type"] == "Point":
+        return coordinates[1], coordinates[0]
+    if geometry["type"] == "MultiPolygon":
+        coordinates = max(coordinates, key=lambda polygon: len(polygon[0]))
+    elif geometry["type"] != "Polygon":
+        raise ValueError(f"Unsupported geometry type: {geometry['type']}")
+    ring = coordinates[0][:-1] or coordinates[0]
+    return (
+        sum(point[1] for point in ring) / len(ring),
+        sum(point[0] for point in ring) / len(ring),
+    )
+
+
+def parse_district_file(file_path: str, content: bytes):
+    """
+    Parses districts from a JSON list of `{name, latitude, longitude}`, a
+    GeoJSON FeatureCollection (name in the feature properties) or a CSV file
+    with name/latitude/longitude columns.
+
+    Returns:
+        List[dict]: `{name, latitude, longitude}` rows, first occurrence of
+        each name kept.
+    """
+    text = content.decode("utf-8-sig")
+    if file_path.lower().endswith(".csv"):
+        rows = [
+            _district_row(
+                row["name"],
+                row.get("latitude", row.get("lat")),
+                row.get("longitude", row.get("lon")),
             )
-            if not existing_district:
-                new_district = District(
-                    name=district["name"],
-                    latitude=district["latitude"],
-                    longitude=district["longitude"],
-                    inventory={},  # Initialize with an empty inventory
-                )
-                db.add(new_district)
+            for row in csv.DictReader(io.StringIO(text))
+        ]
+    else:
+        document = json.loads(text)
+        if isinstance(document, dict) and document.get("type") == "FeatureCollection":
+            rows = [
+                _district_row(feature["properties"]["name"], *_geojson_point(feature["geometry"]))
+                for feature in document["features"]
+            ]
+        else:
+            rows = [
+                _district_row(row["name"], row["latitude"], row["longitude"])
+                for row in document
+            ]
+
+    unique = {}
+    for row in rows:
+        unique.setdefault(row["name"], row)
+    return list(unique.values())
+
+
+# Key of the Postgres advisory lock serializing district loads across workers
+DISTRICT_LOAD_LOCK = 0x64697374
+
+# Rows per executemany batch
+DISTRICT_LOAD_CHUNK = 5000
+
+
+def load_districts_from_file(db: Session, file_path: str, force: bool = False):
+    """
+    Loads districts from a JSON, GeoJSON or CSV file (see parse_district_file).
+
+    Safe to run from every worker at startup: a Postgres advisory lock lets
+    one worker do the work while the others wait, the file's content hash is
+    recorded so an unchanged file is skipped without parsing it, and rows are
+    inserted in bulk with ON CONFLICT (name) DO NOTHING, so existing districts
+    are kept as they are.
+
+    Args:
+        db (Session): Database session; the load commits.
+        file_path (str): Path of the district file.
+        force (bool): Load even if the content hash is unchanged.
+
+    Returns:
+        dict: `skipped` (bool), `inserted` (new districts) and `districts`
+        (rows in the file, None when skipped).
+    """
+    with open(file_path, "rb") as file:
+        content = file.read()
+    content_hash = hashlib.sha256(content).hexdigest()
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        # Held until commit; other workers block here, then see the new hash
+        db.execute(select(func.pg_advisory_xact_lock(DISTRICT_LOAD_LOCK)))
+
+    state = db.query(DataLoad).get("districts")
+    if state is not None and state.content_hash == content_hash and not force:
         db.commit()
+        if district_index.stale:
+            rebuild_district_index(db)
+        return {"skipped": True, "inserted": 0, "districts": None}
+
+    rows = parse_district_file(file_path, content)
+    before = db.query(func.count(District.id)).scalar()
+    # Stock lives in district_inventory; a NULL legacy document means there
+    # is nothing left to migrate for the new rows
+    statement = (
+        (postgresql if dialect == "postgresql" else sqlite)
+        .insert(District.__table__)
+        .values(inventory=null(), version=0)
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    for start in range(0, len(rows), DISTRICT_LOAD_CHUNK):
+        # executemany of one compiled statement (batched by the driver)
+        db.execute(statement, rows[start : start + DISTRICT_LOAD_CHUNK])
+    inserted = db.query(func.count(District.id)).scalar() - before
+
+    if state is None:
+        state = DataLoad(source="districts")
+        db.add(state)
+    state.content_hash = content_hash
+    state.loaded_at = datetime.utcnow()
+    db.commit()
+    rebuild_district_index(db)
+    return {"skipped": False, "inserted": inserted, "districts": len(rows)}
+
+
+def _mark_districts_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info["districts_changed"] = True
+
+
+def _mark_district_moved(mapper, connection, target):
+    # Inventory updates do not affect the spatial index, only coordinate changes
+    state = inspect(target)
+    if (
+        state.attrs.latitude.history.has_changes()
+        or state.attrs.longitude.history.has_changes()
+    ):
+        _mark_districts_changed(mapper, connection, target)
+
+
+event.listen(District, "after_insert", _mark_districts_changed)
+event.listen(District, "after_delete", _mark_districts_changed)
+event.listen(District, "after_update", _mark_district_moved)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_district_index(session):
+    # Rebuild lazily once the change is visible to other sessions
+    if session.info.pop("districts_changed", False):
+        district_index.invalidate()
+        district_distances.invalidate()
+        # Keep a table this process serves up to date in the background
+        bind = session.get_bind()
+        if district_distances.ready and not bind.dialect.is_async:
+            refresh_district_distances(bind)
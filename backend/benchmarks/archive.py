@@ -0,0 +1,129 @@
+"""
+Benchmark of the pending-queue queries on a large requests table, before and
+after moving old resolved requests to requests_archive.
+
+Run from the backend directory (SQLite by default; pass --database-url for
+Postgres):
+    python -m benchmarks.archive --rows 10000000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import crud, models, schemas
+from app.archive import archive_resolved
+from app.tasks import escalate_priorities
+from benchmarks.common import make_session_factory, seed_districts
+
+TYPES = ["water", "food", "shelter", "clothes", "hygiene", "medical"]
+CHUNK = 50_000
+
+
+def seed_requests(session_factory, rows, pending_ratio, districts, seed=0):
+    """
+    `rows` requests over the last 30 days; all but `pending_ratio` of them
+    resolved a few hours after submission.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    db = session_factory()
+    for start in range(0, rows, CHUNK):
+        batch = []
+        for _ in range(min(CHUNK, rows - start)):
+            timestamp = now - timedelta(minutes=rng.randint(0, 30 * 24 * 60))
+            pending = rng.random() < pending_ratio
+            batch.append(
+                {
+                    "type": rng.choice(TYPES),
+                    "subtype": "generic",
+                    "priority": 1,
+                    "latitude": 37.0,
+                    "longitude": 36.0,
+                    "quantity": rng.randint(1, 10),
+                    "timestamp": timestamp,
+                    "status": "pending" if pending else "resolved",
+                    "resolved_at": None if pending else timestamp + timedelta(hours=3),
+                    "relatedDistrict": rng.randint(1, districts),
+                }
+            )
+        db.execute(insert(models.Request), batch)
+        db.commit()
+    db.close()
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def measure(session_factory, district_id, repeat):
+    db = session_factory()
+    pending = schemas.RequestFilters(status="pending", district_id=district_id)
+    results = {
+        "urgent list": median_ms(lambda: crud.top_pending_requests(db, 20), repeat),
+        "district pending page": median_ms(
+            lambda: crud.page_requests(db, pending, "priority", None, 500), repeat
+        ),
+        "district counts": median_ms(
+            lambda: crud.count_requests_by_district(db, district_id), repeat
+        ),
+        "all district counts": median_ms(
+            lambda: crud.count_requests_by_district(db), max(repeat // 5, 1)
+        ),
+        # Every pending row is already escalated, so this is the scan alone
+        "escalate priorities": median_ms(lambda: escalate_priorities(db), max(repeat // 5, 1)),
+    }
+    db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--pending-ratio", type=float, default=0.02)
+    parser.add_argument("--districts", type=int, default=1000)
+    parser.add_argument("--older-than-hours", type=float, default=24)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    session_factory = make_session_factory(args.database_url)
+    seed_districts(session_factory, args.districts)
+    start = time.perf_counter()
+    seed_requests(session_factory, args.rows, args.pending_ratio, args.districts)
+    print(f"Seeded {args.rows} requests in {time.perf_counter() - start:.0f} s")
+
+    db = session_factory()
+    escalate_priorities(db)
+    db.close()
+    before = measure(session_factory, 1, args.repeat)
+
+    db = session_factory()
+    report = archive_resolved(db, older_than_hours=args.older_than_hours)
+    live = db.query(models.Request).count()
+    db.close()
+    print(
+        f"Archived {report['archived']} requests in {report['elapsed_ms'] / 1000:.1f} s "
+        f"({report['archived'] / max(report['elapsed_ms'], 1) * 1000:.0f} rows/s), "
+        f"{live} left in requests"
+    )
+    after = measure(session_factory, 1, args.repeat)
+
+    print(f"{'query':<24} {'before ms':>10} {'after ms':>10} {'speedup':>9}")
+    for name in before:
+        print(
+            f"{name:<24} {before[name]:>10.2f} {after[name]:>10.2f} "
+            f"{before[name] / after[name]:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark of batch request intake: N calls to /submit-request vs one
+/submit-requests/batch call carrying the same N requests.
+
+Run from the backend directory:
+    python -m benchmarks.batch_intake --districts 1000 --batch-sizes 100 500
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import api_client, make_session_factory, random_request, seed_districts
+
+
+def run(client, batch_size, rng):
+    payload = [random_request(rng) for _ in range(batch_size)]
+
+    start = time.perf_counter()
+    for item in payload:
+        assert client.post("/submit-request", json=item).status_code == 200
+    single_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    response = client.post("/submit-requests/batch", json=payload)
+    batch_seconds = time.perf_counter() - start
+    assert response.status_code == 200 and response.json()["created"] == batch_size
+
+    return {
+        "batch_size": batch_size,
+        "single_rps": batch_size / single_seconds,
+        "batch_rps": batch_size / batch_seconds,
+        "speedup": single_seconds / batch_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--districts", type=int, default=1000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 500])
+    args = parser.parse_args()
+
+    session_factory = make_session_factory(args.database_url)
+    seed_districts(session_factory, args.districts)
+    client = api_client(session_factory)
+    rng = random.Random(0)
+
+    print(f"{'batch':>7} {'single req/s':>13} {'batch req/s':>12} {'speedup':>8}")
+    for size in args.batch_sizes:
+        row = run(client, size, rng)
+        print(
+            f"{row['batch_size']:>7} {row['single_rps']:>13.0f} "
+            f"{row['batch_rps']:>12.0f} {row['speedup']:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark of the nearest-district lookup: linear geodesic scan vs spatial index.
+
+Run from the backend directory:
+    python -m benchmarks.closest_district --sizes 20 1000 50000
+"""
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+from app.spatial import DistrictIndex
+from app.utils import find_closest_district_linear
+
+
+def make_districts(count, rng):
+    return [
+        SimpleNamespace(
+            id=i + 1,
+            latitude=rng.uniform(36.0, 42.0),
+            longitude=rng.uniform(26.0, 45.0),
+        )
+        for i in range(count)
+    ]
+
+
+def time_per_call(fn, points):
+    start = time.perf_counter()
+    results = [fn(lat, lon) for lat, lon in points]
+    return (time.perf_counter() - start) / len(points), results
+
+
+def run(size, queries, linear_queries, seed=0):
+    rng = random.Random(seed)
+    districts = make_districts(size, rng)
+    points = [(rng.uniform(36.0, 42.0), rng.uniform(26.0, 45.0)) for _ in range(queries)]
+
+    start = time.perf_counter()
+    index = DistrictIndex()
+    index.build([(d.id, d.latitude, d.longitude) for d in districts])
+    build_seconds = time.perf_counter() - start
+
+    index_seconds, index_results = time_per_call(index.nearest, points)
+
+    # The linear scan costs one geodesic per district, so sample fewer points
+    sample = points[: max(1, min(linear_queries, queries))]
+    linear_seconds, linear_results = time_per_call(
+        lambda lat, lon: find_closest_district_linear(lat, lon, districts).id, sample
+    )
+    assert linear_results == index_results[: len(sample)], "index disagrees with scan"
+
+    return {
+        "districts": size,
+        "build_ms": build_seconds * 1000,
+        "linear_ms_per_query": linear_seconds * 1000,
+        "index_ms_per_query": index_seconds * 1000,
+        "speedup": linear_seconds / index_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 1000, 50000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--linear-queries", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'districts':>10} {'build ms':>10} {'linear ms':>12} {'index ms':>10} {'speedup':>9}")
+    for size in args.sizes:
+        row = run(size, args.queries, args.linear_queries)
+        print(
+            f"{row['districts']:>10} {row['build_ms']:>10.2f} "
+            f"{row['linear_ms_per_query']:>12.3f} {row['index_ms_per_query']:>10.3f} "
+            f"{row['speedup']:>8.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Shared helpers for the benchmarks: a throwaway database and an API client bound to it.
+"""
+import os
+import random
+import tempfile
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.database import Base, get_db
+from app.main import app
+from app.spatial import district_index
+
+
+def make_session_factory(database_url=None):
+    """
+    Creates the schema on `database_url` (a temporary SQLite file by default)
+    and returns a session factory bound to it.
+    """
+    if database_url is None:
+        handle, path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        database_url = f"sqlite:///{path}"
+    connect_args = (
+        {"check_same_thread": False, "timeout": 60} if database_url.startswith("sqlite") else {}
+    )
+    engine = create_engine(database_url, connect_args=connect_args)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    district_index.invalidate()
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def seed_districts(session_factory, count, seed=0):
+    """Inserts `count` districts spread over Turkey."""
+    rng = random.Random(seed)
+    db = session_factory()
+    db.bulk_insert_mappings(
+        models.District,
+        [
+            {
+                "name": f"District {i}",
+                "latitude": rng.uniform(36.0, 42.0),
+                "longitude": rng.uniform(26.0, 45.0),
+                "inventory": {},
+            }
+            for i in range(count)
+        ],
+    )
+    db.commit()
+    db.close()
+    district_index.invalidate()
+
+
+def random_request(rng):
+    return {
+        "type": rng.choice(["water", "food", "shelter", "clothes", "hygiene", "medical"]),
+        "subtype": "generic",
+        "latitude": rng.uniform(36.0, 42.0),
+        "longitude": rng.uniform(26.0, 45.0),
+        "quantity": rng.randint(1, 20),
+        "tckn": None,
+        "notes": None,
+    }
+
+
+def api_client(session_factory):
+    """Returns a TestClient whose get_db dependency uses `session_factory`."""
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app)
@@ -0,0 +1,74 @@
+"""
+Benchmark of the precomputed district distance table: build, incremental
+extension, loading the saved table, and neighbour/pair lookups.
+
+Run from the backend directory:
+    python -m benchmarks.district_distances --sizes 1000 50000
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from app.spatial import DistanceTable
+
+
+def make_rows(count, rng):
+    return [(i + 1, rng.uniform(36.0, 42.0), rng.uniform(26.0, 45.0)) for i in range(count)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def per_call_us(fn, args):
+    start = time.perf_counter()
+    for arg in args:
+        fn(*arg)
+    return (time.perf_counter() - start) / len(args) * 1e6
+
+
+def run(size, queries, added, seed=0):
+    rng = random.Random(seed)
+    rows = make_rows(size, rng)
+    with tempfile.TemporaryDirectory() as directory:
+        base = rows[: size - added]
+        build_ms = timed(lambda: DistanceTable(directory).sync(base))
+        table = DistanceTable(directory)
+        extend_ms = timed(lambda: table.sync(rows))
+        load_ms = timed(lambda: DistanceTable(directory).sync(rows))
+
+        ids = [rng.randint(1, size) for _ in range(queries)]
+        return {
+            "districts": size,
+            "build_ms": build_ms,
+            "extend_ms": extend_ms,
+            "load_ms": load_ms,
+            "neighbors_us": per_call_us(table.neighbors_of, [(i, 10) for i in ids]),
+            "distance_us": per_call_us(table.distance, list(zip(ids, reversed(ids)))),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 50000])
+    parser.add_argument("--queries", type=int, default=10000)
+    parser.add_argument("--added", type=int, default=100, help="districts merged incrementally")
+    args = parser.parse_args()
+
+    print(
+        f"{'districts':>10} {'build ms':>10} {'extend ms':>10} {'load ms':>9} "
+        f"{'neighbors us':>13} {'distance us':>12}"
+    )
+    for size in args.sizes:
+        row = run(size, args.queries, min(args.added, size // 10))
+        print(
+            f"{row['districts']:>10} {row['build_ms']:>10.1f} {row['extend_ms']:>10.1f} "
+            f"{row['load_ms']:>9.1f} {row['neighbors_us']:>13.2f} {row['distance_us']:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
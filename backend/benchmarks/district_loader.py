@@ -0,0 +1,100 @@
+"""
+Benchmark of the startup district load: the previous per-row loader vs the
+bulk, hash-guarded load_districts_from_file.
+
+For each size it measures a cold start (empty table), a warm restart (same
+file, every district already present) and, for the bulk loader, a restart
+after one district was added to the file.
+
+Run from the backend directory:
+    python -m benchmarks.district_loader --sizes 1000 50000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from app.models import District
+from app.utils import load_districts_from_file, rebuild_district_index
+from benchmarks.common import make_session_factory
+
+
+def legacy_load(db, file_path):
+    """The loader before bulk upserts: one SELECT per district, rows added one by one."""
+    with open(file_path, "r", encoding="utf-8") as file:
+        districts = json.load(file)
+        for district in districts:
+            existing_district = db.query(District).filter_by(name=district["name"]).first()
+            if not existing_district:
+                db.add(
+                    District(
+                        name=district["name"],
+                        latitude=district["latitude"],
+                        longitude=district["longitude"],
+                        inventory={},
+                    )
+                )
+        db.commit()
+    rebuild_district_index(db)
+
+
+def write_districts(count, rng):
+    handle, path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(handle, "w", encoding="utf-8") as file:
+        json.dump(
+            [
+                {
+                    "name": f"District {i}",
+                    "latitude": rng.uniform(36.0, 42.0),
+                    "longitude": rng.uniform(26.0, 45.0),
+                }
+                for i in range(count)
+            ],
+            file,
+        )
+    return path
+
+
+def timed(loader, session_factory, path):
+    db = session_factory()
+    start = time.perf_counter()
+    loader(db, path)
+    elapsed = time.perf_counter() - start
+    db.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 50000])
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'districts':>10} {'loader':>8} {'cold s':>9} {'warm s':>9} {'+1 s':>9}")
+    for size in args.sizes:
+        path = write_districts(size, rng)
+        try:
+            session_factory = make_session_factory(args.database_url)
+            cold = timed(legacy_load, session_factory, path)
+            warm = timed(legacy_load, session_factory, path)
+            print(f"{size:>10} {'legacy':>8} {cold:>9.3f} {warm:>9.3f} {'':>9}")
+
+            session_factory = make_session_factory(args.database_url)
+            cold = timed(load_districts_from_file, session_factory, path)
+            warm = timed(load_districts_from_file, session_factory, path)
+            with open(path, "r", encoding="utf-8") as file:
+                districts = json.load(file)
+            districts.append({"name": "Added", "latitude": 39.0, "longitude": 35.0})
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(districts, file)
+            changed = timed(load_districts_from_file, session_factory, path)
+            print(f"{size:>10} {'bulk':>8} {cold:>9.3f} {warm:>9.3f} {changed:>9.3f}")
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark of GET /requests/export against loading every row into memory.
+
+Seeds a SQLite file (or --database-url) with --rows requests, then measures
+each strategy in a fresh process: time to first byte, total time and peak RSS.
+
+Run from the backend directory:
+    python -m benchmarks.export --rows 1000000
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, schemas
+from app.database import Base
+
+
+def seed(database_url, rows, batch=50_000):
+    engine = create_engine(database_url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(0)
+    start = datetime(2023, 2, 6, 4, 17)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(models.District),
+            [{"id": 1, "name": "Antakya", "latitude": 36.2, "longitude": 36.16, "inventory": {}}],
+        )
+        for offset in range(0, rows, batch):
+            conn.execute(
+                insert(models.Request),
+                [
+                    {
+                        "type": rng.choice(["water", "food", "shelter"]),
+                        "subtype": "generic",
+                        "priority": rng.randint(1, 10),
+                        "latitude": 36.2,
+                        "longitude": 36.16,
+                        "quantity": rng.randint(1, 20),
+                        "tckn": "12345678901",
+                        "notes": "Needs help for a family of four",
+                        "timestamp": start + timedelta(seconds=i),
+                        "status": "pending",
+                        "relatedDistrict": 1,
+                    }
+                    for i in range(offset, min(offset + batch, rows))
+                ],
+            )
+    engine.dispose()
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(database_url, strategy):
+    db = sessionmaker(bind=create_engine(database_url))()
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    first_byte = None
+    size = 0
+    if strategy == "stream":
+        for chunk in crud.export_requests(db, schemas.RequestFilters()):
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            size += len(chunk)
+    else:
+        # What GET /requests used to do: every ORM object and model up front
+        rows = db.query(models.Request).all()
+        body = json.dumps(
+            [schemas.RequestResponse.from_orm(row).dict() for row in rows], default=str
+        )
+        first_byte = time.perf_counter() - start
+        size = len(body)
+    total = time.perf_counter() - start
+    print(
+        json.dumps(
+            {
+                "strategy": strategy,
+                "ttfb_ms": first_byte * 1000,
+                "total_s": total,
+                "bytes": size,
+                "peak_rss_mb": peak_rss_mb(),
+                "rss_growth_mb": peak_rss_mb() - baseline,
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--measure", choices=["stream", "list"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.database_url, args.measure)
+        return
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'export_bench.db')}"
+    if not args.skip_seed:
+        seed(database_url, args.rows)
+
+    for strategy in ("stream", "list"):
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.export", "--database-url", database_url,
+             "--measure", strategy],
+            check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
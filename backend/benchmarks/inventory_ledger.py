@@ -0,0 +1,139 @@
+"""
+Benchmark of the inventory ledger: bulk append throughput, snapshotting, and
+point-in-time stock and consumption queries over millions of movements,
+against a full replay of the ledger.
+
+Run from the backend directory (SQLite by default; pass --database-url for
+Postgres):
+    python -m benchmarks.inventory_ledger --movements 2000000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app import ledger, models
+from benchmarks.common import make_session_factory, seed_districts
+
+REASONS = ["adjustment", "request", "request", "request", "transfer"]
+
+
+def append_movements(session_factory, count, districts, items, days, batch, seed=0):
+    """Appends `count` movements spread evenly over `days`; returns rows per second."""
+    rng = random.Random(seed)
+    start_time = datetime.utcnow() - timedelta(days=days)
+    step = timedelta(days=days) / count
+    db = session_factory()
+    start = time.perf_counter()
+    for offset in range(0, count, batch):
+        rows = []
+        for _ in range(min(batch, count - offset)):
+            reason = rng.choice(REASONS)
+            rows.append(
+                {
+                    **ledger.movement(
+                        rng.randint(1, districts),
+                        f"item {rng.randrange(items)}",
+                        -rng.randint(1, 5) if reason == "request" else rng.randint(1, 20),
+                        reason,
+                    ),
+                    "created_at": start_time + step * (offset + len(rows)),
+                }
+            )
+        ledger.record(db, rows)
+        db.commit()
+    elapsed = time.perf_counter() - start
+    db.close()
+    return count / elapsed, start_time
+
+
+def full_replay(db, district_id, at):
+    movement = models.InventoryMovement
+    query = (
+        select(movement.item, func.sum(movement.delta))
+        .where(movement.district_id == district_id, movement.created_at <= at)
+        .group_by(movement.item)
+    )
+    return {item: int(total) for item, total in db.execute(query) if total}
+
+
+def median_ms(fn, args):
+    samples = []
+    for arg in args:
+        start = time.perf_counter()
+        fn(*arg)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--movements", type=int, default=2_000_000)
+    parser.add_argument("--districts", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--snapshot-hours", type=float, default=1)
+    parser.add_argument("--full-snapshot-hours", type=float, default=24)
+    parser.add_argument("--batch", type=int, default=10_000, help="movements per transaction")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    session_factory = make_session_factory(args.database_url)
+    seed_districts(session_factory, args.districts)
+    rate, start_time = append_movements(
+        session_factory, args.movements, args.districts, args.items, args.days, args.batch
+    )
+    print(f"Appended {args.movements} movements: {rate:,.0f} rows/s")
+
+    db = session_factory()
+    start = time.perf_counter()
+    reports = []
+    now = start_time
+    end = datetime.utcnow()
+    while now < end:
+        now += timedelta(hours=args.snapshot_hours)
+        reports.append(
+            ledger.snapshot(
+                db, now=now, lag_seconds=0, full_every_hours=args.full_snapshot_hours
+            )
+        )
+    elapsed = time.perf_counter() - start
+    for full in (True, False):
+        done = [report for report in reports if report["full"] == full]
+        print(
+            f"{len(done)} {'full' if full else 'partial'} snapshots: "
+            f"{statistics.mean(r['items'] for r in done):.0f} rows, "
+            f"{statistics.median(r['elapsed_ms'] for r in done):.1f} ms each (median)"
+        )
+    print(f"Snapshotting took {elapsed:.1f} s in all")
+
+    rng = random.Random(1)
+    span = (end - start_time).total_seconds()
+    points = [
+        (db, rng.randint(1, args.districts), start_time + timedelta(seconds=rng.uniform(0, span)))
+        for _ in range(args.queries)
+    ]
+    for _, district_id, at in points[:20]:
+        assert ledger.stock_at(db, district_id, at) == full_replay(db, district_id, at)
+    windows = [
+        (db, district_id, at - timedelta(days=1), at) for _, district_id, at in points
+    ]
+    results = {
+        "stock at T (snapshots)": median_ms(ledger.stock_at, points),
+        "stock at T (full replay)": median_ms(full_replay, points),
+        "consumption, 1 day": median_ms(ledger.consumption, windows),
+        "movements page": median_ms(
+            lambda db, district_id, at: ledger.movements(db, district_id, limit=100), points
+        ),
+    }
+    db.close()
+    for name, ms in results.items():
+        print(f"{name:<26} {ms:>8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+HTTP load test of the hot endpoints at high concurrency, for comparing the
+sync (threadpool) and async (DB_ASYNC=1) database paths.
+
+Against a running server:
+    python -m benchmarks.load_test --base-url http://localhost:8000 --concurrency 500
+
+Or let the script start uvicorn in both modes (needs DATABASE_URL pointing at Postgres):
+    python -m benchmarks.load_test --compare --concurrency 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def scenarios(district_ids):
+    def submit(rng):
+        return "POST", "/submit-request", {
+            "type": rng.choice(["water", "food", "shelter"]),
+            "subtype": "generic",
+            "latitude": rng.uniform(36.0, 42.0),
+            "longitude": rng.uniform(26.0, 45.0),
+            "quantity": rng.randint(1, 5),
+            "tckn": None,
+            "notes": None,
+        }
+
+    def inventory(rng):
+        return "POST", f"/districts/{rng.choice(district_ids)}/inventory", {
+            "water - bottled": rng.randint(1, 5)
+        }
+
+    return {
+        "submit-request": submit,
+        "list-requests": lambda rng: ("GET", "/requests?limit=50", None),
+        "districts": lambda rng: ("GET", "/districts", None),
+        "district": lambda rng: ("GET", f"/districts/{rng.choice(district_ids)}", None),
+        "inventory": inventory,
+    }
+
+
+async def client_loop(client, deadline, mix, rng, latencies, failures):
+    names = list(mix)
+    while time.perf_counter() < deadline:
+        name = rng.choice(names)
+        method, path, body = mix[name](rng)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body)
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+        latencies.setdefault(name, []).append(time.perf_counter() - start)
+        if not ok:
+            failures[name] = failures.get(name, 0) + 1
+
+
+async def run(base_url, concurrency, duration):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        districts = (await client.get("/districts")).json()
+        mix = scenarios([district["id"] for district in districts] or [1])
+        latencies, failures = {}, {}
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(
+            *[
+                client_loop(client, deadline, mix, random.Random(i), latencies, failures)
+                for i in range(concurrency)
+            ]
+        )
+
+    everything = [value for values in latencies.values() for value in values]
+    return {
+        "concurrency": concurrency,
+        "requests": len(everything),
+        "throughput_rps": len(everything) / duration,
+        "p50_ms": statistics.median(everything) * 1000 if everything else 0.0,
+        "p95_ms": percentile(everything, 0.95) * 1000,
+        "p99_ms": percentile(everything, 0.99) * 1000,
+        "failures": failures,
+        "endpoints": {
+            name: {
+                "requests": len(values),
+                "p50_ms": statistics.median(values) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+            }
+            for name, values in latencies.items()
+        },
+    }
+
+
+def wait_until_ready(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/districts", timeout=5).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("server did not become ready")
+
+
+def compare(args):
+    results = {}
+    for mode, flag in (("sync", "0"), ("async", "1")):
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            env=dict(os.environ, DB_ASYNC=flag),
+        )
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            wait_until_ready(base_url)
+            results[mode] = asyncio.run(run(base_url, args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.compare:
+        results = compare(args)
+    else:
+        results = asyncio.run(run(args.base_url, args.concurrency, args.duration))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark of POST /login under a burst of concurrent logins (a shift change).
+
+Compares the previous handler (uncached user query, bcrypt verify inline in
+the request threadpool) with the current one (user cache, bcrypt on the
+bounded password executor). Reports login latency percentiles and the worst
+event-loop stall seen while the burst runs.
+
+Run from the backend directory:
+    python -m benchmarks.login --concurrency 200 --users 200 --rounds 12
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from sqlalchemy.orm import Session
+
+from app import crud, models, passwords, schemas
+from app.database import get_db
+from app.main import app
+from benchmarks.common import api_client, make_session_factory
+from benchmarks.load_test import percentile
+
+
+# The previous handler gets an app of its own, so the real one is not changed
+legacy_app = FastAPI()
+
+
+@legacy_app.post("/login")
+def legacy_login(user: schemas.UserLogin, db: Session = Depends(get_db)):
+    """The login path before caching: query + synchronous bcrypt per call."""
+    db_user = db.query(models.User).filter(models.User.username == user.username).first()
+    if not db_user or not passwords.pwd_context.verify(user.password, db_user.password):
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    return {"username": db_user.username}
+
+
+def seed_users(session_factory, users):
+    password = passwords.hash_password("secret")
+    db = session_factory()
+    db.bulk_insert_mappings(
+        models.User,
+        [
+            {"username": f"volunteer{i}", "password": password, "role": "field_volunteer"}
+            for i in range(users)
+        ],
+    )
+    db.commit()
+    db.close()
+
+
+async def loop_lag(stop, samples):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        samples.append(time.perf_counter() - start - 0.005)
+
+
+async def burst(target, concurrency, users, rounds):
+    latencies, statuses = [], {}
+    lag, stop = [], asyncio.Event()
+
+    async with httpx.AsyncClient(app=target, base_url="http://bench", timeout=300) as client:
+
+        async def login(i):
+            body = {"username": f"volunteer{i % users}", "password": "secret"}
+            for _ in range(rounds):
+                start = time.perf_counter()
+                response = await client.post("/login", json=body)
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        ticker = asyncio.create_task(loop_lag(stop, lag))
+        start = time.perf_counter()
+        await asyncio.gather(*[login(i) for i in range(concurrency)])
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await ticker
+
+    return {
+        "logins": len(latencies),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_loop_stall_ms": max(lag, default=0.0) * 1000,
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=passwords.BCRYPT_ROUNDS)
+    parser.add_argument("--logins-per-client", type=int, default=2)
+    args = parser.parse_args()
+
+    passwords.pwd_context = passwords.make_context(args.rounds)
+    session_factory = make_session_factory()
+    seed_users(session_factory, args.users)
+    api_client(session_factory)  # binds get_db to the benchmark database
+    legacy_app.dependency_overrides = app.dependency_overrides
+
+    results = {}
+    for name, target in (("legacy", legacy_app), ("current", app)):
+        crud.user_cache.clear()
+        results[name] = asyncio.run(
+            burst(target, args.concurrency, args.users, args.logins_per_client)
+        )
+    print(json.dumps({"rounds": args.rounds, "concurrency": args.concurrency, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark of priority escalation: the old per-row ORM loop vs the set-based
+escalate_priorities() (one UPDATE per request type).
+
+Run from the backend directory:
+    python -m benchmarks.priorities --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import Request
+from app.tasks import PRIORITY_INCREASE, escalate_priorities
+from app.utils import default_priority
+
+TYPES = ["water", "food", "shelter", "clothes", "hygiene", "medical"]
+
+
+def seed(session_factory, rows, now, batch=50_000):
+    engine = session_factory.kw["bind"]
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(0)
+    with engine.begin() as conn:
+        for offset in range(0, rows, batch):
+            values = []
+            for _ in range(offset, min(offset + batch, rows)):
+                request_type = rng.choice(TYPES)
+                values.append(
+                    {
+                        "type": request_type,
+                        "subtype": "generic",
+                        "priority": default_priority(request_type),
+                        "latitude": 37.0,
+                        "longitude": 36.0,
+                        "quantity": 1,
+                        "timestamp": now - timedelta(minutes=rng.randint(0, 24 * 60)),
+                        "status": "pending",
+                    }
+                )
+            conn.execute(insert(Request), values)
+
+
+def legacy_adjust_priorities(db, now):
+    # The implementation this benchmark replaces, kept verbatim for comparison
+    for request in db.query(Request).filter(Request.status == "pending").all():
+        time_passed = (now - request.timestamp).total_seconds() // 3600
+        if request.type in PRIORITY_INCREASE:
+            request.priority += int(PRIORITY_INCREASE[request.type](time_passed))
+            db.add(request)
+    db.commit()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument(
+        "--legacy-max", type=int, default=100_000,
+        help="skip the legacy loop above this many rows",
+    )
+    args = parser.parse_args()
+
+    database_url = args.database_url or (
+        f"sqlite:///{os.path.join(tempfile.gettempdir(), 'priorities_bench.db')}"
+    )
+    session_factory = sessionmaker(bind=create_engine(database_url))
+    now = datetime.utcnow()
+
+    print(f"{'pending':>9} {'legacy s':>9} {'set-based s':>12} {'rows updated':>13}")
+    for size in args.sizes:
+        legacy = "-"
+        if size <= args.legacy_max:
+            seed(session_factory, size, now)
+            db = session_factory()
+            legacy = f"{timed(lambda: legacy_adjust_priorities(db, now)):.2f}"
+            db.close()
+        seed(session_factory, size, now)
+        db = session_factory()
+        report = escalate_priorities(db, now=now)
+        db.close()
+        print(f"{size:>9} {legacy:>9} {report['elapsed_ms'] / 1000:>12.2f} {report['updated']:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark of POST /districts/{id}/resolve-pending with many pending requests
+in one district.
+
+Run from the backend directory:
+    python -m benchmarks.resolve_pending --pending 10000 50000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import crud, models
+from benchmarks.common import api_client, make_session_factory, seed_districts
+
+SUBTYPES = ["bottled", "canned", "blanket", "tent", "soap"]
+
+
+def seed_pending(session_factory, pending, seed=0):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    db = session_factory()
+    db.execute(
+        insert(models.Request),
+        [
+            {
+                "type": rng.choice(["water", "food", "shelter"]),
+                "subtype": rng.choice(SUBTYPES),
+                "priority": 1,
+                "latitude": 37.0,
+                "longitude": 36.0,
+                "quantity": rng.randint(1, 10),
+                "timestamp": now - timedelta(minutes=rng.randint(0, 72 * 60)),
+                "status": "pending",
+                "relatedDistrict": 1,
+            }
+            for _ in range(pending)
+        ],
+    )
+    stock = {
+        f"{request_type} - {subtype}": pending
+        for request_type in ["water", "food", "shelter"]
+        for subtype in SUBTYPES
+    }
+    crud.apply_inventory_changes(db, 1, stock)
+    db.commit()
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--pending", type=int, nargs="+", default=[10_000, 50_000])
+    args = parser.parse_args()
+
+    print(f"{'pending':>8} {'resolved':>9} {'seconds':>8}")
+    for pending in args.pending:
+        session_factory = make_session_factory(args.database_url)
+        seed_districts(session_factory, 1)
+        seed_pending(session_factory, pending)
+        client = api_client(session_factory)
+        start = time.perf_counter()
+        body = client.post("/districts/1/resolve-pending").json()
+        elapsed = time.perf_counter() - start
+        print(f"{pending:>8} {body['resolved_count']:>9} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
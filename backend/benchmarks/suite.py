@@ -0,0 +1,300 @@
+"""
+Benchmark suite covering the API hot paths, with regression checks against a
+stored baseline.
+
+Seeds a database (a temporary SQLite file, or --database-url for a local
+Postgres) with districts, stock and requests, then:
+  * drives /submit-request, /requests, /districts, /districts/{id}/inventory,
+    /requests/{id}/resolve and /districts/{a}/transfer/{b} in-process at the
+    given concurrency, reporting throughput and p50/p95/p99 latency;
+  * counts the SQL statements each call issues (sequential pass);
+  * micro-benchmarks the nearest-district lookup and escalate_priorities.
+
+Run from the backend directory:
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json  # exit 1 on regressions
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import event, insert
+
+from app import models
+from app.main import app
+from app.spatial import DistrictIndex
+from app.tasks import escalate_priorities
+from app.utils import default_priority
+from benchmarks.common import api_client, make_session_factory, random_request, seed_districts
+from benchmarks.load_test import percentile
+
+ITEMS = ["water - bottled", "food - canned", "shelter - tent", "hygiene - soap"]
+
+# Metric name -> True when higher is better
+DIRECTIONS = {
+    "throughput_rps": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "queries_per_call": False,
+    "lookups_per_s": True,
+    "us_per_lookup": False,
+    "elapsed_ms": False,
+}
+
+
+def seed(session_factory, districts, requests, rng):
+    seed_districts(session_factory, districts, seed=rng.randint(0, 2**31))
+    db = session_factory()
+    db.execute(
+        insert(models.InventoryItem),
+        [
+            {"district_id": district_id, "item": item, "quantity": 1_000_000}
+            for district_id in range(1, districts + 1)
+            for item in ITEMS
+        ],
+    )
+    now = datetime.utcnow()
+    rows = []
+    for _ in range(requests):
+        row = random_request(rng)
+        item = rng.choice(ITEMS)
+        row.update(
+            type=item.split(" - ")[0],
+            subtype=item.split(" - ")[1],
+            priority=default_priority(item.split(" - ")[0]),
+            timestamp=now - timedelta(minutes=rng.randint(0, 72 * 60)),
+            status="pending",
+            relatedDistrict=rng.randint(1, districts),
+        )
+        rows.append(row)
+    for start in range(0, len(rows), 50_000):
+        db.execute(insert(models.Request), rows[start : start + 50_000])
+    db.commit()
+    db.close()
+
+
+def scenarios(districts, requests, rng):
+    pending = list(range(1, requests + 1))
+    rng.shuffle(pending)
+
+    def transfer(rng):
+        source, target = rng.sample(range(1, districts + 1), 2)
+        return "POST", f"/districts/{source}/transfer/{target}", {rng.choice(ITEMS): 1}
+
+    return {
+        "submit-request": lambda rng: ("POST", "/submit-request", random_request(rng)),
+        "list-requests": lambda rng: ("GET", "/requests?limit=100", None),
+        "districts": lambda rng: ("GET", "/districts", None),
+        "inventory": lambda rng: (
+            "POST",
+            f"/districts/{rng.randint(1, districts)}/inventory",
+            {rng.choice(ITEMS): rng.randint(1, 5)},
+        ),
+        "resolve": lambda rng: ("POST", f"/requests/{pending.pop()}/resolve", None),
+        "transfer": transfer,
+    }
+
+
+async def drive(make_call, calls, concurrency, seed):
+    latencies, statuses = [], {}
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(app=app, base_url="http://suite", limits=limits) as client:
+        remaining = iter(range(calls))
+
+        async def worker(index):
+            rng = random.Random(seed * 1000 + index)
+            for _ in remaining:
+                method, path, body = make_call(rng)
+                start = time.perf_counter()
+                response = await client.request(method, path, json=body)
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(i) for i in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    return {
+        "calls": len(latencies),
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def count_queries(client, engine, make_call, samples, rng):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        for _ in range(samples):
+            method, path, body = make_call(rng)
+            client.request(method, path, json=body)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return len(statements) / samples
+
+
+def micro_closest_district(session_factory, rng, lookups=2000):
+    db = session_factory()
+    rows = db.query(models.District.id, models.District.latitude, models.District.longitude).all()
+    db.close()
+    index = DistrictIndex()
+    index.build(rows)
+    points = [(rng.uniform(36.0, 42.0), rng.uniform(26.0, 45.0)) for _ in range(lookups)]
+    timings = []
+    for lat, lon in points:
+        start = time.perf_counter()
+        index.nearest(lat, lon)
+        timings.append(time.perf_counter() - start)
+    total = sum(timings)
+    return {
+        "lookups_per_s": lookups / total,
+        "us_per_lookup": total / lookups * 1e6,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+    }
+
+
+def micro_adjust_priorities(session_factory):
+    engine = session_factory.kw["bind"]
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    db = session_factory()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        report = escalate_priorities(db, now=datetime.utcnow() + timedelta(hours=6))
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        db.close()
+    return {
+        "elapsed_ms": report["elapsed_ms"],
+        "updated": report["updated"],
+        "queries_per_call": len(statements),
+    }
+
+
+def run_suite(args):
+    rng = random.Random(args.seed)
+    session_factory = make_session_factory(args.database_url)
+    seed(session_factory, args.districts, args.requests, rng)
+    client = api_client(session_factory)
+    engine = session_factory.kw["bind"]
+
+    calls = scenarios(args.districts, args.requests, rng)
+    endpoints = {}
+    for name in args.scenarios:
+        result = asyncio.run(drive(calls[name], args.calls, args.concurrency, args.seed))
+        result["queries_per_call"] = count_queries(
+            client, engine, calls[name], args.query_samples, random.Random(args.seed)
+        )
+        endpoints[name] = result
+        print(
+            f"{name}: {result['throughput_rps']:.0f} rps, p99 {result['p99_ms']:.1f} ms",
+            file=sys.stderr,
+        )
+
+    return {
+        "meta": {
+            "dialect": engine.dialect.name,
+            "python": platform.python_version(),
+            "districts": args.districts,
+            "requests": args.requests,
+            "calls": args.calls,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "time": datetime.utcnow().isoformat(),
+        },
+        "endpoints": endpoints,
+        "micro": {
+            "closest_district": micro_closest_district(session_factory, rng),
+            "adjust_priorities": micro_adjust_priorities(session_factory),
+        },
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the metrics that got worse than the baseline by more than
+    `tolerance` (a fraction); query counts must not grow at all.
+    """
+    regressions = []
+    for group in ("endpoints", "micro"):
+        for name, metrics in results.get(group, {}).items():
+            reference = baseline.get(group, {}).get(name, {})
+            for metric, value in metrics.items():
+                if metric not in DIRECTIONS or metric not in reference:
+                    continue
+                before = reference[metric]
+                allowed = 0.0 if metric == "queries_per_call" else tolerance
+                if DIRECTIONS[metric]:
+                    worse = value < before * (1 - allowed)
+                else:
+                    worse = value > before * (1 + allowed) + 1e-9
+                if worse:
+                    regressions.append(
+                        {
+                            "benchmark": f"{group}.{name}",
+                            "metric": metric,
+                            "baseline": before,
+                            "current": value,
+                        }
+                    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--districts", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--calls", type=int, default=500, help="calls per endpoint")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--query-samples", type=int, default=5)
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        default=["submit-request", "list-requests", "districts", "inventory", "resolve", "transfer"],
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = run_suite(args)
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            results["regressions"] = compare(results, json.load(file), args.tolerance)
+        exit_code = 1 if results["regressions"] else 0
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
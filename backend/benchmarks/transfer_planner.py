@@ -0,0 +1,108 @@
+"""
+Benchmark of the transfer planner (app.planner.plan_transfers).
+
+Seeds districts, stock and pending requests over `--items` item kinds: each
+district holds a random quantity of an item with probability
+--stock-density and has pending demand for it with --demand-density. Reports
+the planning time and how much of the demand the plan covers.
+
+With --compare-dense it also solves the same instance with every surplus
+district as a candidate (the full cost matrix) to measure what the
+nearest-candidates restriction costs in distance; keep the sizes small then.
+
+Run from the backend directory:
+    python -m benchmarks.transfer_planner --districts 1000 --items 500
+    python -m benchmarks.transfer_planner --districts 200 --items 20 --compare-dense
+"""
+import argparse
+import random
+import time
+
+from sqlalchemy import insert
+
+from app import models
+from app.planner import plan_transfers
+from benchmarks.common import make_session_factory, seed_districts
+
+
+def seed(session_factory, args):
+    rng = random.Random(args.seed)
+    seed_districts(session_factory, args.districts, seed=args.seed)
+    items = [(f"type{i % 10}", f"kind{i}") for i in range(args.items)]
+    stock, demand = [], []
+    for district_id in range(1, args.districts + 1):
+        for request_type, subtype in items:
+            if rng.random() < args.stock_density:
+                stock.append(
+                    {
+                        "district_id": district_id,
+                        "item": f"{request_type} - {subtype}",
+                        "quantity": rng.randint(1, 100),
+                    }
+                )
+            elif rng.random() < args.demand_density / (1 - args.stock_density):
+                demand.append(
+                    {
+                        "type": request_type,
+                        "subtype": subtype,
+                        "priority": 1,
+                        "latitude": 0.0,
+                        "longitude": 0.0,
+                        "quantity": rng.randint(1, 60),
+                        "status": "pending",
+                        "relatedDistrict": district_id,
+                    }
+                )
+    db = session_factory()
+    if stock:
+        db.execute(insert(models.InventoryItem), stock)
+    for start in range(0, len(demand), 50_000):
+        db.execute(insert(models.Request), demand[start : start + 50_000])
+    db.commit()
+    db.close()
+    return len(stock), len(demand)
+
+
+def report(label, plan, elapsed):
+    summary = plan["summary"]
+    print(
+        f"{label:>12} {elapsed:>8.2f} s  {summary['transfers']:>7} moves "
+        f"{summary['shipped']:>9} units  {summary['unit_km']:>14.0f} unit-km  "
+        f"{sum(summary['unmet'].values()):>9} unmet"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--districts", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--stock-density", type=float, default=0.3)
+    parser.add_argument("--demand-density", type=float, default=0.3)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[4, 8])
+    parser.add_argument("--compare-dense", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    session_factory = make_session_factory(args.database_url)
+    stock, demand = seed(session_factory, args)
+    print(
+        f"{args.districts} districts, {args.items} items: "
+        f"{stock} stock rows, {demand} pending demand cells"
+    )
+    db = session_factory()
+    for candidates in args.candidates:
+        start = time.perf_counter()
+        plan = plan_transfers(db, candidates=candidates)
+        report(f"k={candidates}", plan, time.perf_counter() - start)
+    if args.compare_dense:
+        start = time.perf_counter()
+        plan = plan_transfers(db, candidates=args.districts, max_arcs=10**9)
+        report("full matrix", plan, time.perf_counter() - start)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
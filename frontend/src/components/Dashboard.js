@@ -1,7 +1,13 @@
 import React, { useEffect, useState } from "react";
-import axios from "axios";
 import { MapContainer, TileLayer, Marker, Popup } from "react-leaflet";
 import "leaflet/dist/leaflet.css";
+import fetchAllRequests from "../fetchAllRequests";
+
+// Columns shown in the table and the map popups
+const FIELDS = [
+  "id", "type", "subtype", "priority", "tckn", "latitude", "longitude", "notes",
+  "status", "timestamp",
+];
 
 const Dashboard = () => {
   const [requests, setRequests] = useState([]);
@@ -11,8 +17,7 @@ const Dashboard = () => {
   useEffect(() => {
     const fetchRequests = async () => {
       try {
-        const response = await axios.get("http://localhost:8000/requests");
-        setRequests(response.data);
+        setRequests(await fetchAllRequests("http://localhost:8000/requests", FIELDS));
       } catch (error) {
         console.error("Error fetching requests:", error);
       }
@@ -2,6 +2,11 @@ import React, { useState, useEffect } from "react";
 import { useParams } from "react-router-dom";
 import axios from "axios";
 import { useNavigate } from "react-router-dom";
+import useEventFeed from "../useEventFeed";
+import fetchAllRequests from "../fetchAllRequests";
+
+// Columns shown in the request list; notes and TCKN are left out
+const REQUEST_FIELDS = ["id", "type", "subtype", "quantity", "timestamp", "status"];
 
 const DistrictDetails = () => {
   const { districtId } = useParams();
@@ -19,10 +24,12 @@ const DistrictDetails = () => {
       );
       setDistrictDetails(districtResponse.data);
 
-      const requestsResponse = await axios.get(
-        `http://localhost:8000/districts/${districtId}/requests`
+      setRequests(
+        await fetchAllRequests(
+          `http://localhost:8000/districts/${districtId}/requests`,
+          REQUEST_FIELDS
+        )
       );
-      setRequests(requestsResponse.data);
     } catch (error) {
       console.error("Error fetching district details:", error);
     }
@@ -60,6 +67,18 @@ const DistrictDetails = () => {
     fetchInventory();
   }, [districtId]);
 
+  // Stay current through the change feed for this district instead of polling
+  useEventFeed((event) => {
+    if (event.type === "inventory.changed") {
+      setInventory(event.data.inventory || {});
+    } else if (event.type === "resync") {
+      fetchDistrictData();
+      fetchInventory();
+    } else if (event.type !== "priority.escalated") {
+      fetchDistrictData();
+    }
+  }, districtId);
+
   if (!districtDetails) return <div>Loading...</div>;
 
   return (
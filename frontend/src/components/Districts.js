@@ -3,25 +3,50 @@ import axios from "axios";
 import { useNavigate } from "react-router-dom";
 import { MapContainer, TileLayer, Marker, Popup } from "react-leaflet";
 import "leaflet/dist/leaflet.css";
+import useEventFeed from "../useEventFeed";
 
 const Districts = () => {
   const [districts, setDistricts] = useState([]);
   const [error, setError] = useState("");
   const navigate = useNavigate();
 
+  const fetchDistricts = async () => {
+    try {
+      const response = await axios.get("http://localhost:8000/districts");
+      setDistricts(response.data);
+    } catch (err) {
+      console.error("Error fetching districts:", err);
+      setError("Failed to load districts. Please try again later.");
+    }
+  };
+
   useEffect(() => {
-    const fetchDistricts = async () => {
-      try {
-        const response = await axios.get("http://localhost:8000/districts");
-        setDistricts(response.data);
-      } catch (err) {
-        console.error("Error fetching districts:", err);
-        setError("Failed to load districts. Please try again later.");
-      }
-    };
     fetchDistricts();
   }, []);
 
+  // Apply new requests to the counts as they arrive instead of re-fetching
+  useEventFeed((event) => {
+    if (event.type === "resync") {
+      fetchDistricts();
+      return;
+    }
+    let added = {};
+    if (event.type === "request.created") {
+      added = { [event.data.relatedDistrict]: 1 };
+    } else if (event.type === "requests.created") {
+      added = event.data.by_district;
+    } else {
+      return;
+    }
+    setDistricts((current) =>
+      current.map((district) =>
+        added[district.id]
+          ? { ...district, request_count: (district.request_count || 0) + added[district.id] }
+          : district
+      )
+    );
+  });
+
   const handleDistrictClick = (districtId) => {
     navigate(`/districts/${districtId}`);
   };
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from "react";
 import axios from "axios";
 import { useParams } from "react-router-dom";
+import useEventFeed from "../useEventFeed";
 
 const InventoryManager = () => {
   const { districtId } = useParams(); // Get district ID from URL
@@ -68,6 +69,13 @@ const InventoryManager = () => {
     fetchInventory();
   }, [districtId]);
 
+  // Reflect stock changes made elsewhere (resolves, transfers, other users)
+  useEventFeed((event) => {
+    if (event.type === "inventory.changed") {
+      setInventory(event.data.inventory || {});
+    }
+  }, districtId);
+
 const handleUpdateInventory = async (e) => {
     e.preventDefault();
     setError("");
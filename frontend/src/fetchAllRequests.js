@@ -0,0 +1,21 @@
+import axios from "axios";
+
+const PAGE_SIZE = 5000;
+
+// Fetches every request of a listing endpoint (/requests or
+// /districts/{id}/requests), following the X-Next-Cursor header page by page.
+// `fields` lists the columns to return, leaving out the ones not shown.
+const fetchAllRequests = async (url, fields) => {
+  const rows = [];
+  let cursor = null;
+  do {
+    const params = { limit: PAGE_SIZE, fields: fields.join(",") };
+    if (cursor) params.cursor = cursor;
+    const response = await axios.get(url, { params });
+    rows.push(...response.data);
+    cursor = response.headers["x-next-cursor"];
+  } while (cursor);
+  return rows;
+};
+
+export default fetchAllRequests;
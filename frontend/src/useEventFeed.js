@@ -0,0 +1,38 @@
+import { useEffect, useRef } from "react";
+
+const EVENTS_URL = "http://localhost:8000/events";
+
+const EVENT_TYPES = [
+  "request.created",
+  "requests.created",
+  "request.resolved",
+  "requests.resolved",
+  "inventory.changed",
+  "priority.escalated",
+  "resync",
+];
+
+// Subscribes to the backend change feed (server-sent events) and calls
+// onEvent({ type, districts, data, time }) for every event. A "resync" event
+// is also delivered after a reconnect, since events may have been missed.
+const useEventFeed = (onEvent, districtId = null) => {
+  const handler = useRef(onEvent);
+  handler.current = onEvent;
+
+  useEffect(() => {
+    const query = districtId ? `?district_id=${districtId}` : "";
+    const source = new EventSource(`${EVENTS_URL}${query}`);
+    let connectedBefore = false;
+
+    source.addEventListener("ready", () => {
+      if (connectedBefore) handler.current({ type: "resync", districts: [], data: {} });
+      connectedBefore = true;
+    });
+    const listener = (message) => handler.current(JSON.parse(message.data));
+    EVENT_TYPES.forEach((type) => source.addEventListener(type, listener));
+
+    return () => source.close();
+  }, [districtId]);
+};
+
+export default useEventFeed;